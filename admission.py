@@ -0,0 +1,194 @@
+"""
+指令准入模块
+按群组、按用户的令牌桶在指令处理函数之前拒绝刷屏，
+被拒绝的指令不读取任何玩家数据，只回复一句提示或直接丢弃
+"""
+
+import functools
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .config import AdmissionConfig, BucketConfig
+
+# 每处理多少次准入检查清理一次空闲的令牌桶与提示记录
+SWEEP_EVERY = 1024
+
+GROUP_BUSY_NOTICE = "⏳ 本群指令过于频繁，请稍后再试"
+USER_BUSY_NOTICE = "⏳ 你的操作过于频繁，请稍后再试"
+GROUP_PAUSED_NOTICE = "⏳ 本群正在进行每周重置，请稍后再试"
+
+
+class TokenBucket:
+    """令牌桶，令牌数在取用时按经过的时间补充，不需要定时任务"""
+
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, capacity: float, now: float):
+        self.tokens = capacity
+        self.updated = now
+
+    def refill(self, settings: 'BucketConfig', now: float) -> float:
+        """补充令牌并返回当前令牌数"""
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(settings.capacity, self.tokens + elapsed * settings.refill_per_second)
+            self.updated = now
+        return self.tokens
+
+
+class AdmissionController:
+    """指令准入控制
+
+    每条指令都要从群组桶和用户桶各取一个令牌，开销较大的指令还要从更严格的
+    一组桶中再取一个；任何一个桶不足时整条指令被拒绝，不扣除任何令牌。
+    被拒绝时每个群组（群组桶不足）或每个用户（用户桶不足）在 noticeInterval 内
+    只回复一次提示，其余直接丢弃。只在事件循环中调用，不需要加锁。
+    """
+
+    def __init__(self, settings: Callable[[], 'AdmissionConfig']):
+        """初始化准入控制
+
+        Args:
+            settings: 返回当前准入配置的函数，配置热重载后立即生效
+        """
+        self.settings = settings
+        self._buckets: Dict[Tuple[str, ...], TokenBucket] = {}
+        self._notices: Dict[Tuple[str, ...], float] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._checks = 0
+        # 暂停准入的群组及暂停次数（每周重置期间）
+        self._paused: Dict[str, int] = {}
+
+    def _bucket(self, key: Tuple[str, ...], settings: 'BucketConfig', now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(settings.capacity, now)
+        bucket.refill(settings, now)
+        return bucket
+
+    def _count(self, command: str, outcome: str) -> None:
+        counters = self._counters.setdefault(command, {"admitted": 0, "replied": 0, "dropped": 0})
+        counters[outcome] += 1
+
+    def admit(self, group_id: str, user_id: str, command: str, now: Optional[float] = None) -> Tuple[bool, Optional[str]]:
+        """检查一条指令能否执行
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            command: 指令名称
+            now: 当前时间（单调时钟）
+
+        Returns:
+            Tuple[bool, Optional[str]]: 是否放行，以及被拒绝时要回复的提示（静默丢弃时为None）
+        """
+        now = time.monotonic() if now is None else now
+        if group_id in self._paused:
+            return False, self._reject(group_id, user_id, command, "group", now, GROUP_PAUSED_NOTICE)
+        settings = self.settings()
+        if not settings.enabled:
+            return True, None
+
+        self._checks += 1
+        if self._checks % SWEEP_EVERY == 0:
+            self.sweep(now)
+
+        # 先检查群组桶再检查用户桶，决定拒绝时提示哪一种原因
+        checks: List[Tuple[Tuple[str, ...], 'BucketConfig', str]] = [
+            (("group", group_id), settings.group, "group"),
+            (("user", group_id, user_id), settings.user, "user"),
+        ]
+        if command in settings.expensive_commands:
+            checks.append((("expensive", group_id), settings.expensive_group, "group"))
+            checks.append((("expensive", group_id, user_id), settings.expensive_user, "user"))
+
+        buckets = []
+        for key, bucket_settings, scope in checks:
+            bucket = self._bucket(key, bucket_settings, now)
+            if bucket.tokens < 1:
+                return False, self._reject(group_id, user_id, command, scope, now)
+            buckets.append(bucket)
+
+        for bucket in buckets:
+            bucket.tokens -= 1
+        self._count(command, "admitted")
+        return True, None
+
+    def _reject(
+        self, group_id: str, user_id: str, command: str, scope: str, now: float, notice: Optional[str] = None
+    ) -> Optional[str]:
+        """记录一次拒绝，决定回复提示还是静默丢弃"""
+        notice_key = ("group", group_id) if scope == "group" else ("user", group_id, user_id)
+        last = self._notices.get(notice_key)
+        if last is not None and now - last < self.settings().notice_interval:
+            self._count(command, "dropped")
+            return None
+        self._notices[notice_key] = now
+        self._count(command, "replied")
+        if notice is not None:
+            return notice
+        return GROUP_BUSY_NOTICE if scope == "group" else USER_BUSY_NOTICE
+
+    def pause(self, group_id: str) -> None:
+        """暂停群组的指令准入，之后到达的指令全部拒绝（可以嵌套）"""
+        self._paused[group_id] = self._paused.get(group_id, 0) + 1
+
+    def resume(self, group_id: str) -> None:
+        """恢复 pause 暂停的群组"""
+        remaining = self._paused.get(group_id, 0) - 1
+        if remaining > 0:
+            self._paused[group_id] = remaining
+        else:
+            self._paused.pop(group_id, None)
+
+    def sweep(self, now: float) -> None:
+        """清理已经补满的令牌桶与过期的提示记录
+
+        补满的桶与新建的桶等价，删除后不影响限流结果
+        """
+        settings = self.settings()
+        for key, bucket in list(self._buckets.items()):
+            if key[0] == "expensive":
+                bucket_settings = settings.expensive_group if len(key) == 2 else settings.expensive_user
+            else:
+                bucket_settings = settings.group if key[0] == "group" else settings.user
+            if bucket.refill(bucket_settings, now) >= bucket_settings.capacity:
+                del self._buckets[key]
+        expired = [key for key, last in self._notices.items() if now - last >= settings.notice_interval]
+        for key in expired:
+            del self._notices[key]
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各指令放行、回复提示与静默丢弃的次数"""
+        return {command: dict(counters) for command, counters in self._counters.items()}
+
+
+def admission_control(command: str) -> Callable:
+    """指令准入装饰器，放在 @filter.command 与处理函数之间
+
+    用法::
+
+        @filter.command("打工")
+        @admission_control("打工")
+        async def work(self, event: AstrMessageEvent):
+            ...
+
+    处理函数所在的对象是插件本身或持有 plugin 属性的功能模块；
+    私聊消息不限流，交给处理函数自己回复
+    """
+    def decorate(handler: Callable) -> Callable:
+        @functools.wraps(handler)
+        async def wrapper(self, event, *args: Any, **kwargs: Any):
+            group_id = event.get_group_id()
+            if group_id:
+                plugin = getattr(self, "plugin", self)
+                admitted, notice = plugin.admission.admit(str(group_id), str(event.get_sender_id()), command)
+                if not admitted:
+                    if notice is not None:
+                        yield event.plain_result(notice)
+                    return
+            async for result in handler(self, event, *args, **kwargs):
+                yield result
+        return wrapper
+    return decorate
@@ -0,0 +1,269 @@
+"""
+重置备份归档模块
+每次重置时每个群组写一个压缩归档，可以只解压单个玩家的数据；
+排行榜历史按群组分片保存，查询时只读取一个群组
+"""
+
+import gzip
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+from .codec import JsonCodec, decode_bytes, read_file, write_file
+
+_ARCHIVE_PATTERN = re.compile(r"^(?P<job>\d{8}_\d{6})\.jsonl\.gz$")
+
+
+class SnapshotArchive:
+    """按群组、按周保存的玩家数据归档
+
+    文件布局::
+
+        data/archives/<group_id>/<job_id>.jsonl.gz   每个玩家一个独立的gzip成员
+        data/archives/<group_id>/<job_id>.idx        用户ID -> [偏移, 长度]
+
+    多个gzip成员首尾相接仍是合法的gzip文件，整体解压即为JSONL；
+    恢复单个玩家时按索引定位，只解压对应的成员。
+    索引在归档写完后才生成，存在索引即表示归档完整。
+    """
+
+    def __init__(self, archive_dir: str):
+        """初始化归档
+
+        Args:
+            archive_dir: 归档根目录
+        """
+        self.archive_dir = archive_dir
+        self._codec = JsonCodec()
+
+    def _group_dir(self, group_id: str) -> str:
+        return os.path.join(self.archive_dir, group_id)
+
+    def archive_path(self, group_id: str, job_id: str) -> str:
+        """获取归档文件路径"""
+        return os.path.join(self._group_dir(group_id), f"{job_id}.jsonl.gz")
+
+    def index_path(self, group_id: str, job_id: str) -> str:
+        """获取归档索引路径"""
+        return os.path.join(self._group_dir(group_id), f"{job_id}.idx")
+
+    def has_group(self, group_id: str, job_id: str) -> bool:
+        """某次重置的群组归档是否已经完整写入"""
+        return os.path.exists(self.index_path(group_id, job_id))
+
+    def write_group(self, group_id: str, job_id: str, records: Dict[str, Dict[str, Any]]) -> int:
+        """写入群组归档
+
+        Args:
+            group_id: 群组ID
+            job_id: 重置任务ID
+            records: 用户ID到玩家数据的映射
+
+        Returns:
+            int: 归档文件大小（字节）
+        """
+        os.makedirs(self._group_dir(group_id), exist_ok=True)
+        path = self.archive_path(group_id, job_id)
+        tmp_path = f"{path}.tmp"
+
+        index: Dict[str, List[int]] = {}
+        with open(tmp_path, "wb") as f:
+            for user_id, data in records.items():
+                member = gzip.compress(self._codec.encode(data) + b"\n")
+                index[user_id] = [f.tell(), len(member)]
+                f.write(member)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        write_file(self.index_path(group_id, job_id), index, self._codec)
+        return size
+
+    def list_jobs(self, group_id: str) -> List[str]:
+        """列出群组已完整写入的归档，按时间从新到旧排序"""
+        group_dir = self._group_dir(group_id)
+        if not os.path.isdir(group_dir):
+            return []
+        jobs = []
+        for filename in os.listdir(group_dir):
+            match = _ARCHIVE_PATTERN.match(filename)
+            if match and self.has_group(group_id, match.group("job")):
+                jobs.append(match.group("job"))
+        jobs.sort(reverse=True)
+        return jobs
+
+    def read_player(self, group_id: str, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """从归档中读取单个玩家的数据，只解压该玩家对应的部分
+
+        Args:
+            group_id: 群组ID
+            job_id: 重置任务ID
+            user_id: 用户ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 玩家数据，归档或玩家不存在时返回None
+        """
+        if not self.has_group(group_id, job_id):
+            return None
+        entry = read_file(self.index_path(group_id, job_id)).get(user_id)
+        if entry is None:
+            return None
+        offset, length = entry
+        with open(self.archive_path(group_id, job_id), "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return decode_bytes(gzip.decompress(member).rstrip(b"\n"))
+
+    def read_group(self, group_id: str, job_id: str) -> Dict[str, Dict[str, Any]]:
+        """读取整个群组归档（重置任务续跑时使用）
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 用户ID到玩家数据的映射，归档不存在时为空
+        """
+        if not self.has_group(group_id, job_id):
+            return {}
+        index = read_file(self.index_path(group_id, job_id))
+        records = {}
+        with open(self.archive_path(group_id, job_id), "rb") as f:
+            for user_id, (offset, length) in index.items():
+                f.seek(offset)
+                records[user_id] = decode_bytes(gzip.decompress(f.read(length)).rstrip(b"\n"))
+        return records
+
+    def prune(self, keep: int) -> int:
+        """每个群组只保留最新的keep份归档
+
+        Args:
+            keep: 保留份数
+
+        Returns:
+            int: 删除的归档数量
+        """
+        if not os.path.isdir(self.archive_dir):
+            return 0
+        removed = 0
+        for group_id in os.listdir(self.archive_dir):
+            group_dir = self._group_dir(group_id)
+            if not os.path.isdir(group_dir):
+                continue
+            for job_id in self.list_jobs(group_id)[keep:]:
+                os.remove(self.index_path(group_id, job_id))
+                os.remove(self.archive_path(group_id, job_id))
+                removed += 1
+            # 写入中途退出留下的临时文件
+            for filename in os.listdir(group_dir):
+                if filename.endswith(".tmp"):
+                    os.remove(os.path.join(group_dir, filename))
+        return removed
+
+
+class RankingHistory:
+    """按群组分片的排行榜历史
+
+    文件布局::
+
+        data/rankings/<group_id>.<n>.shard   每周追加一个gzip成员，内容为该群组当周的排行数据
+        data/rankings/<group_id>.idx         {"shard": 分片文件名, "weeks": [[任务ID, 日期, 偏移, 长度], ...]}
+
+    查询某个群组某一周的排行只需读取该群组的小索引并解压一个成员，
+    耗时与群组数量无关。成员追加完成后才更新索引，
+    写入中途退出留下的尾部数据不会被引用。
+    清理过期数据时写出新编号的分片，再原子替换索引，中途退出不会让索引指向错误的位置。
+    """
+
+    def __init__(self, history_dir: str):
+        """初始化排行榜历史
+
+        Args:
+            history_dir: 历史数据目录
+        """
+        self.history_dir = history_dir
+        self._codec = JsonCodec()
+
+    def index_path(self, group_id: str) -> str:
+        """获取群组索引路径"""
+        return os.path.join(self.history_dir, f"{group_id}.idx")
+
+    def load_index(self, group_id: str) -> Dict[str, Any]:
+        """读取群组索引，weeks按时间从旧到新排序"""
+        path = self.index_path(group_id)
+        if not os.path.exists(path):
+            return {"shard": f"{group_id}.0.shard", "weeks": []}
+        return read_file(path)
+
+    def weeks(self, group_id: str) -> List[List[Any]]:
+        """获取群组的历史周列表，按时间从旧到新排序"""
+        return self.load_index(group_id)["weeks"]
+
+    def append(self, group_id: str, job_id: str, entry: Dict[str, Any]) -> None:
+        """追加一周的排行数据，同一任务重复追加时忽略
+
+        Args:
+            group_id: 群组ID
+            job_id: 重置任务ID
+            entry: 排行数据，包含timestamp、date与players
+        """
+        index = self.load_index(group_id)
+        if any(week[0] == job_id for week in index["weeks"]):
+            return
+        os.makedirs(self.history_dir, exist_ok=True)
+        member = gzip.compress(self._codec.encode(entry))
+        with open(os.path.join(self.history_dir, index["shard"]), "ab") as f:
+            offset = f.tell()
+            f.write(member)
+        index["weeks"].append([job_id, entry.get("date", ""), offset, len(member)])
+        write_file(self.index_path(group_id), index, self._codec)
+
+    def read(self, group_id: str, weeks_ago: int = 1) -> Optional[Dict[str, Any]]:
+        """读取群组第weeks_ago周前的排行数据
+
+        Args:
+            group_id: 群组ID
+            weeks_ago: 1为最近一次重置
+
+        Returns:
+            Optional[Dict[str, Any]]: 排行数据，不存在时返回None
+        """
+        index = self.load_index(group_id)
+        weeks = index["weeks"]
+        if weeks_ago < 1 or weeks_ago > len(weeks):
+            return None
+        _, _, offset, length = weeks[-weeks_ago]
+        with open(os.path.join(self.history_dir, index["shard"]), "rb") as f:
+            f.seek(offset)
+            member = f.read(length)
+        return decode_bytes(member)
+
+    def prune(self, keep: int) -> int:
+        """每个群组只保留最新的keep周，重写分片去掉过期数据
+
+        Args:
+            keep: 保留周数
+
+        Returns:
+            int: 删除的周数
+        """
+        if not os.path.isdir(self.history_dir):
+            return 0
+        removed = 0
+        for filename in os.listdir(self.history_dir):
+            if not filename.endswith(".idx"):
+                continue
+            group_id = filename[:-4]
+            index = self.load_index(group_id)
+            weeks = index["weeks"]
+            if len(weeks) <= keep:
+                continue
+
+            old_shard = index["shard"]
+            generation = int(old_shard.rsplit(".", 2)[1]) + 1
+            new_shard = f"{group_id}.{generation}.shard"
+            kept = []
+            with open(os.path.join(self.history_dir, old_shard), "rb") as src, \
+                    open(os.path.join(self.history_dir, new_shard), "wb") as dst:
+                for job_id, date, offset, length in weeks[-keep:]:
+                    src.seek(offset)
+                    kept.append([job_id, date, dst.tell(), length])
+                    dst.write(src.read(length))
+            write_file(self.index_path(group_id), {"shard": new_shard, "weeks": kept}, self._codec)
+            os.remove(os.path.join(self.history_dir, old_shard))
+            removed += len(weeks) - len(kept)
+        return removed
@@ -1,167 +1,191 @@
 """
 银行功能模块
+存款余额与信用等级保存在银行账本中，存取款只追加一笔流水，不再改写整份玩家数据
 """
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api import logger
-import time
+from datetime import datetime
 from typing import Dict, Any, TYPE_CHECKING
 
+from .admission import admission_control
+from .ledger import ENTRY_NAMES
+from .transaction import unit_of_work
+
 if TYPE_CHECKING:
+    from .config import PluginConfig
+    from .ledger import BankLedger
     from .main import SlaveMarketPlugin
+    from .transaction import RequestContext
 
 class BankModule:
+    # #银行流水 显示的条数
+    STATEMENT_SIZE = 10
+
     def __init__(self, plugin: 'SlaveMarketPlugin'):
         self.plugin = plugin
-        self.config = plugin.config
-    
-    @filter.command("存款")
-    async def deposit(self, event: AstrMessageEvent, amount: int):
-        """存款"""
+
+    @property
+    def config(self) -> 'PluginConfig':
+        """当前配置，配置文件热重载后自动使用新配置"""
+        return self.plugin.config
+
+    @property
+    def ledger(self) -> 'BankLedger':
+        return self.plugin.bank_ledger
+
+    @filter.command("银行信息")
+    @admission_control("银行信息")
+    async def bank_info(self, event: AstrMessageEvent):
+        """查看银行信息，余额包含尚未结算的利息"""
         if not event.get_group_id():
             yield event.plain_result("该游戏只能在群内使用")
             return
-        
+
         group_id = str(event.get_group_id())
         user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
-        
+
+        await self.plugin.run_io(self.ledger.load_group, group_id)
+        account = self.ledger.view(group_id, user_id)
+        pending = self.ledger.pending_interest(group_id, user_id)
+        bank_config = self.config.bank
+
+        reply = "🏦 银行信息\n\n"
+        reply += f"💰 存款: {account.balance} 金币\n"
+        if pending:
+            reply += f"💸 其中未结算利息: {pending} 金币\n"
+        reply += f"💳 信用等级: {account.level}\n"
+        reply += f"📦 存款限额: {bank_config.limit(account.level)} 金币\n"
+        reply += f"📈 每小时利率: {bank_config.interest_rate:.2%}（复利，自动计入存款）\n"
+        reply += f"⬆️ 升级价格: {bank_config.upgrade_price(account.level)} 金币"
+        yield event.plain_result(reply)
+
+    @filter.command("存款")
+    @admission_control("存款")
+    @unit_of_work()
+    async def deposit(self, event: AstrMessageEvent, ctx: 'RequestContext', amount: int):
+        """存款，现金随工作单元提交，存款记入账本"""
+        data = ctx.player
+
         if amount <= 0:
             yield event.plain_result("存款金额必须大于0")
             return
-        
+
         if data["currency"] < amount:
             yield event.plain_result(f"金币不足！你只有 {data['currency']} 金币")
             return
-        
-        bank_data = data.get("bank", {})
-        current_balance = bank_data.get("balance", 0)
-        limit = bank_data.get("limit", self.config["bank"]["initialLimit"])
-        
-        if current_balance + amount > limit:
+
+        await self.plugin.run_io(self.ledger.load_group, ctx.group_id)
+        account = self.ledger.view(ctx.group_id, ctx.user_id)
+        limit = self.config.bank.limit(account.level)
+        if account.balance + amount > limit:
             yield event.plain_result(f"超出存款限额！当前限额: {limit} 金币")
             return
-        
+
         # 执行存款
         data["currency"] -= amount
-        bank_data["balance"] = current_balance + amount
-        data["bank"] = bank_data
-        
-        self.plugin.save_player_data(group_id, user_id, data)
-        
-        yield event.plain_result(f"✅ 存款成功！\n💰 存入: {amount} 金币\n🏦 余额: {bank_data['balance']} 金币")
-    
+        account, _ = ctx.post("deposit", amount, balance_change=amount)
+
+        yield event.plain_result(f"✅ 存款成功！\n💰 存入: {amount} 金币\n🏦 余额: {account.balance} 金币")
+
     @filter.command("取款")
-    async def withdraw(self, event: AstrMessageEvent, amount: int):
+    @admission_control("取款")
+    @unit_of_work()
+    async def withdraw(self, event: AstrMessageEvent, ctx: 'RequestContext', amount: int):
         """取款"""
-        if not event.get_group_id():
-            yield event.plain_result("该游戏只能在群内使用")
-            return
-        
-        group_id = str(event.get_group_id())
-        user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
-        
+        data = ctx.player
+
         if amount <= 0:
             yield event.plain_result("取款金额必须大于0")
             return
-        
-        bank_data = data.get("bank", {})
-        current_balance = bank_data.get("balance", 0)
-        
-        if current_balance < amount:
-            yield event.plain_result(f"存款不足！你只有 {current_balance} 金币存款")
+
+        await self.plugin.run_io(self.ledger.load_group, ctx.group_id)
+        account = self.ledger.view(ctx.group_id, ctx.user_id)
+        if account.balance < amount:
+            yield event.plain_result(f"存款不足！你只有 {account.balance} 金币存款")
             return
-        
+
         # 执行取款
+        account, _ = ctx.post("withdraw", amount, balance_change=-amount)
         data["currency"] += amount
-        bank_data["balance"] = current_balance - amount
-        data["bank"] = bank_data
-        
-        self.plugin.save_player_data(group_id, user_id, data)
-        
-        yield event.plain_result(f"✅ 取款成功！\n💰 取出: {amount} 金币\n💼 现金: {data['currency']} 金币\n🏦 存款: {bank_data['balance']} 金币")
-    
+
+        yield event.plain_result(f"✅ 取款成功！\n💰 取出: {amount} 金币\n💼 现金: {data['currency']} 金币\n🏦 存款: {account.balance} 金币")
+
     @filter.command("升级信用")
-    async def upgrade_credit(self, event: AstrMessageEvent):
+    @admission_control("升级信用")
+    @unit_of_work()
+    async def upgrade_credit(self, event: AstrMessageEvent, ctx: 'RequestContext'):
         """升级信用等级"""
-        if not event.get_group_id():
-            yield event.plain_result("该游戏只能在群内使用")
-            return
-        
-        group_id = str(event.get_group_id())
-        user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
-        
-        bank_data = data.get("bank", {})
-        current_level = bank_data.get("level", 1)
-        
+        data = ctx.player
+
         # 计算升级价格
-        upgrade_price = int(self.config["bank"]["initialUpgradePrice"] * 
-                          (self.config["bank"]["upgradePriceMulti"] ** (current_level - 1)))
-        
+        await self.plugin.run_io(self.ledger.load_group, ctx.group_id)
+        current_level = self.ledger.view(ctx.group_id, ctx.user_id).level
+        upgrade_price = self.config.bank.upgrade_price(current_level)
+
         if data["currency"] < upgrade_price:
             yield event.plain_result(f"金币不足！升级需要 {upgrade_price} 金币，你只有 {data['currency']} 金币")
             return
-        
+
         # 执行升级
         data["currency"] -= upgrade_price
-        bank_data["level"] = current_level + 1
-        bank_data["limit"] = int(self.config["bank"]["initialLimit"] * 
-                               (self.config["bank"]["limitIncreaseMulti"] ** (bank_data["level"] - 1)))
-        data["bank"] = bank_data
-        
-        self.plugin.save_player_data(group_id, user_id, data)
-        
-        yield event.plain_result(f"✅ 信用等级提升！\n📈 新等级: {bank_data['level']}\n💳 新限额: {bank_data['limit']} 金币\n💰 花费: {upgrade_price} 金币")
-    
+        account, _ = ctx.post("upgrade", upgrade_price, level_change=1)
+
+        yield event.plain_result(f"✅ 信用等级提升！\n📈 新等级: {account.level}\n💳 新限额: {self.config.bank.limit(account.level)} 金币\n💰 花费: {upgrade_price} 金币")
+
     @filter.command("领取利息")
-    async def collect_interest(self, event: AstrMessageEvent):
-        """领取利息"""
+    @admission_control("领取利息")
+    @unit_of_work()
+    async def collect_interest(self, event: AstrMessageEvent, ctx: 'RequestContext'):
+        """结算利息
+
+        利息按小时复利自动计入存款，这里只是把已产生的利息记入流水
+        """
+        await self.plugin.run_io(self.ledger.load_group, ctx.group_id)
+        account, interest = ctx.post("interest")
+
+        if interest <= 0:
+            yield event.plain_result("还没有产生利息，请稍后再来\n💡 利息每小时自动计入存款，存款达到限额后不再计息")
+            return
+
+        yield event.plain_result(f"💰 利息结算成功！\n💸 计入利息: {interest} 金币\n🏦 存款: {account.balance} 金币")
+
+    @filter.command("银行流水")
+    @admission_control("银行流水")
+    async def bank_statement(self, event: AstrMessageEvent):
+        """查看最近的银行流水，从账本日志末尾读取"""
         if not event.get_group_id():
             yield event.plain_result("该游戏只能在群内使用")
             return
-        
+
         group_id = str(event.get_group_id())
         user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
-        
-        bank_data = data.get("bank", {})
-        balance = bank_data.get("balance", 0)
-        last_interest_time = bank_data.get("lastInterestTime", int(time.time()))
-        
-        # 计算利息
-        current_time = int(time.time())
-        hours_passed = min((current_time - last_interest_time) // 3600, 
-                          self.config["bank"]["maxInterestTime"])
-        
-        if hours_passed == 0:
-            yield event.plain_result("还没有产生利息，请稍后再来")
-            return
-        
-        interest = int(balance * self.config["bank"]["interestRate"] * hours_passed)
-        
-        if interest <= 0:
-            yield event.plain_result("没有可领取的利息")
+
+        await self.plugin.run_io(self.ledger.load_group, group_id)
+        entries = await self.plugin.run_io(self.ledger.statement, group_id, user_id, self.STATEMENT_SIZE)
+        if not entries:
+            yield event.plain_result("暂无银行流水")
             return
-        
-        # 发放利息
-        data["currency"] += interest
-        bank_data["lastInterestTime"] = current_time
-        data["bank"] = bank_data
-        
-        self.plugin.save_player_data(group_id, user_id, data)
-        
-        yield event.plain_result(f"💰 利息领取成功！\n⏰ 计息时间: {hours_passed} 小时\n💸 获得利息: {interest} 金币")
\ No newline at end of file
+
+        reply = f"🧾 最近 {len(entries)} 笔银行流水\n\n"
+        for entry in entries:
+            reply += self.format_entry(entry) + "\n"
+        pending = self.ledger.pending_interest(group_id, user_id)
+        if pending:
+            reply += f"\n💸 未结算利息: {pending} 金币"
+        yield event.plain_result(reply.rstrip())
+
+    def format_entry(self, entry: Dict[str, Any]) -> str:
+        """格式化一笔流水"""
+        when = datetime.fromtimestamp(entry["t"]).strftime("%m-%d %H:%M")
+        op = entry["op"]
+        name = ENTRY_NAMES.get(op, op)
+        if op == "upgrade":
+            change = f"Lv.{entry['lvl']}（花费 {entry['amt']}）"
+        elif op == "withdraw":
+            change = f"-{entry['amt']}"
+        elif op == "revert":
+            change = "未完成的操作"
+        else:
+            change = f"+{entry['amt']}"
+        return f"{when} {name} {change} 余额 {entry['bal']}"
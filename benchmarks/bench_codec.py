@@ -0,0 +1,93 @@
+"""
+数据编码性能测试
+
+对比旧的带缩进JSON与codec模块中各编码器的编码/解码耗时和体积：
+
+    python benchmarks/bench_codec.py
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import codec  # noqa: E402
+
+
+def make_player(user_id: int) -> dict:
+    """构造一份典型的玩家数据"""
+    return {
+        "user_id": str(user_id),
+        "nickname": f"测试用户{user_id}",
+        "currency": 12345,
+        "value": 678,
+        "slaves": [str(user_id + i) for i in range(1, 6)],
+        "master": None,
+        "bank": {"balance": 900, "level": 3, "limit": 1562, "lastInterestTime": 1700000000},
+        "cooldowns": {"work": 1700000000, "training": 1700000000, "purchase": 1700000000},
+        "arena": {"tier": "白银", "points": 620, "wins": 31, "losses": 17},
+        "lastWorkTime": 0,
+        "createdAt": 1690000000,
+    }
+
+
+class LegacyJson:
+    """插件原来的写法：ensure_ascii=False, indent=4"""
+
+    name = "json(indent=4)"
+
+    def encode(self, data):
+        return json.dumps(data, ensure_ascii=False, indent=4).encode("utf-8")
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+def bench(encoder, data, rounds: int) -> None:
+    """测量编码与解码耗时"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        raw = encoder.encode(data)
+    encode_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        codec.decode_bytes(raw)
+    decode_time = time.perf_counter() - start
+
+    print(
+        f"{encoder.name:<16} {len(raw):>10} B "
+        f"encode {encode_time / rounds * 1e6:>10.1f} us  "
+        f"decode {decode_time / rounds * 1e6:>10.1f} us"
+    )
+
+
+def main() -> None:
+    player = make_player(10000)
+    rankings = {
+        str(group_id): {
+            "timestamp": 1700000000,
+            "date": "2023-11-14T00:00:00",
+            "players": [make_player(group_id * 1000 + i) for i in range(200)],
+        }
+        for group_id in range(20)
+    }
+
+    encoders = [LegacyJson(), codec.JsonCodec()]
+    if codec.msgpack is not None:
+        encoders.append(codec.MsgpackCodec())
+    print(f"orjson: {'已安装' if codec.orjson is not None else '未安装'}")
+
+    for title, data, rounds in (
+        ("单个玩家数据", player, 20000),
+        ("排行榜备份（20群 x 200人）", rankings, 20),
+    ):
+        print(f"\n== {title} ==")
+        for encoder in encoders:
+            bench(encoder, data, rounds)
+
+
+if __name__ == "__main__":
+    main()
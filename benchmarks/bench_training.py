@@ -0,0 +1,48 @@
+"""
+批量训练性能测试
+
+对比逐个计算与NumPy向量化实现在不同奴隶数量下的耗时：
+
+    python benchmarks/bench_training.py
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import training_engine  # noqa: E402
+
+# 与config.yaml中training的默认值一致
+COST_RATE = 0.1
+SUCCESS_RATE = 0.7
+INCREASE_RATE = 0.2
+
+
+def bench(name: str, func, currency: int, values, rounds: int) -> float:
+    """测量单次批量训练的平均耗时（微秒）"""
+    start = time.perf_counter()
+    for _ in range(rounds):
+        func(currency, values, COST_RATE, SUCCESS_RATE, INCREASE_RATE)
+    elapsed = (time.perf_counter() - start) / rounds * 1e6
+    print(f"  {name:<12} {elapsed:>10.1f} us")
+    return elapsed
+
+
+def main() -> None:
+    print(f"numpy: {'已安装' if training_engine.np is not None else '未安装'}")
+    for count, rounds in ((10, 20000), (100, 5000), (1000, 500)):
+        values = [random.randint(100, 5000) for _ in range(count)]
+        # 金币足够时全部向量化；金币只够一半时尾部逐个计算
+        for title, currency in (("金币充足", 10 ** 9), ("金币只够一半", sum(values) // 20)):
+            print(f"\n== {count} 个奴隶，{title} ==")
+            loop_time = bench("loop", training_engine.train_batch_loop, currency, values, rounds)
+            if training_engine.np is not None:
+                vector_time = bench("vectorized", training_engine.train_batch_vectorized, currency, values, rounds)
+                print(f"  加速比 {loop_time / vector_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+数据编码模块
+提供紧凑JSON（优先使用orjson）与msgpack两种编码，并通过文件头区分格式
+"""
+
+import gzip
+import json
+import os
+import threading
+from typing import Any, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 取决于运行环境
+    msgpack = None
+
+# msgpack数据的文件头。0xc1在msgpack中永不使用，也不可能是JSON文本的开头
+MSGPACK_MAGIC = b"\xc1SM1"
+
+# gzip压缩数据的文件头
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+class JsonCodec:
+    """紧凑JSON编码，安装了orjson时使用orjson"""
+
+    name = "json"
+
+    def encode(self, data: Any) -> bytes:
+        """编码为字节串"""
+        if orjson is not None:
+            return orjson.dumps(data)
+        return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def decode(self, raw: bytes) -> Any:
+        """从字节串解码"""
+        if orjson is not None:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+
+class MsgpackCodec:
+    """msgpack二进制编码，写出的数据带有MSGPACK_MAGIC文件头"""
+
+    name = "msgpack"
+
+    def encode(self, data: Any) -> bytes:
+        """编码为字节串"""
+        return MSGPACK_MAGIC + msgpack.packb(data, use_bin_type=True)
+
+    def decode(self, raw: bytes) -> Any:
+        """从字节串解码"""
+        return msgpack.unpackb(raw[len(MSGPACK_MAGIC):], raw=False)
+
+
+def get_codec(name: str) -> Tuple[Union[JsonCodec, MsgpackCodec], Optional[str]]:
+    """根据名称获取编码器
+
+    Args:
+        name: 编码名称，json或msgpack
+
+    Returns:
+        Tuple: (编码器, 回退原因)，无需回退时原因为None
+    """
+    if name == "msgpack":
+        if msgpack is None:
+            return JsonCodec(), "未安装msgpack，使用JSON编码"
+        return MsgpackCodec(), None
+    if name != "json":
+        return JsonCodec(), f"未知的编码 {name}，使用JSON编码"
+    return JsonCodec(), None
+
+
+def decode_bytes(raw: Union[bytes, str]) -> Any:
+    """按文件头自动识别格式并解码，兼容旧的带缩进JSON文件，gzip压缩的数据先解压
+
+    Args:
+        raw: 原始数据
+
+    Returns:
+        Any: 解码后的数据
+    """
+    if isinstance(raw, str):
+        return json.loads(raw)
+    if raw.startswith(GZIP_MAGIC):
+        raw = gzip.decompress(raw)
+    if raw.startswith(MSGPACK_MAGIC):
+        if msgpack is None:
+            raise ValueError("数据为msgpack格式，但未安装msgpack")
+        return msgpack.unpackb(raw[len(MSGPACK_MAGIC):], raw=False)
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def read_file(path: str) -> Any:
+    """读取任意格式的数据文件"""
+    with open(path, "rb") as f:
+        return decode_bytes(f.read())
+
+
+def write_file(
+    path: str, data: Any, codec: Union[JsonCodec, MsgpackCodec], compress: bool = False
+) -> None:
+    """用指定编码写入数据文件
+
+    先写临时文件再替换，写入中途退出不会留下半个文件
+
+    Args:
+        path: 文件路径
+        data: 数据
+        codec: 编码
+        compress: 是否用gzip压缩，read_file可以自动识别
+    """
+    raw = codec.encode(data)
+    if compress:
+        raw = gzip.compress(raw)
+    _replace_file(path, raw)
+
+
+def _replace_file(path: str, raw: bytes) -> None:
+    """以临时文件加重命名的方式原子地替换文件内容"""
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(raw)
+    os.replace(tmp_path, path)
+
+
+def convert_file(path: str, codec: Union[JsonCodec, MsgpackCodec]) -> bool:
+    """将数据文件原地转换为指定编码
+
+    先写临时文件再替换，转换中途退出不会损坏原文件
+
+    Args:
+        path: 文件路径
+        codec: 目标编码
+
+    Returns:
+        bool: 文件内容是否发生变化
+    """
+    with open(path, "rb") as f:
+        raw = f.read()
+    encoded = codec.encode(decode_bytes(raw))
+    if encoded == raw:
+        return False
+    _replace_file(path, encoded)
+    return True
@@ -0,0 +1,474 @@
+"""
+配置模块
+将config.yaml与默认配置深度合并后编译为带类型的只读配置对象，
+并预先计算银行等级表、段位阈值等派生数据
+"""
+
+import bisect
+import copy
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+import yaml
+
+# 默认配置，config.yaml中缺少的项（包括嵌套项）使用这里的值
+DEFAULT_CONFIG: Dict[str, Any] = {
+    "buyBack": {"cooldown": 86400, "maxTimes": 3, "taxRate": 0.05},
+    "rob": {"cooldown": 600, "successRate": 0.3, "penalty": 0.1},
+    "work": {"cooldown": 3600, "slaveownerCooldown": 60},
+    "purchase": {"cooldown": 3600},
+    "bank": {
+        "initialLimit": 1000,
+        "initialLevel": 1,
+        "upgradePriceMulti": 1.2,
+        "limitIncreaseMulti": 1.25,
+        "initialUpgradePrice": 100,
+        "interestRate": 0.01,
+        "snapshotInterval": 256,
+    },
+    "training": {
+        "cooldown": 7200,
+        "successRate": 0.7,
+        "costRate": 0.1,
+        "valueIncreaseRate": 0.2,
+    },
+    "arena": {
+        "cooldown": 7200,
+        "entryFee": 50,
+        "rewardRate": 0.2,
+        "valueBonus": 0.1,
+    },
+    "ranking": {
+        "cooldown": 3600,
+        "baseReward": 10,
+        "winBonus": 0.2,
+        "tierBonus": {
+            "青铜": 1,
+            "白银": 1.2,
+            "黄金": 1.5,
+            "铂金": 2,
+            "钻石": 3,
+        },
+        "tierThresholds": {
+            "青铜": 0,
+            "白银": 500,
+            "黄金": 1000,
+            "铂金": 1500,
+            "钻石": 2000,
+        },
+    },
+    "transfer": {"feeRate": 0.1, "minAmount": 100},
+    "ignoreCDUsers": [],
+    "weeklyReset": {
+        "enabled": True,
+        "resetTime": {"day": 1, "hour": 0, "minute": 0},
+        "preserveData": {"nickname": True, "basicValue": 100},
+        "chunkSize": 8,
+    },
+    "storage": {
+        "engine": "json",
+        "sqlitePath": "player.db",
+        "cacheSize": 2048,
+        "flushInterval": 30,
+        "flushThreshold": 64,
+        "codec": "json",
+        "ioWorkers": 4,
+        "parallelReads": True,
+        "journal": {"enabled": True, "commitInterval": 1},
+    },
+    "replyCache": {"capacity": 512},
+    "archive": {"keepWeeks": 8, "pruneInterval": 21600},
+    "render": {
+        "enabled": True,
+        "renderer": "pillow",
+        "workers": 2,
+        "cacheSize": 128,
+        "width": 800,
+        "fontPath": "",
+    },
+    "admission": {
+        "enabled": True,
+        "group": {"capacity": 30, "refillPerSecond": 1},
+        "user": {"capacity": 5, "refillPerSecond": 0.2},
+        "expensive": {
+            "commands": ["排行榜", "手动奴隶重置"],
+            "group": {"capacity": 3, "refillPerSecond": 0.05},
+            "user": {"capacity": 1, "refillPerSecond": 0.02},
+        },
+        "noticeInterval": 30,
+    },
+}
+
+# 修改后需要重启才能生效的配置项（启动时用于创建线程池、缓存与存储引擎）
+RESTART_SECTIONS = ("storage", "replyCache", "render")
+
+# 银行等级表预先计算的等级数，更高的等级按公式现算
+BANK_TABLE_LEVELS = 200
+
+
+def deep_merge(defaults: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """深度合并配置，overrides中的值覆盖defaults，嵌套字典逐层合并
+
+    Args:
+        defaults: 默认配置
+        overrides: 用户配置
+
+    Returns:
+        Dict[str, Any]: 合并后的新字典，不修改参数
+    """
+    merged = copy.deepcopy(defaults)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+class CooldownConfig:
+    """只有冷却时间的配置项（purchase）"""
+
+    __slots__ = ("cooldown",)
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+
+
+class BuyBackConfig:
+    """赎身配置"""
+
+    __slots__ = ("cooldown", "max_times", "tax_rate")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+        self.max_times: int = int(raw["maxTimes"])
+        self.tax_rate: float = float(raw["taxRate"])
+
+
+class RobConfig:
+    """抢劫配置"""
+
+    __slots__ = ("cooldown", "success_rate", "penalty")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+        self.success_rate: float = float(raw["successRate"])
+        self.penalty: float = float(raw["penalty"])
+
+
+class WorkConfig:
+    """打工配置"""
+
+    __slots__ = ("cooldown", "slaveowner_cooldown")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+        self.slaveowner_cooldown: int = int(raw["slaveownerCooldown"])
+
+
+class BankConfig:
+    """银行配置，各等级的升级价格与存款限额预先计算成表"""
+
+    __slots__ = (
+        "initial_limit",
+        "initial_level",
+        "upgrade_price_multi",
+        "limit_increase_multi",
+        "initial_upgrade_price",
+        "interest_rate",
+        "snapshot_interval",
+        "_upgrade_prices",
+        "_limits",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.initial_limit: int = int(raw["initialLimit"])
+        self.initial_level: int = int(raw["initialLevel"])
+        self.upgrade_price_multi: float = float(raw["upgradePriceMulti"])
+        self.limit_increase_multi: float = float(raw["limitIncreaseMulti"])
+        self.initial_upgrade_price: int = int(raw["initialUpgradePrice"])
+        self.interest_rate: float = float(raw["interestRate"])
+        self.snapshot_interval: int = max(1, int(raw["snapshotInterval"]))
+        levels = range(1, BANK_TABLE_LEVELS + 1)
+        self._upgrade_prices: Tuple[int, ...] = tuple(self._compute_upgrade_price(level) for level in levels)
+        self._limits: Tuple[int, ...] = tuple(self._compute_limit(level) for level in levels)
+
+    def _compute_upgrade_price(self, level: int) -> int:
+        return int(self.initial_upgrade_price * (self.upgrade_price_multi ** (level - 1)))
+
+    def _compute_limit(self, level: int) -> int:
+        return int(self.initial_limit * (self.limit_increase_multi ** (level - 1)))
+
+    def upgrade_price(self, level: int) -> int:
+        """从level级升到下一级的价格"""
+        if 1 <= level <= BANK_TABLE_LEVELS:
+            return self._upgrade_prices[level - 1]
+        return self._compute_upgrade_price(level)
+
+    def limit(self, level: int) -> int:
+        """level级的存款限额"""
+        if 1 <= level <= BANK_TABLE_LEVELS:
+            return self._limits[level - 1]
+        return self._compute_limit(level)
+
+
+class TrainingConfig:
+    """训练配置"""
+
+    __slots__ = ("cooldown", "success_rate", "cost_rate", "value_increase_rate")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+        self.success_rate: float = float(raw["successRate"])
+        self.cost_rate: float = float(raw["costRate"])
+        self.value_increase_rate: float = float(raw["valueIncreaseRate"])
+
+
+class ArenaConfig:
+    """决斗配置"""
+
+    __slots__ = ("cooldown", "entry_fee", "reward_rate", "value_bonus")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+        self.entry_fee: int = int(raw["entryFee"])
+        self.reward_rate: float = float(raw["rewardRate"])
+        self.value_bonus: float = float(raw["valueBonus"])
+
+
+class RankingConfig:
+    """排位赛配置，段位阈值预先排序以便二分查找"""
+
+    __slots__ = ("cooldown", "base_reward", "win_bonus", "tier_bonus", "_thresholds", "_tiers")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.cooldown: int = int(raw["cooldown"])
+        self.base_reward: int = int(raw["baseReward"])
+        self.win_bonus: float = float(raw["winBonus"])
+        self.tier_bonus: Dict[str, float] = {tier: float(bonus) for tier, bonus in raw["tierBonus"].items()}
+        ordered = sorted((int(points), tier) for tier, points in raw["tierThresholds"].items())
+        self._thresholds: List[int] = [points for points, _ in ordered]
+        self._tiers: List[str] = [tier for _, tier in ordered]
+
+    def tier_for(self, points: int) -> str:
+        """积分对应的段位"""
+        index = bisect.bisect_right(self._thresholds, points) - 1
+        return self._tiers[max(index, 0)]
+
+
+class TransferConfig:
+    """转账配置"""
+
+    __slots__ = ("fee_rate", "min_amount")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.fee_rate: float = float(raw["feeRate"])
+        self.min_amount: int = int(raw["minAmount"])
+
+
+class WeeklyResetConfig:
+    """每周重置配置"""
+
+    __slots__ = ("enabled", "day", "hour", "minute", "preserve_nickname", "basic_value", "chunk_size")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.enabled: bool = bool(raw["enabled"])
+        # 0=周日, 1=周一, ..., 6=周六
+        self.day: int = int(raw["resetTime"]["day"])
+        self.hour: int = int(raw["resetTime"]["hour"])
+        self.minute: int = int(raw["resetTime"]["minute"])
+        self.preserve_nickname: bool = bool(raw["preserveData"]["nickname"])
+        self.basic_value: int = int(raw["preserveData"]["basicValue"])
+        self.chunk_size: int = max(1, int(raw["chunkSize"]))
+
+
+class StorageConfig:
+    """存储配置"""
+
+    __slots__ = (
+        "engine",
+        "sqlite_path",
+        "cache_size",
+        "flush_interval",
+        "flush_threshold",
+        "codec",
+        "io_workers",
+        "parallel_reads",
+        "journal_enabled",
+        "journal_commit_interval",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.engine: str = str(raw["engine"])
+        self.sqlite_path: str = str(raw["sqlitePath"])
+        self.cache_size: int = int(raw["cacheSize"])
+        self.flush_interval: float = float(raw["flushInterval"])
+        self.flush_threshold: int = int(raw["flushThreshold"])
+        self.codec: str = str(raw["codec"])
+        self.io_workers: int = int(raw["ioWorkers"])
+        self.parallel_reads: bool = bool(raw["parallelReads"])
+        self.journal_enabled: bool = bool(raw["journal"]["enabled"])
+        self.journal_commit_interval: float = float(raw["journal"]["commitInterval"])
+
+
+class ReplyCacheConfig:
+    """回复缓存配置"""
+
+    __slots__ = ("capacity",)
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.capacity: int = int(raw["capacity"])
+
+
+class ArchiveConfig:
+    """重置归档配置"""
+
+    __slots__ = ("keep_weeks", "prune_interval")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.keep_weeks: int = int(raw["keepWeeks"])
+        self.prune_interval: float = float(raw["pruneInterval"])
+
+
+class RenderConfig:
+    """卡片渲染配置"""
+
+    __slots__ = ("enabled", "renderer", "workers", "cache_size", "width", "font_path")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.enabled: bool = bool(raw["enabled"])
+        self.renderer: str = str(raw["renderer"])
+        self.workers: int = int(raw["workers"])
+        self.cache_size: int = int(raw["cacheSize"])
+        self.width: int = int(raw["width"])
+        self.font_path: str = str(raw["fontPath"] or "")
+
+
+class BucketConfig:
+    """令牌桶参数：容量与每秒补充的令牌数"""
+
+    __slots__ = ("capacity", "refill_per_second")
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.capacity: float = max(1.0, float(raw["capacity"]))
+        self.refill_per_second: float = max(0.0, float(raw["refillPerSecond"]))
+
+
+class AdmissionConfig:
+    """指令准入配置，expensive_commands 中的指令额外受更严格的令牌桶限制"""
+
+    __slots__ = (
+        "enabled",
+        "group",
+        "user",
+        "expensive_commands",
+        "expensive_group",
+        "expensive_user",
+        "notice_interval",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.enabled: bool = bool(raw["enabled"])
+        self.group = BucketConfig(raw["group"])
+        self.user = BucketConfig(raw["user"])
+        expensive = raw["expensive"]
+        self.expensive_commands: FrozenSet[str] = frozenset(str(name) for name in expensive["commands"] or [])
+        self.expensive_group = BucketConfig(expensive["group"])
+        self.expensive_user = BucketConfig(expensive["user"])
+        self.notice_interval: float = float(raw["noticeInterval"])
+
+
+class PluginConfig:
+    """编译后的插件配置
+
+    由 compile_config 创建后不再修改；热重载时整体替换为新对象，
+    正在执行的指令继续使用旧对象，不会读到一半新一半旧的配置
+    """
+
+    __slots__ = (
+        "buy_back",
+        "rob",
+        "work",
+        "purchase",
+        "bank",
+        "training",
+        "arena",
+        "ranking",
+        "transfer",
+        "ignore_cd_users",
+        "weekly_reset",
+        "storage",
+        "reply_cache",
+        "archive",
+        "render",
+        "admission",
+        "cooldowns",
+        "raw",
+    )
+
+    def __init__(self, raw: Dict[str, Any]):
+        self.buy_back = BuyBackConfig(raw["buyBack"])
+        self.rob = RobConfig(raw["rob"])
+        self.work = WorkConfig(raw["work"])
+        self.purchase = CooldownConfig(raw["purchase"])
+        self.bank = BankConfig(raw["bank"])
+        self.training = TrainingConfig(raw["training"])
+        self.arena = ArenaConfig(raw["arena"])
+        self.ranking = RankingConfig(raw["ranking"])
+        self.transfer = TransferConfig(raw["transfer"])
+        self.ignore_cd_users: FrozenSet[str] = frozenset(str(uid) for uid in raw["ignoreCDUsers"] or [])
+        self.weekly_reset = WeeklyResetConfig(raw["weeklyReset"])
+        self.storage = StorageConfig(raw["storage"])
+        self.reply_cache = ReplyCacheConfig(raw["replyCache"])
+        self.archive = ArchiveConfig(raw["archive"])
+        self.render = RenderConfig(raw["render"])
+        self.admission = AdmissionConfig(raw["admission"])
+        # 各冷却动作的时长（秒）
+        self.cooldowns: Dict[str, int] = {
+            "work": self.work.cooldown,
+            "purchase": self.purchase.cooldown,
+            "buyback": self.buy_back.cooldown,
+            "rob": self.rob.cooldown,
+            "training": self.training.cooldown,
+            "arena": self.arena.cooldown,
+            "ranking": self.ranking.cooldown,
+        }
+        # 合并后的原始配置，用于比较两次加载之间的差异
+        self.raw = raw
+
+    def restart_required(self, other: "PluginConfig") -> List[str]:
+        """与另一份配置相比，有变化且需要重启才能生效的配置项"""
+        return [section for section in RESTART_SECTIONS if self.raw[section] != other.raw[section]]
+
+
+def compile_config(overrides: Optional[Dict[str, Any]] = None) -> PluginConfig:
+    """将用户配置与默认配置深度合并并编译
+
+    Args:
+        overrides: 用户配置，为None时只使用默认配置
+
+    Returns:
+        PluginConfig: 编译后的配置
+
+    Raises:
+        KeyError, TypeError, ValueError: 配置项缺失或类型错误
+    """
+    return PluginConfig(deep_merge(DEFAULT_CONFIG, overrides or {}))
+
+
+def load_config_file(path: str) -> PluginConfig:
+    """读取并编译配置文件
+
+    Args:
+        path: config.yaml路径
+
+    Returns:
+        PluginConfig: 编译后的配置
+
+    Raises:
+        OSError, yaml.YAMLError, KeyError, TypeError, ValueError: 读取、解析或编译失败
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        overrides = yaml.safe_load(f) or {}
+    if not isinstance(overrides, dict):
+        raise ValueError("配置文件顶层必须是映射")
+    return compile_config(overrides)
@@ -0,0 +1,250 @@
+"""
+冷却时间模块
+所有指令的冷却时间集中保存在内存中，按群组维护到期时间的最小堆，
+定时整组写回磁盘；冷却中的指令不需要读取玩家数据即可拒绝
+"""
+
+import heapq
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .codec import JsonCodec, read_file, write_file
+
+# 冷却动作在 #我的冷却 中显示的名称，按显示顺序排列
+ACTION_NAMES = {
+    "work": "打工",
+    "purchase": "购买奴隶",
+    "buyback": "赎身",
+    "rob": "抢劫",
+    "training": "训练奴隶",
+    "arena": "奴隶决斗",
+    "ranking": "排位赛",
+}
+
+
+def format_remaining(seconds: int) -> str:
+    """把剩余秒数格式化为便于阅读的时长"""
+    hours, minutes = seconds // 3600, (seconds % 3600) // 60
+    if hours:
+        return f"{hours}小时{minutes}分钟"
+    if minutes:
+        return f"{minutes}分钟{seconds % 60}秒"
+    return f"{seconds}秒"
+
+
+class GroupCooldowns:
+    """一个群组的冷却到期时间
+
+    expiries 保存 用户ID -> {动作: 到期时间戳}；heap 按到期时间排序，
+    条目被新的冷却覆盖后旧条目留在堆中，弹出时与 expiries 比对后丢弃
+    """
+
+    __slots__ = ("expiries", "heap")
+
+    def __init__(self, expiries: Optional[Dict[str, Dict[str, int]]] = None):
+        self.expiries: Dict[str, Dict[str, int]] = expiries or {}
+        self.heap: List[Tuple[int, str, str]] = [
+            (expires_at, user_id, action)
+            for user_id, actions in self.expiries.items()
+            for action, expires_at in actions.items()
+        ]
+        heapq.heapify(self.heap)
+
+    def purge(self, now: int) -> int:
+        """删除所有已经到期的冷却
+
+        Returns:
+            int: 删除的条数
+        """
+        removed = 0
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, user_id, action = heapq.heappop(self.heap)
+            actions = self.expiries.get(user_id)
+            if actions is None or actions.get(action) != expires_at:
+                continue
+            del actions[action]
+            if not actions:
+                del self.expiries[user_id]
+            removed += 1
+        return removed
+
+
+class CooldownService:
+    """集中管理的冷却时间
+
+    文件 data/cooldowns/<group_id>.json 保存一个群组所有未到期的冷却，
+    启动时全部读入内存，之后的检查都只查内存；修改过的群组由 flush 整组写回。
+    写回之间异常退出时，最近一次写回之后开始的冷却会丢失。
+    """
+
+    def __init__(self, cooldown_dir: str):
+        """初始化冷却服务
+
+        Args:
+            cooldown_dir: 冷却数据目录
+        """
+        self.cooldown_dir = cooldown_dir
+        self._codec = JsonCodec()
+        self._groups: Dict[str, GroupCooldowns] = {}
+        self._dirty: set = set()
+        # 冷却在事件循环中读写，重置任务会在IO线程中清除整个群组
+        self._lock = threading.Lock()
+
+    def group_path(self, group_id: str) -> str:
+        """获取群组冷却文件路径"""
+        return os.path.join(self.cooldown_dir, f"{group_id}.json")
+
+    def exists(self) -> bool:
+        """冷却数据目录是否已经存在（不存在时需要从玩家数据迁移）"""
+        return os.path.isdir(self.cooldown_dir)
+
+    def load_all(self) -> int:
+        """读入所有群组的冷却，丢弃已经到期的部分
+
+        Returns:
+            int: 读入的未到期冷却条数
+        """
+        now = int(time.time())
+        loaded = 0
+        if not os.path.isdir(self.cooldown_dir):
+            return 0
+        with self._lock:
+            for filename in os.listdir(self.cooldown_dir):
+                if not filename.endswith(".json"):
+                    continue
+                group_id = filename[:-5]
+                expiries = {
+                    user_id: {action: int(expires_at) for action, expires_at in actions.items()}
+                    for user_id, actions in read_file(os.path.join(self.cooldown_dir, filename)).items()
+                }
+                group = GroupCooldowns(expiries)
+                group.purge(now)
+                self._groups[group_id] = group
+                loaded += len(group.heap)
+        return loaded
+
+    def migrate(
+        self,
+        groups: Iterable[Tuple[str, Dict[str, Dict[str, Any]]]],
+        durations: Dict[str, int],
+    ) -> int:
+        """从玩家数据中的 cooldowns 与 lastRobTime 字段导入冷却
+
+        Args:
+            groups: (群组ID, 用户ID -> 玩家数据) 序列，可以逐个群组读取
+            durations: 动作名到冷却时长（秒）的映射
+
+        Returns:
+            int: 导入的未到期冷却条数
+        """
+        now = int(time.time())
+        for group_id, records in groups:
+            for user_id, data in records.items():
+                started = dict(data.get("cooldowns") or {})
+                if data.get("lastRobTime"):
+                    started["rob"] = data["lastRobTime"]
+                for action, started_at in started.items():
+                    if action in durations and started_at:
+                        expires_at = int(started_at) + durations[action]
+                        if expires_at > now:
+                            self.start(group_id, user_id, action, expires_at - now, now)
+        os.makedirs(self.cooldown_dir, exist_ok=True)
+        self.flush()
+        return sum(len(actions) for group in self._groups.values() for actions in group.expiries.values())
+
+    def remaining(self, group_id: str, user_id: str, action: str, now: Optional[int] = None) -> int:
+        """剩余冷却时间
+
+        Returns:
+            int: 剩余秒数，不在冷却中时为0
+        """
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is None:
+                return 0
+            expires_at = group.expiries.get(user_id, {}).get(action, 0)
+        return max(0, expires_at - now)
+
+    def active(self, group_id: str, user_id: str, now: Optional[int] = None) -> Dict[str, int]:
+        """玩家所有未到期的冷却
+
+        Returns:
+            Dict[str, int]: 动作 -> 剩余秒数
+        """
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is None:
+                return {}
+            return {
+                action: expires_at - now
+                for action, expires_at in group.expiries.get(user_id, {}).items()
+                if expires_at > now
+            }
+
+    def start(self, group_id: str, user_id: str, action: str, duration: int, now: Optional[int] = None) -> None:
+        """开始一次冷却
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            action: 动作名
+            duration: 冷却时长（秒）
+            now: 当前时间戳
+        """
+        now = int(time.time()) if now is None else now
+        if duration <= 0:
+            return
+        expires_at = now + duration
+        with self._lock:
+            group = self._groups.get(group_id)
+            if group is None:
+                group = self._groups[group_id] = GroupCooldowns()
+            # 顺便清理到期的条目，堆的大小不超过未到期冷却数量太多
+            group.purge(now)
+            group.expiries.setdefault(user_id, {})[action] = expires_at
+            heapq.heappush(group.heap, (expires_at, user_id, action))
+            self._dirty.add(group_id)
+
+    def clear_group(self, group_id: str) -> None:
+        """清除群组内所有冷却（每周重置时调用）"""
+        with self._lock:
+            if self._groups.pop(group_id, None) is not None:
+                self._dirty.add(group_id)
+
+    def flush(self) -> int:
+        """把修改过的群组整组写回磁盘
+
+        Returns:
+            int: 写回的群组数量
+        """
+        now = int(time.time())
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            snapshots = {}
+            for group_id in dirty:
+                group = self._groups.get(group_id)
+                if group is not None:
+                    group.purge(now)
+                snapshots[group_id] = (
+                    {user_id: dict(actions) for user_id, actions in group.expiries.items()}
+                    if group is not None else {}
+                )
+
+        os.makedirs(self.cooldown_dir, exist_ok=True)
+        try:
+            for group_id, expiries in snapshots.items():
+                path = self.group_path(group_id)
+                if expiries:
+                    write_file(path, expiries, self._codec)
+                elif os.path.exists(path):
+                    os.remove(path)
+        except Exception:
+            # 写回失败的群组留到下次重试
+            with self._lock:
+                self._dirty.update(snapshots)
+            raise
+        return len(snapshots)
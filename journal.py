@@ -0,0 +1,259 @@
+"""
+玩家数据变更日志模块
+以追加写的方式记录玩家数据的字段级增量，定期合并回存储引擎
+"""
+
+import copy
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+_SEGMENT_PATTERN = re.compile(r"^(?P<group>.+)\.(?P<gen>\d+)\.log$")
+
+
+def diff_records(
+    old: Optional[Dict[str, Any]], new: Dict[str, Any]
+) -> Optional[Dict[str, List[Any]]]:
+    """计算两份玩家数据之间的字段级增量
+
+    Args:
+        old: 变更前的数据，None表示新建
+        new: 变更后的数据
+
+    Returns:
+        Optional[Dict[str, List[Any]]]: 增量，{"s": [[路径, 新值], ...], "d": [路径, ...]}，
+            没有变化时返回None
+    """
+    sets: List[Any] = []
+    dels: List[Any] = []
+
+    def walk(before: Any, after: Any, path: List[str]) -> None:
+        if not isinstance(before, dict) or not isinstance(after, dict):
+            if before != after:
+                sets.append([path, after])
+            return
+        for key, value in after.items():
+            if key not in before:
+                sets.append([path + [key], value])
+            else:
+                walk(before[key], value, path + [key])
+        for key in before:
+            if key not in after:
+                dels.append(path + [key])
+
+    walk(old, new, [])
+    if not sets and not dels:
+        return None
+    return {"s": sets, "d": dels}
+
+
+def apply_delta(
+    record: Optional[Dict[str, Any]], delta: Dict[str, List[Any]]
+) -> Dict[str, Any]:
+    """将增量应用到玩家数据上
+
+    Args:
+        record: 原始数据，None表示不存在
+        delta: diff_records生成的增量
+
+    Returns:
+        Dict[str, Any]: 应用增量后的数据
+    """
+    record = record if record is not None else {}
+    for path, value in delta.get("s", []):
+        if not path:
+            record = copy.deepcopy(value)
+            continue
+        node = record
+        for key in path[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        node[path[-1]] = copy.deepcopy(value)
+    for path in delta.get("d", []):
+        node = record
+        for key in path[:-1]:
+            node = node.get(key)
+            if not isinstance(node, dict):
+                break
+        else:
+            node.pop(path[-1], None)
+    return record
+
+
+class MutationJournal:
+    """追加写的变更日志
+
+    每个群组、每一代各一个日志文件：data/journal/<group_id>.<gen>.log，
+    每行是一次保存产生的增量。record只在内存中缓冲，commit统一追加写入并fsync
+    （组提交）；检查点时先seal切换到新的一代，数据写回存储引擎后删除旧的各代日志。
+
+    与玩家数据在同一次操作中修改的其他追加写日志（如银行流水）通过add_precommit注册，
+    每次提交前先把它们写入磁盘，玩家数据的增量不会比对应的流水先落盘
+    """
+
+    def __init__(self, journal_dir: str):
+        """初始化日志
+
+        Args:
+            journal_dir: 日志目录
+        """
+        self.journal_dir = journal_dir
+        os.makedirs(journal_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._buffer: List[Tuple[str, int, str]] = []
+        self._generation = 0
+        self._precommit: List[Callable[[], Any]] = []
+
+    def add_precommit(self, flush: Callable[[], Any]) -> None:
+        """注册每次提交前需要先落盘的缓冲
+
+        Args:
+            flush: 把缓冲写入磁盘的函数，抛出异常时本次提交不写入，缓冲的变更留到下次
+        """
+        self._precommit.append(flush)
+
+    def _segment_path(self, group_id: str, generation: int) -> str:
+        """获取日志文件路径"""
+        return os.path.join(self.journal_dir, f"{group_id}.{generation}.log")
+
+    def _segments(self) -> List[Tuple[int, str, str]]:
+        """列出磁盘上的所有日志文件
+
+        Returns:
+            List[Tuple[int, str, str]]: 按代排序的(代, 群组ID, 文件路径)列表
+        """
+        segments = []
+        for filename in os.listdir(self.journal_dir):
+            match = _SEGMENT_PATTERN.match(filename)
+            if match:
+                segments.append((
+                    int(match.group("gen")),
+                    match.group("group"),
+                    os.path.join(self.journal_dir, filename),
+                ))
+        segments.sort()
+        return segments
+
+    def record(self, group_id: str, changes: Dict[str, Dict[str, List[Any]]]) -> None:
+        """记录一次变更（仅写入内存缓冲）
+
+        同一次调用中的多个玩家增量写在同一行，回放时要么全部生效要么全部丢弃
+
+        Args:
+            group_id: 群组ID
+            changes: 用户ID到增量的映射
+        """
+        if not changes:
+            return
+        line = json.dumps(
+            {"t": int(time.time()), "ops": changes},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        with self._lock:
+            self._buffer.append((group_id, self._generation, line))
+
+    def commit(self) -> int:
+        """将缓冲中的变更追加写入日志文件并fsync
+
+        Returns:
+            int: 写入的变更条数
+        """
+        for flush in self._precommit:
+            flush()
+        with self._lock:
+            pending, self._buffer = self._buffer, []
+        if not pending:
+            return 0
+
+        grouped: Dict[Tuple[str, int], List[str]] = {}
+        for group_id, generation, line in pending:
+            grouped.setdefault((group_id, generation), []).append(line)
+
+        for (group_id, generation), lines in grouped.items():
+            with open(self._segment_path(group_id, generation), "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        return len(pending)
+
+    def seal(self) -> int:
+        """切换到新的一代日志
+
+        Returns:
+            int: 被封存的代号，之前记录的变更都属于不大于该代号的日志
+        """
+        with self._lock:
+            sealed = self._generation
+            self._generation += 1
+            return sealed
+
+    def remove_sealed(self, sealed: int) -> None:
+        """删除已合并到存储引擎的各代日志
+
+        调用前需先commit，保证旧代的缓冲已经全部落盘
+
+        Args:
+            sealed: seal返回的代号
+        """
+        for generation, _, path in self._segments():
+            if generation <= sealed:
+                os.remove(path)
+
+    def discard_group(self, group_id: str) -> None:
+        """丢弃某个群组的全部日志（群组数据被整体重写时使用）
+
+        Args:
+            group_id: 群组ID
+        """
+        with self._lock:
+            self._buffer = [item for item in self._buffer if item[0] != group_id]
+        for _, segment_group, path in self._segments():
+            if segment_group == group_id:
+                os.remove(path)
+
+    def replay(self, storage) -> int:
+        """将磁盘上残留的日志回放到存储引擎（启动时调用）
+
+        末尾写了一半的行会被忽略
+
+        Args:
+            storage: 存储引擎
+
+        Returns:
+            int: 回放的变更条数
+        """
+        segments = self._segments()
+        if not segments:
+            return 0
+
+        records: Dict[str, Dict[str, Optional[Dict[str, Any]]]] = {}
+        replayed = 0
+        for _, group_id, path in segments:
+            group_records = records.setdefault(group_id, {})
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"跳过损坏的变更日志行: {path}")
+                        continue
+                    for user_id, delta in entry["ops"].items():
+                        if user_id not in group_records:
+                            group_records[user_id] = storage.load(group_id, user_id)
+                        group_records[user_id] = apply_delta(group_records[user_id], delta)
+                    replayed += 1
+
+        for group_id, group_records in records.items():
+            if group_records:
+                storage.save_many(group_id, group_records)
+        for _, _, path in segments:
+            os.remove(path)
+        self._generation = 0
+        return replayed
@@ -0,0 +1,312 @@
+"""
+排行榜索引模块
+按群组、按指标维护有序索引，每次保存玩家数据时增量更新
+"""
+
+import random
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .storage import METRICS, player_metrics
+
+SortKey = Tuple[int, str]
+
+
+def player_summary(user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """提取排行榜展示所需的玩家摘要
+
+    字段与排行榜备份中的玩家条目一致
+
+    Args:
+        user_id: 用户ID
+        data: 玩家数据
+
+    Returns:
+        Dict[str, Any]: 玩家摘要
+    """
+    arena = data.get("arena", {})
+    return {
+        "user_id": user_id,
+        "nickname": data.get("nickname", ""),
+        "currency": data.get("currency", 0),
+        "value": data.get("value", 0),
+        "slaves_count": len(data.get("slaves", [])),
+        "arena": {
+            "tier": arena.get("tier", "青铜"),
+            "points": arena.get("points", 0),
+            "wins": arena.get("wins", 0),
+            "losses": arena.get("losses", 0),
+        },
+    }
+
+
+class _SkipNode:
+    __slots__ = ("key", "forward", "width")
+
+    def __init__(self, key: Optional[SortKey], level: int):
+        self.key = key
+        self.forward: List[Optional["_SkipNode"]] = [None] * level
+        # width[i]为沿第i层指针前进一步跨过的底层节点数，用于按名次定位
+        self.width: List[int] = [1] * level
+
+
+class SkipList:
+    """带跨度的有序跳表（顺序统计结构）
+
+    插入、删除、查询名次、按名次定位期望均为O(log n)，
+    从任意名次开始顺序读取k个为O(log n + k)
+    """
+
+    MAX_LEVEL = 32
+    P = 0.25
+
+    def __init__(self):
+        self._head = _SkipNode(None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and random.random() < self.P:
+            level += 1
+        return level
+
+    def insert(self, key: SortKey) -> None:
+        """插入键（键需唯一）"""
+        update = [self._head] * self.MAX_LEVEL
+        ranks = [0] * self.MAX_LEVEL
+        node = self._head
+        pos = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                pos += node.width[i]
+                node = node.forward[i]
+            update[i] = node
+            ranks[i] = pos
+
+        level = self._random_level()
+        if level > self._level:
+            for i in range(self._level, level):
+                # 表头在新层上直接指向表尾
+                self._head.forward[i] = None
+                self._head.width[i] = self._size + 1
+            self._level = level
+
+        new_node = _SkipNode(key, level)
+        for i in range(level):
+            prev = update[i]
+            new_node.forward[i] = prev.forward[i]
+            prev.forward[i] = new_node
+            new_node.width[i] = prev.width[i] - (pos - ranks[i])
+            prev.width[i] = pos - ranks[i] + 1
+        for i in range(level, self._level):
+            update[i].width[i] += 1
+        self._size += 1
+
+    def remove(self, key: SortKey) -> bool:
+        """删除键
+
+        Returns:
+            bool: 键是否存在
+        """
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key < key:
+                node = node.forward[i]
+            update[i] = node
+        target = update[0].forward[0]
+        if target is None or target.key != key:
+            return False
+        for i in range(self._level):
+            if update[i].forward[i] is target:
+                update[i].width[i] += target.width[i] - 1
+                update[i].forward[i] = target.forward[i]
+            else:
+                update[i].width[i] -= 1
+        while self._level > 1 and self._head.forward[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    def rank(self, key: SortKey) -> Optional[int]:
+        """查询键的名次
+
+        Returns:
+            Optional[int]: 从1开始的名次，键不存在时返回None
+        """
+        node = self._head
+        pos = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and node.forward[i].key <= key:
+                pos += node.width[i]
+                node = node.forward[i]
+        if node is not self._head and node.key == key:
+            return pos
+        return None
+
+    def iter_from(self, offset: int) -> Iterator[SortKey]:
+        """从第offset个键（从0开始）起顺序遍历"""
+        if offset < 0 or offset >= self._size:
+            return
+        node = self._head
+        pos = 0
+        for i in range(self._level - 1, -1, -1):
+            while node.forward[i] is not None and pos + node.width[i] <= offset + 1:
+                pos += node.width[i]
+                node = node.forward[i]
+        while node is not None:
+            yield node.key
+            node = node.forward[0]
+
+    def __iter__(self) -> Iterator[SortKey]:
+        return self.iter_from(0)
+
+
+class GroupLeaderboard:
+    """单个群组的排行榜索引
+
+    每个指标一个跳表，键为(-指标值, 用户ID)，从表头开始即为从高到低的排名
+    """
+
+    def __init__(self):
+        self._lists: Dict[str, SkipList] = {metric: SkipList() for metric in METRICS}
+        self._metrics: Dict[str, Dict[str, int]] = {}
+        self._summaries: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._summaries)
+
+    def update(self, user_id: str, data: Dict[str, Any]) -> None:
+        """更新玩家在各个指标上的位置"""
+        new_metrics = player_metrics(data)
+        old_metrics = self._metrics.get(user_id)
+        for metric, value in new_metrics.items():
+            if old_metrics is not None:
+                if old_metrics[metric] == value:
+                    continue
+                self._lists[metric].remove((-old_metrics[metric], user_id))
+            self._lists[metric].insert((-value, user_id))
+        self._metrics[user_id] = new_metrics
+        self._summaries[user_id] = player_summary(user_id, data)
+
+    def remove(self, user_id: str) -> None:
+        """从索引中移除玩家"""
+        old_metrics = self._metrics.pop(user_id, None)
+        self._summaries.pop(user_id, None)
+        if old_metrics is not None:
+            for metric, value in old_metrics.items():
+                self._lists[metric].remove((-value, user_id))
+
+    def top(self, metric: str, limit: int) -> List[Dict[str, Any]]:
+        """获取指标排名前limit的玩家摘要"""
+        return self.page(metric, 0, limit)
+
+    def page(self, metric: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """获取指标排名中从第offset名（从0开始）起的limit个玩家摘要"""
+        result = []
+        for _, user_id in self._lists[metric].iter_from(offset):
+            if len(result) >= limit:
+                break
+            result.append(self._summaries[user_id])
+        return result
+
+    def rank(self, metric: str, user_id: str) -> Optional[int]:
+        """查询玩家在指标上的名次
+
+        Args:
+            metric: 指标名
+            user_id: 用户ID
+
+        Returns:
+            Optional[int]: 从1开始的名次，玩家不在索引中时返回None
+        """
+        metrics = self._metrics.get(user_id)
+        if metrics is None:
+            return None
+        return self._lists[metric].rank((-metrics[metric], user_id))
+
+    def summary(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取玩家摘要"""
+        return self._summaries.get(user_id)
+
+
+class LeaderboardIndex:
+    """所有群组的排行榜索引
+
+    群组索引在第一次查询时由完整数据构建，之后通过缓存写入回调增量维护；
+    构建期间到达的更新先暂存，构建完成后再应用
+    """
+
+    def __init__(self):
+        self._boards: Dict[str, GroupLeaderboard] = {}
+        self._building: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, group_id: str) -> Optional[GroupLeaderboard]:
+        """获取已构建的群组索引，未构建时返回None"""
+        return self._boards.get(group_id)
+
+    def begin_build(self, group_id: str) -> None:
+        """标记群组索引开始构建"""
+        with self._lock:
+            if group_id not in self._boards:
+                self._building.setdefault(group_id, {})
+
+    def finish_build(
+        self, group_id: str, records: Dict[str, Dict[str, Any]]
+    ) -> GroupLeaderboard:
+        """用完整的群组数据完成构建
+
+        Args:
+            group_id: 群组ID
+            records: 用户ID到玩家数据的映射
+
+        Returns:
+            GroupLeaderboard: 群组索引
+        """
+        with self._lock:
+            board = self._boards.get(group_id)
+            if board is not None:
+                return board
+            board = GroupLeaderboard()
+            for user_id, data in records.items():
+                board.update(user_id, data)
+            if group_id not in self._building:
+                # 构建期间群组被整体重写，这份数据可能已过期，只用于本次查询
+                return board
+            for user_id, data in self._building.pop(group_id).items():
+                board.update(user_id, data)
+            self._boards[group_id] = board
+            return board
+
+    def player_updated(self, group_id: str, records: Dict[str, Dict[str, Any]]) -> None:
+        """缓存写入回调：增量更新排行"""
+        with self._lock:
+            board = self._boards.get(group_id)
+            if board is not None:
+                for user_id, data in records.items():
+                    board.update(user_id, data)
+            elif group_id in self._building:
+                self._building[group_id].update(records)
+
+    def players_removed(self, group_id: str, user_ids: List[str]) -> None:
+        """玩家数据被删除：从索引中移除
+
+        构建期间删除时，构建用的完整数据可能仍包含这些玩家，放弃本次构建
+        """
+        with self._lock:
+            board = self._boards.get(group_id)
+            if board is not None:
+                for user_id in user_ids:
+                    board.remove(user_id)
+            self._building.pop(group_id, None)
+
+    def group_invalidated(self, group_id: str) -> None:
+        """群组数据被整体重写时的回调：丢弃索引，下次查询时重建"""
+        with self._lock:
+            self._boards.pop(group_id, None)
+            self._building.pop(group_id, None)
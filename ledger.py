@@ -0,0 +1,455 @@
+"""
+银行账本模块
+每个群组一个追加写的银行流水文件，定期写入账户快照；
+利息按小时复利，读取账户时从上次计息时间一次算出，不需要逐小时累加
+"""
+
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+from astrbot.api import logger
+
+from .codec import JsonCodec, read_file, write_file
+
+if TYPE_CHECKING:
+    from .config import BankConfig
+
+# 流水类型在 #银行流水 中显示的名称
+ENTRY_NAMES = {
+    "open": "开户",
+    "deposit": "存款",
+    "withdraw": "取款",
+    "upgrade": "升级信用",
+    "interest": "利息",
+    "revert": "撤销",
+}
+
+# 查询流水时从日志末尾向前最多扫描的字节数
+TAIL_SCAN_BYTES = 1 << 20
+
+
+def accrue_interest(balance: int, hours: int, rate: float, limit: int) -> int:
+    """按小时复利计算hours小时后的余额
+
+    利息计入后的余额不超过存款限额，已达到限额时不再产生利息
+
+    Args:
+        balance: 当前余额
+        hours: 经过的整小时数
+        rate: 每小时利率
+        limit: 存款限额
+
+    Returns:
+        int: 计息后的余额
+    """
+    if balance <= 0 or hours <= 0 or rate <= 0 or balance >= limit:
+        return balance
+    # 先比较对数，避免长时间未结算时幂运算溢出
+    if hours * math.log1p(rate) >= math.log(limit / balance):
+        return limit
+    return min(limit, int(balance * (1 + rate) ** hours))
+
+
+class BankAccount:
+    """一个玩家的银行账户
+
+    accrued_at 是上次计息时间，之后的利息在读取时按整小时算出
+    """
+
+    __slots__ = ("balance", "level", "accrued_at")
+
+    def __init__(self, balance: int, level: int, accrued_at: int):
+        self.balance = balance
+        self.level = level
+        self.accrued_at = accrued_at
+
+    def copy(self) -> "BankAccount":
+        return BankAccount(self.balance, self.level, self.accrued_at)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {"balance": self.balance, "level": self.level, "lastInterestTime": self.accrued_at}
+
+
+class GroupLedger:
+    """一个群组已读入内存的账户
+
+    pending 是尚未追加到日志文件的流水行，since_snapshot 是上次快照之后写入的流水条数
+    """
+
+    __slots__ = ("accounts", "pending", "since_snapshot")
+
+    def __init__(self, accounts: Dict[str, BankAccount], since_snapshot: int = 0):
+        self.accounts = accounts
+        self.pending: List[str] = []
+        self.since_snapshot = since_snapshot
+
+
+class BankLedger:
+    """追加写的银行账本
+
+    data/bank/<group_id>.log 每行是一笔流水，记录发生后账户的完整状态；
+    data/bank/<group_id>.snap 保存某个日志偏移处所有账户的状态。
+    读入群组时从快照开始回放之后的流水，存取款只在内存中修改账户并缓冲一行流水，
+    由 flush 统一追加写入，累计足够条数后顺便写一次新的快照。
+    读写账户的方法（view、post等）要求群组已在IO线程中经 load_group 读入，否则抛出RuntimeError。
+    """
+
+    def __init__(self, ledger_dir: str, settings: Callable[[], "BankConfig"]):
+        """初始化账本
+
+        Args:
+            ledger_dir: 账本目录
+            settings: 返回当前银行配置的函数，配置热重载后利率与限额随之生效
+        """
+        self.ledger_dir = ledger_dir
+        self.settings = settings
+        self._codec = JsonCodec()
+        self._groups: Dict[str, GroupLedger] = {}
+        # 账户在事件循环中读写，读入群组、写回与重置在IO线程中执行
+        self._lock = threading.Lock()
+        # 保证追加写与删除同一群组的文件不会交错
+        self._write_lock = threading.Lock()
+
+    def log_path(self, group_id: str) -> str:
+        """获取群组流水文件路径"""
+        return os.path.join(self.ledger_dir, f"{group_id}.log")
+
+    def snapshot_path(self, group_id: str) -> str:
+        """获取群组快照文件路径"""
+        return os.path.join(self.ledger_dir, f"{group_id}.snap")
+
+    def exists(self) -> bool:
+        """账本目录是否已经存在（不存在时需要从玩家数据迁移）"""
+        return os.path.isdir(self.ledger_dir)
+
+    def _read_group(self, group_id: str) -> GroupLedger:
+        """从快照与之后的流水恢复群组账户"""
+        accounts: Dict[str, BankAccount] = {}
+        offset = 0
+        snapshot_path = self.snapshot_path(group_id)
+        if os.path.exists(snapshot_path):
+            snapshot = read_file(snapshot_path)
+            offset = snapshot["offset"]
+            for user_id, state in snapshot["accounts"].items():
+                accounts[user_id] = BankAccount(state["balance"], state["level"], state["lastInterestTime"])
+
+        replayed = 0
+        log_path = self.log_path(group_id)
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f:
+                f.seek(offset)
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        logger.warning(f"跳过损坏的银行流水行: {log_path}")
+                        continue
+                    accounts[entry["u"]] = BankAccount(entry["bal"], entry["lvl"], entry["at"])
+                    replayed += 1
+        return GroupLedger(accounts, replayed)
+
+    def load_group(self, group_id: str) -> None:
+        """读入群组账户（已读入时直接返回），应在IO线程中调用"""
+        if group_id in self._groups:
+            return
+        group = self._read_group(group_id)
+        with self._lock:
+            self._groups.setdefault(group_id, group)
+
+    def _group(self, group_id: str) -> GroupLedger:
+        """获取已读入的群组，调用方需持有锁
+
+        读入群组要读取快照与日志，只能在IO线程中经 load_group 完成，
+        这里不兜底读取，避免在事件循环中持锁读盘
+
+        Raises:
+            RuntimeError: 群组尚未读入
+        """
+        group = self._groups.get(group_id)
+        if group is None:
+            raise RuntimeError(f"群组 {group_id} 的银行账本尚未读入，需先在IO线程中调用 load_group")
+        return group
+
+    def _settled(self, account: BankAccount, now: int) -> BankAccount:
+        """计入上次计息以来的利息后的账户副本"""
+        settings = self.settings()
+        settled = account.copy()
+        hours = (now - account.accrued_at) // 3600
+        if hours > 0:
+            settled.balance = accrue_interest(
+                account.balance, hours, settings.interest_rate, settings.limit(account.level)
+            )
+            settled.accrued_at += hours * 3600
+        return settled
+
+    def _new_account(self, now: int) -> BankAccount:
+        return BankAccount(0, self.settings().initial_level, now)
+
+    def _append(self, group: GroupLedger, user_id: str, op: str, amount: int, account: BankAccount, now: int) -> None:
+        """缓冲一行流水，调用方需持有锁"""
+        group.pending.append(json.dumps(
+            {"t": now, "u": user_id, "op": op, "amt": amount,
+             "bal": account.balance, "lvl": account.level, "at": account.accrued_at},
+            ensure_ascii=False,
+            separators=(",", ":"),
+        ))
+
+    def view(self, group_id: str, user_id: str, now: Optional[int] = None) -> BankAccount:
+        """读取计入利息后的账户，不修改账本
+
+        Returns:
+            BankAccount: 账户副本，没有账户时为新开户的状态
+        """
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            account = self._group(group_id).accounts.get(user_id)
+            if account is None:
+                return self._new_account(now)
+            return self._settled(account, now)
+
+    def pending_interest(self, group_id: str, user_id: str, now: Optional[int] = None) -> int:
+        """上次计息以来已产生、尚未记入流水的利息"""
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            account = self._group(group_id).accounts.get(user_id)
+            if account is None:
+                return 0
+            return self._settled(account, now).balance - account.balance
+
+    def post(
+        self,
+        group_id: str,
+        user_id: str,
+        op: str,
+        amount: int = 0,
+        balance_change: int = 0,
+        level_change: int = 0,
+        now: Optional[int] = None,
+    ) -> Tuple[BankAccount, int]:
+        """先结算利息，再记一笔流水
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            op: 流水类型，见 ENTRY_NAMES
+            amount: 流水金额（升级信用时为花费的现金）
+            balance_change: 余额变化
+            level_change: 信用等级变化
+            now: 当前时间戳
+
+        Returns:
+            Tuple[BankAccount, int]: 记账后的账户副本与本次结算的利息
+
+        Raises:
+            ValueError: 记账后余额为负
+        """
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            group = self._group(group_id)
+            previous = group.accounts.get(user_id) or self._new_account(now)
+            account = self._settled(previous, now)
+            interest = account.balance - previous.balance
+            if account.balance + balance_change < 0:
+                raise ValueError("存款余额不足")
+
+            if interest > 0:
+                self._append(group, user_id, "interest", interest, account, now)
+            elif op == "interest":
+                # 没有利息可结算时只推进计息时间，不记流水
+                group.accounts[user_id] = account
+                return account.copy(), 0
+
+            if op != "interest":
+                account.balance += balance_change
+                account.level += level_change
+                self._append(group, user_id, op, amount, account, now)
+            group.accounts[user_id] = account
+            return account.copy(), interest
+
+    def settle(self, group_id: str, user_id: str, now: Optional[int] = None) -> Tuple[BankAccount, int]:
+        """把已产生的利息记入流水
+
+        Returns:
+            Tuple[BankAccount, int]: 结算后的账户副本与结算的利息
+        """
+        return self.post(group_id, user_id, "interest", now=now)
+
+    def restore(self, group_id: str, user_id: str, state: Dict[str, Any], now: Optional[int] = None) -> BankAccount:
+        """按归档中的状态重新开户（恢复玩家数据时使用），从现在开始计息"""
+        now = int(time.time()) if now is None else now
+        account = BankAccount(int(state.get("balance", 0)), int(state.get("level", self.settings().initial_level)), now)
+        with self._lock:
+            group = self._group(group_id)
+            group.accounts[user_id] = account
+            self._append(group, user_id, "open", account.balance, account, now)
+            return account.copy()
+
+    def account_state(self, group_id: str, user_id: str) -> Optional[BankAccount]:
+        """读取账户当前记录的状态（不计入未结算的利息），没有账户时返回None
+
+        与 revert 配合，在工作单元失败时撤销其中的记账
+        """
+        with self._lock:
+            account = self._group(group_id).accounts.get(user_id)
+            return account.copy() if account is not None else None
+
+    def revert(self, group_id: str, user_id: str, state: Optional[BankAccount], now: Optional[int] = None) -> None:
+        """把账户恢复到 account_state 读取时的状态
+
+        已记的流水可能已经写入日志，因此不删除流水，而是追加一笔撤销流水记录恢复后的状态，
+        回放日志得到的仍是恢复后的账户
+        """
+        now = int(time.time()) if now is None else now
+        with self._lock:
+            group = self._group(group_id)
+            account = state.copy() if state is not None else self._new_account(now)
+            group.accounts[user_id] = account
+            self._append(group, user_id, "revert", 0, account, now)
+
+    def export(self, group_id: str) -> Dict[str, Dict[str, int]]:
+        """导出群组所有账户（每周重置前写入归档）"""
+        self.load_group(group_id)
+        with self._lock:
+            return {user_id: account.to_dict() for user_id, account in self._group(group_id).accounts.items()}
+
+    def statement(self, group_id: str, user_id: str, limit: int) -> List[Dict[str, Any]]:
+        """从日志末尾读取玩家最近的流水，应在IO线程中调用
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            limit: 最多返回的条数
+
+        Returns:
+            List[Dict[str, Any]]: 流水，最新的在前
+        """
+        entries: List[Dict[str, Any]] = []
+        with self._lock:
+            group = self._groups.get(group_id)
+            pending = list(group.pending) if group is not None else []
+        for line in reversed(pending):
+            entry = json.loads(line)
+            if entry["u"] == user_id:
+                entries.append(entry)
+                if len(entries) >= limit:
+                    return entries
+
+        path = self.log_path(group_id)
+        if not os.path.exists(path):
+            return entries
+        for line in self._reverse_lines(path):
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry["u"] == user_id:
+                entries.append(entry)
+                if len(entries) >= limit:
+                    break
+        return entries
+
+    @staticmethod
+    def _reverse_lines(path: str, block_size: int = 65536) -> Iterable[bytes]:
+        """从文件末尾向前逐行读取，最多扫描 TAIL_SCAN_BYTES 字节"""
+        with open(path, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            stop = max(0, position - TAIL_SCAN_BYTES)
+            remainder = b""
+            while position > stop:
+                size = min(block_size, position - stop)
+                position -= size
+                f.seek(position)
+                lines = (f.read(size) + remainder).split(b"\n")
+                # 第一段可能是被块边界截断的行，留到下一块拼接
+                remainder = lines.pop(0)
+                for line in reversed(lines):
+                    if line:
+                        yield line
+            if remainder and stop == 0:
+                yield remainder
+
+    def flush(self) -> int:
+        """把缓冲的流水追加写入日志，累计足够条数的群组顺便写入快照
+
+        Returns:
+            int: 写入的流水条数
+        """
+        interval = self.settings().snapshot_interval
+        with self._write_lock:
+            with self._lock:
+                batches = []
+                for group_id, group in self._groups.items():
+                    if not group.pending:
+                        continue
+                    lines, group.pending = group.pending, []
+                    group.since_snapshot += len(lines)
+                    snapshot = None
+                    if group.since_snapshot >= interval:
+                        # 账户副本与取出的流水是同一时刻的状态，快照偏移就是追加后的文件末尾
+                        snapshot = {user_id: account.to_dict() for user_id, account in group.accounts.items()}
+                        group.since_snapshot = 0
+                    batches.append((group_id, lines, snapshot))
+            if not batches:
+                return 0
+
+            os.makedirs(self.ledger_dir, exist_ok=True)
+            written = 0
+            for index, (group_id, lines, snapshot) in enumerate(batches):
+                try:
+                    with open(self.log_path(group_id), "ab") as f:
+                        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+                        f.flush()
+                        os.fsync(f.fileno())
+                        offset = f.tell()
+                except Exception:
+                    # 未写入的流水放回缓冲，下次重试
+                    with self._lock:
+                        for failed_group, failed_lines, _ in batches[index:]:
+                            group = self._groups.get(failed_group)
+                            if group is not None:
+                                group.pending[:0] = failed_lines
+                    raise
+                written += len(lines)
+                if snapshot is not None:
+                    write_file(self.snapshot_path(group_id), {"offset": offset, "accounts": snapshot}, self._codec)
+            return written
+
+    def reset_group(self, group_id: str) -> None:
+        """清空群组的账户与流水（每周重置时调用）"""
+        with self._write_lock:
+            with self._lock:
+                self._groups[group_id] = GroupLedger({})
+            for path in (self.log_path(group_id), self.snapshot_path(group_id)):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def migrate(self, groups: Iterable[Tuple[str, Dict[str, Dict[str, Any]]]]) -> int:
+        """从玩家数据中的 bank 字段导入账户，每个群组写成一份快照
+
+        Args:
+            groups: (群组ID, 用户ID -> 玩家数据) 序列，可以逐个群组读取
+
+        Returns:
+            int: 导入的账户数量
+        """
+        os.makedirs(self.ledger_dir, exist_ok=True)
+        migrated = 0
+        for group_id, records in groups:
+            accounts = {
+                user_id: {
+                    "balance": int(data["bank"].get("balance", 0)),
+                    "level": int(data["bank"].get("level", 1)),
+                    "lastInterestTime": int(data["bank"].get("lastInterestTime") or time.time()),
+                }
+                for user_id, data in records.items()
+                if data.get("bank")
+            }
+            if accounts:
+                write_file(self.snapshot_path(group_id), {"offset": 0, "accounts": accounts}, self._codec)
+                migrated += len(accounts)
+        return migrated
@@ -15,20 +15,33 @@ import json
 import os
 import random
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional
 
 import astrbot.api.message_components as Comp
-import yaml
 from astrbot.api import logger
 from astrbot.api.event import AstrMessageEvent, filter
 from astrbot.api.star import Context, Star, register
 
 # 导入功能模块
+from .admission import AdmissionController, admission_control
 from .bank import BankModule
+from .codec import convert_file, get_codec
+from .config import PluginConfig, compile_config, load_config_file
+from .cooldown import ACTION_NAMES, CooldownService, format_remaining
+from .journal import MutationJournal
+from .ledger import BankLedger
+from .leaderboard import GroupLeaderboard, LeaderboardIndex
+from .ownership import GroupOwnership, OwnershipIndex
 from .ranking import RankingModule
+from .renderer import create_renderer
+from .reply_cache import ReplyCache
 from .rob import RobModule
 from .slave_management import SlaveManagementModule
+from .storage import GroupRoster, PlayerCache, RosterIndex, VirtualPlayers, create_storage, is_untouched_default
+from .timeseries import MetricTimeSeries
+from .transaction import PlayerLockManager, PlayerTransaction, RequestContext, unit_of_work
 from .training import TrainingModule
 from .weekly_reset import WeeklyResetModule
 
@@ -47,6 +60,15 @@ class SlaveMarketPlugin(Star):
     使用@register装饰器注册插件元数据信息。
     """
 
+    # 批量冷读取达到该数量时才拆分到多个IO线程并行
+    PARALLEL_READ_MIN = 32
+
+    # 检查配置文件是否修改的间隔（秒）
+    CONFIG_CHECK_INTERVAL = 5
+
+    # 清理默认玩家时每批加锁并删除的玩家数量
+    CLEANUP_CHUNK_SIZE = 200
+
     def __init__(self, context: Context):
         """插件初始化
 
@@ -75,6 +97,96 @@ class SlaveMarketPlugin(Star):
         # 加载文案
         self.copywriting = self.load_copywriting()
 
+        # 初始化存储引擎与玩家数据缓存
+        storage_config = self.config.storage
+        self.storage = create_storage(self.data_path, storage_config)
+
+        # 回放上次异常退出时残留的变更日志
+        # 玩家数据写回时同一群组合并为一次批量写入，SQLite在一个事务中完成；
+        # JSON引擎逐个文件替换，中途退出时多玩家事务只能依靠变更日志恢复，因此不允许关闭
+        self.journal = None
+        if not storage_config.journal_enabled and storage_config.engine != "sqlite":
+            logger.warning("JSON存储引擎需要变更日志保证多玩家事务的原子性，已忽略 storage.journal.enabled=false")
+        if storage_config.journal_enabled or storage_config.engine != "sqlite":
+            self.journal = MutationJournal(os.path.join(self.data_path, "journal"))
+            replayed = self.journal.replay(self.storage)
+            if replayed:
+                logger.info(f"已从变更日志恢复 {replayed} 条玩家数据变更")
+
+        # 按群组、按用户的令牌桶，刷屏的指令在读取玩家数据之前被拒绝
+        self.admission = AdmissionController(lambda: self.config.admission)
+
+        # 所有指令的冷却时间集中保存在内存中，首次启动时从玩家数据迁移
+        self.cooldowns = CooldownService(os.path.join(self.data_path, "cooldowns"))
+        if self.cooldowns.exists():
+            self.cooldowns.load_all()
+        else:
+            migrated = self.cooldowns.migrate(
+                ((group_id, self.storage.load_group(group_id)) for group_id in self.storage.list_groups()),
+                self.config.cooldowns,
+            )
+            if migrated:
+                logger.info(f"已从玩家数据迁移 {migrated} 条未到期的冷却")
+
+        # 银行余额与信用等级保存在追加写的账本中，首次启动时从玩家数据迁移
+        self.bank_ledger = BankLedger(os.path.join(self.data_path, "bank"), lambda: self.config.bank)
+        if not self.bank_ledger.exists():
+            migrated = self.bank_ledger.migrate(
+                (group_id, self.storage.load_group(group_id)) for group_id in self.storage.list_groups()
+            )
+            if migrated:
+                logger.info(f"已从玩家数据迁移 {migrated} 个银行账户")
+        if self.journal is not None:
+            # 存取款同时修改现金与存款，流水与玩家数据的增量在同一个组提交周期内落盘
+            self.journal.add_precommit(self.bank_ledger.flush)
+
+        self.player_cache = PlayerCache(
+            self.storage.load,
+            self.storage.save,
+            capacity=storage_config.cache_size,
+            flush_threshold=storage_config.flush_threshold,
+            journal=self.journal,
+            batch_loader=self.storage.load_many,
+            batch_writer=self.storage.save_many,
+        )
+
+        # 按群组维护的玩家名单
+        self.roster = RosterIndex()
+
+        # 尚未落盘的默认玩家，第一次发生实际变化时才写入存储引擎
+        self.virtual_players = VirtualPlayers(storage_config.cache_size)
+
+        # 按群组、按指标增量维护的排行榜索引，随每次保存更新
+        self.leaderboard = LeaderboardIndex()
+        self.player_cache.add_listener(self.leaderboard)
+
+        # 按群组维护的主奴双向关系索引，随每次保存更新
+        self.ownership = OwnershipIndex()
+        self.player_cache.add_listener(self.ownership)
+
+        # 只读指令的回复缓存，群组数据版本号随每次保存递增
+        self.reply_cache = ReplyCache(self.config.reply_cache.capacity)
+        self.player_cache.add_listener(self.reply_cache)
+
+        # 卡片渲染管线，不可用时为None，各指令回退为文字回复
+        self.renderer = create_renderer(
+            os.path.join(self.plugin_path, "resources"),
+            os.path.join(self.data_path, "cache"),
+            self.config.render,
+        )
+
+        # 每周重置时追加的排行指标时间序列
+        self.trends = MetricTimeSeries(os.path.join(self.data_path, "trends"))
+
+        # 玩家级别的细粒度锁，供多玩家事务使用
+        self.player_locks = PlayerLockManager()
+
+        # 磁盘IO统一放到有界线程池中执行，避免阻塞事件循环
+        self.io_executor = ThreadPoolExecutor(
+            max_workers=storage_config.io_workers,
+            thread_name_prefix="slave_market_io",
+        )
+
         # 初始化功能模块
         self.bank_module = BankModule(self)
         self.training_module = TrainingModule(self)
@@ -84,81 +196,68 @@ class SlaveMarketPlugin(Star):
         self.rob_module = RobModule(self)
 
         # 启动定时任务
-        asyncio.create_task(self.check_weekly_reset())
+        self._reset_task = asyncio.create_task(self.check_weekly_reset())
+        self._flush_task = asyncio.create_task(self.flush_player_cache_loop())
+        self._journal_task = None
+        if self.journal is not None:
+            self._journal_task = asyncio.create_task(self.commit_journal_loop())
+        self._prune_task = asyncio.create_task(self.prune_backups_loop())
+        self._config_task = asyncio.create_task(self.watch_config_loop())
+        self._ownership_task = asyncio.create_task(self.warm_ownership_index())
 
         logger.info("奴隶市场插件已成功加载并初始化完成")
 
-    def load_config(self) -> Dict[str, Any]:
+    def load_config(self) -> PluginConfig:
         """加载配置文件
 
         Returns:
-            Dict[str, Any]: 配置字典
-        """
-        default_config = {
-            "buyBack": {"cooldown": 86400, "maxTimes": 3, "taxRate": 0.05},
-            "rob": {"cooldown": 600, "successRate": 0.3, "penalty": 0.1},
-            "work": {"cooldown": 3600, "slaveownerCooldown": 60},
-            "purchase": {"cooldown": 3600},
-            "bank": {
-                "initialLimit": 1000,
-                "initialLevel": 1,
-                "upgradePriceMulti": 1.2,
-                "limitIncreaseMulti": 1.25,
-                "initialUpgradePrice": 100,
-                "interestRate": 0.01,
-                "maxInterestTime": 24,
-            },
-            "training": {
-                "cooldown": 7200,
-                "successRate": 0.7,
-                "costRate": 0.1,
-                "valueIncreaseRate": 0.2,
-            },
-            "arena": {
-                "cooldown": 7200,
-                "entryFee": 50,
-                "rewardRate": 0.2,
-                "valueBonus": 0.1,
-            },
-            "ranking": {
-                "cooldown": 3600,
-                "baseReward": 10,
-                "winBonus": 0.2,
-                "tierBonus": {
-                    "青铜": 1,
-                    "白银": 1.2,
-                    "黄金": 1.5,
-                    "铂金": 2,
-                    "钻石": 3,
-                },
-            },
-            "transfer": {"feeRate": 0.1, "minAmount": 100},
-            "weeklyReset": {
-                "enabled": True,
-                "resetTime": {"day": 1, "hour": 0, "minute": 0},
-                "preserveData": {"nickname": True, "basicValue": 100},
-            },
-        }
-
+            PluginConfig: 与默认配置深度合并后编译的配置
+        """
+        # 配置文件的修改时间，用于热重载时判断是否有变化
+        self._config_mtime = None
         if os.path.exists(self.config_path):
             try:
-                with open(self.config_path, "r", encoding="utf-8") as f:
-                    config = yaml.safe_load(f) or {}
-
-                # 合并默认配置
-                for key, value in default_config.items():
-                    if key not in config:
-                        config[key] = value
-
+                self._config_mtime = os.path.getmtime(self.config_path)
+                config = load_config_file(self.config_path)
                 logger.info("配置文件加载成功")
                 return config
             except Exception as e:
                 logger.error(f"配置文件加载失败: {e}")
                 logger.info("使用默认配置")
-                return default_config
+                return compile_config()
 
         logger.info("配置文件不存在，使用默认配置")
-        return default_config
+        return compile_config()
+
+    def reload_config(self) -> bool:
+        """配置文件的修改时间变化时重新加载
+
+        加载失败时保留当前配置，下次修改后再试
+
+        Returns:
+            bool: 是否已替换为新配置
+        """
+        try:
+            mtime = os.path.getmtime(self.config_path)
+        except OSError:
+            return False
+        if mtime == self._config_mtime:
+            return False
+        # 先记下修改时间，加载失败时不会每次检查都重复报错
+        self._config_mtime = mtime
+
+        try:
+            config = load_config_file(self.config_path)
+        except Exception as e:
+            logger.error(f"配置文件重新加载失败，继续使用当前配置: {e}")
+            return False
+
+        pending = config.restart_required(self.config)
+        self.config = config
+        logger.info("配置文件已重新加载")
+        if pending:
+            logger.warning(f"配置项 {', '.join(pending)} 的修改需要重启插件后生效")
+        return True
 
     def load_copywriting(self) -> Dict[str, List[str]]:
         """加载文案配置
@@ -194,23 +293,40 @@ class SlaveMarketPlugin(Star):
             ],
         }
 
-    def get_player_data_path(self, group_id: str, user_id: str) -> str:
-        """获取玩家数据文件路径
+    async def run_io(self, func: Callable[..., Any], *args: Any) -> Any:
+        """在IO线程池中执行阻塞函数
+
+        Args:
+            func: 阻塞函数
+            *args: 函数参数
+
+        Returns:
+            Any: 函数返回值
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.io_executor, func, *args)
+
+    def get_player_data(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取玩家数据（同步版本，供IO线程内使用）
+
+        优先从内存缓存读取，未命中时才访问磁盘
 
         Args:
             group_id: 群组ID
             user_id: 用户ID
 
         Returns:
-            str: 文件路径
+            Optional[Dict[str, Any]]: 玩家数据或None
         """
-        group_path = os.path.join(self.data_path, "player", group_id)
-        os.makedirs(group_path, exist_ok=True)
-        return os.path.join(group_path, f"{user_id}.json")
+        return self.player_cache.get(group_id, user_id)
 
-    def get_player_data(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+    async def get_player_data_async(
+        self, group_id: str, user_id: str
+    ) -> Optional[Dict[str, Any]]:
         """获取玩家数据
 
+        缓存命中时直接返回，未命中时在IO线程池中读取磁盘
+
         Args:
             group_id: 群组ID
             user_id: 用户ID
@@ -218,36 +334,210 @@ class SlaveMarketPlugin(Star):
         Returns:
             Optional[Dict[str, Any]]: 玩家数据或None
         """
-        file_path = self.get_player_data_path(group_id, user_id)
-        if os.path.exists(file_path):
-            try:
-                with open(file_path, "r", encoding="utf-8") as f:
-                    return json.load(f)
-            except Exception as e:
-                logger.error(f"读取玩家数据失败: {e}")
-        return None
+        data = self.player_cache.peek(group_id, user_id)
+        if data is not None:
+            return data
+        return await self.run_io(self.player_cache.get, group_id, user_id)
 
     def save_player_data(
         self, group_id: str, user_id: str, data: Dict[str, Any]
+    ) -> None:
+        """保存玩家数据（同步版本，供IO线程内使用）
+
+        数据先写入内存缓存并标记为脏，由定时任务批量写回磁盘
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            data: 玩家数据
+        """
+        records, created = self.virtual_players.claim(group_id, {user_id: data})
+        if not records:
+            return
+        if self.player_cache.put_many(group_id, records) or created:
+            self.flush_player_cache()
+        self.register_new_players(group_id, created)
+
+    async def save_player_data_async(
+        self, group_id: str, user_id: str, data: Dict[str, Any]
     ) -> None:
         """保存玩家数据
 
+        数据先写入内存缓存并标记为脏，脏数据达到阈值时在IO线程池中写回
+
         Args:
             group_id: 群组ID
             user_id: 用户ID
             data: 玩家数据
         """
-        file_path = self.get_player_data_path(group_id, user_id)
+        await self.save_players_async(group_id, {user_id: data})
+
+    def checkpoint(self, pending: List[Any], sealed: Optional[int]) -> int:
+        """将脏数据快照写回存储引擎，并删除已合并的变更日志
+
+        Args:
+            pending: collect_dirty取出的脏数据快照
+            sealed: 本次检查点封存的日志代号，未启用变更日志时为None
+
+        Returns:
+            int: 写回的玩家数量
+        """
+        if self.journal is not None:
+            # 先把旧代的缓冲落盘，再写回数据，最后才能删除日志
+            self.journal.commit()
+        written = self.player_cache.write_back(pending)
+        if self.journal is not None and written == len(pending):
+            self.journal.remove_sealed(sealed)
+        return written
+
+    async def get_players_async(
+        self, group_id: str, user_ids: List[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        """批量获取同一群组的玩家数据
+
+        已缓存的直接从内存返回，未缓存的合并为一次批量读取放到IO线程池中执行；
+        存储引擎支持时（JSON文件），较多的冷读取会拆分到多个IO线程并行
+
+        Args:
+            group_id: 群组ID
+            user_ids: 用户ID列表
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 用户ID到玩家数据的映射，不存在的玩家不出现在结果中
+        """
+        records = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            data = self.player_cache.peek(group_id, user_id)
+            if data is not None:
+                records[user_id] = data
+            else:
+                missing.append(user_id)
+        if not missing:
+            return records
+
+        workers = self.config.storage.io_workers
+        if (
+            self.config.storage.parallel_reads
+            and self.storage.parallel_reads
+            and workers > 1
+            and len(missing) >= self.PARALLEL_READ_MIN
+        ):
+            size = -(-len(missing) // workers)
+            chunks = [missing[i:i + size] for i in range(0, len(missing), size)]
+            for loaded in await asyncio.gather(
+                *(self.run_io(self.player_cache.get_many, group_id, chunk) for chunk in chunks)
+            ):
+                records.update(loaded)
+        else:
+            records.update(await self.run_io(self.player_cache.get_many, group_id, missing))
+        return records
+
+    async def save_players_async(
+        self, group_id: str, records: Dict[str, Dict[str, Any]]
+    ) -> None:
+        """整体保存同一群组的多条玩家数据
+
+        未修改的默认玩家不会被保存；首次发生变化的默认玩家转为真实玩家并立即落盘，
+        保证按目录枚举玩家时能找到
+
+        Args:
+            group_id: 群组ID
+            records: 用户ID到玩家数据的映射
+        """
+        records, created = self.virtual_players.claim(group_id, records)
+        if not records:
+            return
+        if self.player_cache.put_many(group_id, records) or created:
+            await self.flush_player_cache_async()
+        self.register_new_players(group_id, created)
+
+    def register_new_players(self, group_id: str, user_ids: List[str]) -> None:
+        """把首次落盘的玩家加入群组名单
+
+        Args:
+            group_id: 群组ID
+            user_ids: 用户ID列表
+        """
+        for user_id in user_ids:
+            self.roster.add(group_id, user_id)
+            logger.info(f"创建新玩家数据: 群{group_id} 用户{user_id}")
+
+    def transaction(self, group_id: str, *user_ids: str) -> PlayerTransaction:
+        """创建涉及多个玩家的事务
+
+        Args:
+            group_id: 群组ID
+            *user_ids: 事务中会读写的所有用户ID
+
+        Returns:
+            PlayerTransaction: 事务对象，配合async with使用
+        """
+        return PlayerTransaction(self, group_id, [str(uid) for uid in user_ids])
+
+    def flush_player_cache(self) -> None:
+        """将缓存中的脏数据写回磁盘（同步版本）"""
+        try:
+            pending = self.player_cache.collect_dirty()
+            if pending:
+                sealed = self.journal.seal() if self.journal is not None else None
+                written = self.checkpoint(pending, sealed)
+                logger.debug(f"已写回 {written} 条玩家数据")
+        except Exception as e:
+            logger.error(f"保存玩家数据失败: {e}")
+
+    async def flush_player_cache_async(self) -> None:
+        """将缓存中的脏数据写回磁盘
+
+        在事件循环中对脏数据做快照，再到IO线程池中写盘
+        """
         try:
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(data, f, ensure_ascii=False, indent=4)
+            pending = self.player_cache.collect_dirty()
+            if pending:
+                sealed = self.journal.seal() if self.journal is not None else None
+                written = await self.run_io(self.checkpoint, pending, sealed)
+                logger.debug(f"已写回 {written} 条玩家数据")
         except Exception as e:
             logger.error(f"保存玩家数据失败: {e}")
 
+    async def flush_group_async(self, group_id: str) -> None:
+        """只写回一个群组的脏数据（每周重置该群组前调用），未能全部写回时抛出
+
+        不截断变更日志：本群的增量由重置丢弃，其他群组的增量仍由定时写回合并
+        """
+        pending = self.player_cache.collect_dirty(group_id)
+        if pending:
+            written = await self.run_io(self.player_cache.write_back, pending)
+            if written < len(pending):
+                raise RuntimeError(f"群组 {group_id} 有 {len(pending) - written} 条玩家数据未能写回")
+
+    def new_player_data(self, user_id: str, nickname: str = "") -> Dict[str, Any]:
+        """生成新玩家的默认数据
+
+        Args:
+            user_id: 用户ID
+            nickname: 昵称
+
+        Returns:
+            Dict[str, Any]: 玩家数据
+        """
+        return {
+            "user_id": user_id,
+            "nickname": nickname or f"用户{user_id}",
+            "currency": 0,
+            "value": 100,
+            "slaves": [],
+            "master": None,
+            "cooldowns": {},
+            "arena": {"tier": "青铜", "points": 0, "wins": 0, "losses": 0},
+            "lastWorkTime": 0,
+            "createdAt": int(time.time()),
+        }
+
     def ensure_player_exists(
         self, group_id: str, user_id: str, nickname: str = ""
     ) -> Dict[str, Any]:
-        """确保玩家存在，如果不存在则创建
+        """确保玩家存在，如果不存在则返回内存中的默认数据（同步版本，供IO线程内使用）
 
         Args:
             group_id: 群组ID
@@ -257,55 +547,76 @@ class SlaveMarketPlugin(Star):
         Returns:
             Dict[str, Any]: 玩家数据
         """
-        data = self.get_player_data(group_id, user_id)
+        data = self.virtual_players.get(group_id, user_id)
+        if data is None:
+            data = self.get_player_data(group_id, user_id)
         if not data:
-            data = {
-                "user_id": user_id,
-                "nickname": nickname or f"用户{user_id}",
-                "currency": 0,
-                "value": 100,
-                "slaves": [],
-                "master": None,
-                "bank": {
-                    "balance": 0,
-                    "level": 1,
-                    "limit": self.config["bank"]["initialLimit"],
-                    "lastInterestTime": int(time.time()),
-                },
-                "cooldowns": {},
-                "arena": {"tier": "青铜", "points": 0, "wins": 0, "losses": 0},
-                "lastWorkTime": 0,
-                "createdAt": int(time.time()),
-            }
-            self.save_player_data(group_id, user_id, data)
-            logger.info(f"创建新玩家数据: 群{group_id} 用户{user_id}")
+            data = self.virtual_players.add(group_id, user_id, self.new_player_data(user_id, nickname))
         return data
 
-    def check_cooldown(self, data: Dict[str, Any], action: str, cooldown: int) -> bool:
-        """检查冷却时间
+    async def ensure_player_exists_async(
+        self, group_id: str, user_id: str, nickname: str = ""
+    ) -> Dict[str, Any]:
+        """确保玩家存在，如果不存在则返回内存中的默认数据
+
+        默认数据只有在第一次保存且内容发生变化时才会落盘，
+        只被查看或校验失败的目标玩家不会产生文件
 
         Args:
-            data: 玩家数据
+            group_id: 群组ID
+            user_id: 用户ID
+            nickname: 昵称
+
+        Returns:
+            Dict[str, Any]: 玩家数据
+        """
+        data = self.virtual_players.get(group_id, user_id)
+        if data is None:
+            data = await self.get_player_data_async(group_id, user_id)
+        if not data:
+            data = self.virtual_players.add(group_id, user_id, self.new_player_data(user_id, nickname))
+        return data
+
+    def cooldown_remaining(self, group_id: str, user_id: str, action: str) -> int:
+        """获取剩余冷却时间，只查询内存，不读取玩家数据
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
             action: 动作名称
-            cooldown: 冷却时间（秒）
 
         Returns:
-            bool: 是否可以通过冷却检查
+            int: 剩余秒数，可以执行时为0；ignoreCDUsers中的用户始终为0
         """
-        current_time = int(time.time())
-        last_time = data.get("cooldowns", {}).get(action, 0)
-        return current_time - last_time >= cooldown
+        if self.check_permission(user_id):
+            return 0
+        return self.cooldowns.remaining(group_id, user_id, action)
 
-    def set_cooldown(self, data: Dict[str, Any], action: str) -> None:
-        """设置冷却时间
+    def start_cooldown(self, group_id: str, user_id: str, action: str) -> None:
+        """按配置的时长开始冷却
 
         Args:
-            data: 玩家数据
+            group_id: 群组ID
+            user_id: 用户ID
+            action: 动作名称
+        """
+        self.cooldowns.start(group_id, user_id, action, self.config.cooldowns[action])
+
+    def cooldown_notice(self, group_id: str, user_id: str, action: str) -> Optional[str]:
+        """冷却中时返回提示文字
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
             action: 动作名称
+
+        Returns:
+            Optional[str]: 冷却提示，可以执行时为None
         """
-        if "cooldowns" not in data:
-            data["cooldowns"] = {}
-        data["cooldowns"][action] = int(time.time())
+        remaining = self.cooldown_remaining(group_id, user_id, action)
+        if not remaining:
+            return None
+        return f"{ACTION_NAMES[action]}冷却中，还需等待 {format_remaining(remaining)}"
 
     def check_permission(self, user_id: str) -> bool:
         """检查用户是否有特殊权限（跳过冷却）
@@ -316,8 +627,104 @@ class SlaveMarketPlugin(Star):
         Returns:
             bool: 是否有权限
         """
-        ignore_users = self.config.get("ignoreCDUsers", [])
-        return str(user_id) in [str(uid) for uid in ignore_users]
+        return str(user_id) in self.config.ignore_cd_users
+
+    def get_roster(self, group_id: str) -> GroupRoster:
+        """获取群组玩家名单（同步版本，供IO线程内使用）
+
+        Args:
+            group_id: 群组ID
+
+        Returns:
+            GroupRoster: 群组名单
+        """
+        roster = self.roster.get(group_id)
+        if roster is None:
+            roster = self.roster.load(group_id, self.storage.list_players(group_id))
+        return roster
+
+    async def get_roster_async(self, group_id: str) -> GroupRoster:
+        """获取群组玩家名单，首次访问时在IO线程池中构建
+
+        Args:
+            group_id: 群组ID
+
+        Returns:
+            GroupRoster: 群组名单
+        """
+        roster = self.roster.get(group_id)
+        if roster is None:
+            user_ids = await self.run_io(self.storage.list_players, group_id)
+            roster = self.roster.load(group_id, user_ids)
+        return roster
+
+    async def get_leaderboard_async(self, group_id: str) -> GroupLeaderboard:
+        """获取群组排行榜索引，首次访问时在IO线程池中读取全群数据构建
+
+        Args:
+            group_id: 群组ID
+
+        Returns:
+            GroupLeaderboard: 群组排行榜索引
+        """
+        board = self.leaderboard.get(group_id)
+        if board is None:
+            # 先登记构建再写回缓存，之后到达的保存会在构建完成时补上
+            self.leaderboard.begin_build(group_id)
+            await self.flush_player_cache_async()
+            records = await self.run_io(self.storage.load_group, group_id)
+            board = self.leaderboard.finish_build(group_id, records)
+        return board
+
+    async def get_ownership_async(self, group_id: str) -> GroupOwnership:
+        """获取群组主奴关系索引，未构建时在IO线程池中读取主人字段构建
+
+        Args:
+            group_id: 群组ID
+
+        Returns:
+            GroupOwnership: 群组主奴关系索引
+        """
+        graph = self.ownership.get(group_id)
+        if graph is None:
+            # 先登记构建再写回缓存，之后到达的保存会在构建完成时补上
+            self.ownership.begin_build(group_id)
+            await self.flush_player_cache_async()
+            masters = await self.run_io(self.storage.load_masters, group_id)
+            graph = self.ownership.finish_build(group_id, masters)
+        return graph
+
+    async def warm_ownership_index(self) -> None:
+        """启动后在后台逐个群组构建主奴关系索引"""
+        try:
+            start = time.perf_counter()
+            group_ids = await self.run_io(self.storage.list_groups)
+            for group_id in group_ids:
+                await self.get_ownership_async(group_id)
+            logger.info(f"主奴关系索引构建完成，共{len(group_ids)}个群组，耗时{time.perf_counter() - start:.2f}秒")
+        except Exception as e:
+            logger.error(f"构建主奴关系索引失败: {e}")
+
+    async def card_result(
+        self, event: AstrMessageEvent, template: str, context: Dict[str, Any], text: str
+    ):
+        """把模板卡片渲染为图片回复，渲染不可用或失败时回退为文字回复
+
+        Args:
+            event: 消息事件
+            template: 模板名（resources/html下的目录名）
+            context: 模板数据
+            text: 文字回复
+
+        Returns:
+            MessageEventResult: 图片或文字回复
+        """
+        if self.renderer is not None:
+            try:
+                return event.image_result(await self.renderer.render(template, context))
+            except Exception as e:
+                logger.error(f"渲染{template}卡片失败: {e}")
+        return event.plain_result(text)
 
     def get_all_players(self, group_id: str) -> List[str]:
         """获取群组内所有玩家ID列表
@@ -328,17 +735,18 @@ class SlaveMarketPlugin(Star):
         Returns:
             List[str]: 玩家ID列表
         """
-        players = []
-        group_path = self.get_player_data_path(group_id, "").replace(".json", "")
-        group_dir = os.path.dirname(group_path)
+        return self.get_roster(group_id).ids()
+
+    async def get_all_players_async(self, group_id: str) -> List[str]:
+        """获取群组内所有玩家ID列表
 
-        if os.path.exists(group_dir):
-            for filename in os.listdir(group_dir):
-                if filename.endswith(".json") and filename != "backup":
-                    user_id = filename[:-5]  # 移除.json后缀
-                    players.append(user_id)
+        Args:
+            group_id: 群组ID
 
-        return players
+        Returns:
+            List[str]: 玩家ID列表
+        """
+        return (await self.get_roster_async(group_id)).ids()
 
     def get_group_list(self) -> List[str]:
         """获取所有群组列表
@@ -346,37 +754,115 @@ class SlaveMarketPlugin(Star):
         Returns:
             List[str]: 群组ID列表
         """
-        groups = []
-        player_dir = os.path.join(self.data_path, "player")
+        return [group_id for group_id in self.storage.list_groups() if group_id.isdigit()]
 
-        if os.path.exists(player_dir):
-            for dirname in os.listdir(player_dir):
-                if (
-                    os.path.isdir(os.path.join(player_dir, dirname))
-                    and dirname.isdigit()
-                ):
-                    groups.append(dirname)
+    async def check_weekly_reset(self):
+        """每周重置定时任务
 
-        return groups
+        根据weeklyReset.resetTime计算下一次计划时间并休眠到该时间；
+        启动时与last_reset.json比较，错过的重置补执行一次
+        """
+        module = self.weekly_reset_module
 
-    async def check_weekly_reset(self):
-        """检查每周重置
-        每分钟检查一次是否需要执行每周重置
+        # 上次重置中途退出时，启动后先把它完成
+        try:
+            if await self.run_io(module.has_pending_job):
+                result = await module.run_weekly_reset()
+                if result["success"]:
+                    logger.info(f"已完成中断的每周重置：{result['message']}")
+        except Exception as e:
+            logger.error(f"恢复每周重置失败: {e}")
+
+        # 停机期间错过的重置只补执行一次；从未重置过的新数据不补执行
+        try:
+            last_reset_time = await self.run_io(module.get_last_reset_time)
+            deadline = module.previous_reset_time()
+            if last_reset_time and module.is_reset_due(deadline, last_reset_time):
+                logger.info(f"检测到错过的每周重置（计划时间 {deadline:%Y-%m-%d %H:%M}），立即补执行")
+                await self.run_due_reset(deadline)
+        except Exception as e:
+            logger.error(f"补执行每周重置失败: {e}")
+
+        while True:
+            deadline = module.next_reset_time()
+            while True:
+                remaining = (deadline - datetime.now()).total_seconds()
+                if remaining <= 0:
+                    break
+                # 分段休眠，系统挂起或时钟调整后也能及时醒来
+                await asyncio.sleep(min(remaining, 3600))
+
+            try:
+                await self.run_due_reset(deadline)
+            except Exception as e:
+                logger.error(f"每周重置执行失败: {e}")
+
+    async def run_due_reset(self, deadline: datetime) -> None:
+        """执行计划时间为deadline的重置，失败时每5分钟重试直到成功
+
+        执行前重新读取last_reset.json，期间已经手动重置过则跳过，保证同一计划时间只重置一次
+
+        Args:
+            deadline: 计划重置时间
         """
+        module = self.weekly_reset_module
+        while True:
+            last_reset_time = await self.run_io(module.get_last_reset_time)
+            if not module.is_reset_due(deadline, last_reset_time):
+                return
+            result = await module.run_weekly_reset()
+            if result["success"]:
+                logger.info(f"每周重置已自动执行：{result['message']}")
+                return
+            await asyncio.sleep(300)
+
+    async def flush_player_cache_loop(self):
+        """定时写回玩家数据缓存、冷却时间与银行流水"""
+        while True:
+            await asyncio.sleep(self.config.storage.flush_interval)
+            await self.flush_player_cache_async()
+            try:
+                await self.run_io(self.cooldowns.flush)
+            except Exception as e:
+                logger.error(f"保存冷却时间失败: {e}")
+            try:
+                await self.run_io(self.bank_ledger.flush)
+            except Exception as e:
+                logger.error(f"写入银行流水失败: {e}")
+
+    async def commit_journal_loop(self):
+        """定时组提交变更日志"""
+        while True:
+            await asyncio.sleep(self.config.storage.journal_commit_interval)
+            try:
+                await self.run_io(self.journal.commit)
+            except Exception as e:
+                logger.error(f"写入变更日志失败: {e}")
+
+    async def prune_backups_loop(self):
+        """定时按保留策略清理过期的重置归档与备份"""
         while True:
             try:
-                if self.weekly_reset_module.should_reset():
-                    result = self.weekly_reset_module.perform_weekly_reset()
-                    if result["success"]:
-                        logger.info(f"每周重置已自动执行：{result['message']}")
+                removed = await self.weekly_reset_module.run_prune()
+                if removed:
+                    logger.info(f"已清理 {removed} 个过期的备份文件")
             except Exception as e:
-                logger.error(f"每周重置检查失败: {e}")
+                logger.error(f"清理过期备份失败: {e}")
+            await asyncio.sleep(self.config.archive.prune_interval)
 
-            await asyncio.sleep(60)  # 每分钟检查一次
+    async def watch_config_loop(self):
+        """定时检查配置文件，修改后自动重新加载"""
+        while True:
+            await asyncio.sleep(self.CONFIG_CHECK_INTERVAL)
+            try:
+                self.reload_config()
+            except Exception as e:
+                logger.error(f"检查配置文件失败: {e}")
 
     # ===== 指令处理函数 =====
 
     @filter.command("奴隶市场")
+    @admission_control("奴隶市场")
     async def market_info(self, event: AstrMessageEvent):
         """查看奴隶市场信息
 
@@ -391,60 +877,59 @@ class SlaveMarketPlugin(Star):
             user_id = str(event.get_sender_id())
 
             # 确保玩家存在
-            data = self.ensure_player_exists(group_id, user_id, event.get_sender_name())
+            data = await self.ensure_player_exists_async(group_id, user_id, event.get_sender_name())
 
             # 构建市场信息
             market_data = {"user": data, "slaves": []}
 
+            # 奴隶与主人的数据一次批量获取
+            slave_ids = [str(slave_id) for slave_id in data.get("slaves", [])]
+            related_ids = slave_ids + ([str(data["master"])] if data.get("master") else [])
+            related = await self.get_players_async(group_id, related_ids)
+
             # 获取奴隶详细信息
-            for slave_id in data.get("slaves", []):
-                slave_data = self.get_player_data(group_id, str(slave_id))
+            for slave_id in slave_ids:
+                slave_data = related.get(slave_id)
                 if slave_data:
                     market_data["slaves"].append(slave_data)
 
-            # 渲染HTML模板
-            html_content = self.render_market_html(market_data)
+            # 获取主人信息
+            if data.get("master"):
+                market_data["master"] = related.get(str(data["master"]))
 
-            # 这里应该实现实际的HTML渲染
-            # 暂时使用文本回复
+            # 渲染为卡片图片，渲染不可用时使用文本回复
             reply = self.generate_market_text(market_data)
-            yield event.plain_result(reply)
+            yield await self.card_result(event, "slaveList", self.build_market_card(market_data), reply)
 
         except Exception as e:
             logger.error(f"奴隶市场指令执行失败: {e}")
             yield event.plain_result("执行失败，请稍后重试")
 
-    def render_market_html(self, data: Dict[str, Any]) -> str:
-        """渲染市场信息HTML
+    def build_market_card(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """构建市场卡片的模板数据
 
         Args:
             data: 市场数据
 
         Returns:
-            str: HTML内容
-        """
-        return """
-        <div style="font-family: 'Microsoft YaHei', sans-serif; background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 20px; border-radius: 15px;">
-            <h1 style="color: white; text-align: center; margin-bottom: 20px;">🌟 奴隶市场 🌟</h1>
-            <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px; margin-bottom: 15px;">
-                <h2 style="color: #333;">👤 我的信息</h2>
-                <p style="color: #666;">昵称: {{ user.nickname }}</p>
-                <p style="color: #666;">金币: {{ user.currency }}</p>
-                <p style="color: #666;">身价: {{ user.value }}</p>
-                <p style="color: #666;">奴隶数量: {{ user.slaves|length }}</p>
-            </div>
-            {% if slaves %}
-            <div style="background: rgba(255,255,255,0.9); padding: 15px; border-radius: 10px;">
-                <h2 style="color: #333;">👥 我的奴隶</h2>
-                {% for slave in slaves %}
-                <div style="border-bottom: 1px solid #eee; padding: 10px 0;">
-                    <p style="color: #666;">{{ slave.nickname }} - 身价: {{ slave.value }} 金币</p>
-                </div>
-                {% endfor %}
-            </div>
-            {% endif %}
-        </div>
+            Dict[str, Any]: slaveList模板数据，第一张卡片为自己，其后为各奴隶
         """
+        user = data["user"]
+        master = data.get("master")
+        info = [{
+            "id": user.get("user_id", ""),
+            "name": user.get("nickname", "未知用户"),
+            "socialStatus": user.get("value", 0),
+            "master": master.get("nickname", "未知") if master else None,
+        }]
+        for slave in data["slaves"]:
+            info.append({
+                "id": slave.get("user_id", ""),
+                "name": slave.get("nickname", "未知"),
+                "socialStatus": slave.get("value", 0),
+                "master": user.get("nickname", "未知用户"),
+            })
+        return {"info": info}
 
     def generate_market_text(self, data: Dict[str, Any]) -> str:
         """生成市场信息文本
@@ -470,67 +955,45 @@ class SlaveMarketPlugin(Star):
                 reply += f"  • {slave.get('nickname', '未知')} - 身价: {slave.get('value', 0)} 金币\n"
 
         if user.get("master"):
-            master_data = self.get_player_data(
-                str(user.get("group_id", "")), str(user["master"])
-            )
+            master_data = data.get("master")
             if master_data:
                 reply += f"\n🔗 主人: {master_data.get('nickname', '未知')}\n"
 
         return reply
 
     @filter.command("打工")
-    async def work(self, event: AstrMessageEvent):
+    @admission_control("打工")
+    @unit_of_work(cooldown="work")
+    async def work(self, event: AstrMessageEvent, ctx: RequestContext):
         """打工赚钱
 
         玩家可以通过打工获得金币，有奴隶的奴隶主收益更高
         """
-        try:
-            if not event.get_group_id():
-                yield event.plain_result("该游戏只能在群内使用")
-                return
-
-            group_id = str(event.get_group_id())
-            user_id = str(event.get_sender_id())
-            nickname = event.get_sender_name()
-
-            # 确保玩家存在
-            data = self.ensure_player_exists(group_id, user_id, nickname)
-
-            # 检查冷却时间
-            if not self.check_cooldown(data, "work", self.config["work"]["cooldown"]):
-                remaining = self.config["work"]["cooldown"] - (
-                    int(time.time()) - data["cooldowns"]["work"]
-                )
-                yield event.plain_result(f"打工冷却中，还需等待 {remaining // 60} 分钟")
-                return
-
-            # 计算收益
-            is_slaveowner = len(data.get("slaves", [])) > 0
-            if is_slaveowner:
-                # 奴隶主收益更高
-                base_income = random.randint(50, 150)
-                work_descriptions = self.copywriting.get(
-                    "slaveowner", ["完成工作获得收入"]
-                )
-            else:
-                base_income = random.randint(20, 80)
-                work_descriptions = self.copywriting.get("slave", ["完成工作获得收入"])
-
-            description = random.choice(work_descriptions)
+        data = ctx.player
+
+        # 计算收益
+        is_slaveowner = len(data.get("slaves", [])) > 0
+        if is_slaveowner:
+            # 奴隶主收益更高
+            base_income = random.randint(50, 150)
+            work_descriptions = self.copywriting.get(
+                "slaveowner", ["完成工作获得收入"]
+            )
+        else:
+            base_income = random.randint(20, 80)
+            work_descriptions = self.copywriting.get("slave", ["完成工作获得收入"])
 
-            # 更新数据
-            data["currency"] += base_income
-            self.set_cooldown(data, "work")
-            self.save_player_data(group_id, user_id, data)
+        description = random.choice(work_descriptions)
 
-            logger.info(f"用户{user_id}打工获得{base_income}金币")
-            yield event.plain_result(f"✅ {description}\n💰 获得 {base_income} 金币！")
+        # 更新数据，处理结束后统一提交
+        data["currency"] += base_income
+        ctx.start_cooldown("work")
 
-        except Exception as e:
-            logger.error(f"打工指令执行失败: {e}")
-            yield event.plain_result("打工失败，请稍后重试")
+        logger.info(f"用户{ctx.user_id}打工获得{base_income}金币")
+        yield event.plain_result(f"✅ {description}\n💰 获得 {base_income} 金币！")
 
     @filter.command("购买奴隶")
+    @admission_control("购买奴隶")
     async def purchase_slave(self, event: AstrMessageEvent, target_user: str):
         """购买奴隶
 
@@ -548,9 +1011,6 @@ class SlaveMarketPlugin(Star):
             buyer_id = str(event.get_sender_id())
             buyer_name = event.get_sender_name()
 
-            # 确保购买者存在
-            buyer_data = self.ensure_player_exists(group_id, buyer_id, buyer_name)
-
             # 解析目标用户ID
             target_id = None
             if target_user.startswith("@"):
@@ -562,106 +1022,124 @@ class SlaveMarketPlugin(Star):
                 yield event.plain_result("无法购买自己或无效的目标")
                 return
 
-            # 确保目标用户存在
-            target_data = self.ensure_player_exists(
-                group_id, target_id, f"用户{target_id}"
-            )
-
-            # 检查冷却时间
-            if not self.check_cooldown(
-                buyer_data, "purchase", self.config["purchase"]["cooldown"]
-            ):
-                remaining = self.config["purchase"]["cooldown"] - (
-                    int(time.time()) - buyer_data["cooldowns"]["purchase"]
-                )
+            remaining = self.cooldown_remaining(group_id, buyer_id, "purchase")
+            if remaining:
                 yield event.plain_result(f"购买冷却中，还需等待 {remaining // 60} 分钟")
                 return
 
-            # 检查是否已经是奴隶
-            if target_id in buyer_data.get("slaves", []):
+            # 先从主奴关系索引检查目标的主人，不能购买时不需要加锁读取数据
+            graph = await self.get_ownership_async(group_id)
+            master_id = graph.master_of(target_id)
+            if master_id == buyer_id:
                 yield event.plain_result("该用户已经是你的奴隶了")
                 return
-
-            # 检查目标是否已有主人
-            if target_data.get("master") and target_data["master"] != buyer_id:
+            if master_id is not None:
                 yield event.plain_result("该用户已经有主人了")
                 return
 
-            # 计算购买价格
-            purchase_price = int(target_data["value"] * 1.2)
-
-            # 检查金币是否足够
-            if buyer_data["currency"] < purchase_price:
-                yield event.plain_result(
-                    f"金币不足！需要 {purchase_price} 金币，你只有 {buyer_data['currency']} 金币"
+            # 买家和目标在同一个事务中修改，避免并发指令丢失更新
+            async with self.transaction(group_id, buyer_id, target_id) as txn:
+                reply = await self.purchase_in_transaction(
+                    txn, buyer_id, buyer_name, target_id
                 )
-                return
+            yield event.plain_result(reply)
 
-            # 执行购买
-            buyer_data["currency"] -= purchase_price
-            if "slaves" not in buyer_data:
-                buyer_data["slaves"] = []
-            buyer_data["slaves"].append(target_id)
+        except Exception as e:
+            logger.error(f"购买奴隶指令执行失败: {e}")
+            yield event.plain_result("购买失败，请稍后重试")
 
-            target_data["master"] = buyer_id
+    async def purchase_in_transaction(
+        self,
+        txn: PlayerTransaction,
+        buyer_id: str,
+        buyer_name: str,
+        target_id: str,
+    ) -> str:
+        """在事务中执行购买奴隶
 
-            # 设置冷却时间
-            self.set_cooldown(buyer_data, "purchase")
+        Args:
+            txn: 已锁定买家和目标的事务
+            buyer_id: 买家ID
+            buyer_name: 买家昵称
+            target_id: 目标用户ID
 
-            # 保存数据
-            self.save_player_data(group_id, buyer_id, buyer_data)
-            self.save_player_data(group_id, target_id, target_data)
+        Returns:
+            str: 回复消息
+        """
+        # 确保购买者和目标用户存在
+        buyer_data = await txn.ensure(buyer_id, buyer_name)
+        target_data = await txn.ensure(target_id, f"用户{target_id}")
 
-            logger.info(f"用户{buyer_id}购买用户{target_id}，花费{purchase_price}金币")
-            yield event.plain_result(
-                f"✅ 成功购买奴隶 {target_data['nickname']}！\n💰 花费 {purchase_price} 金币"
-            )
+        # 加锁后再次检查冷却，防止同一玩家并发购买
+        remaining = self.cooldown_remaining(txn.group_id, buyer_id, "purchase")
+        if remaining:
+            return f"购买冷却中，还需等待 {remaining // 60} 分钟"
 
-        except Exception as e:
-            logger.error(f"购买奴隶指令执行失败: {e}")
-            yield event.plain_result("购买失败，请稍后重试")
+        # 检查是否已经是奴隶
+        if target_id in buyer_data.get("slaves", []):
+            return "该用户已经是你的奴隶了"
 
-    @filter.command("我的奴隶")
-    async def my_slaves(self, event: AstrMessageEvent):
-        """查看我的奴隶信息
+        # 检查目标是否已有主人
+        if target_data.get("master") and target_data["master"] != buyer_id:
+            return "该用户已经有主人了"
 
-        显示玩家自己的信息和拥有的奴隶列表
-        """
-        try:
-            if not event.get_group_id():
-                yield event.plain_result("该游戏只能在群内使用")
-                return
+        # 计算购买价格
+        purchase_price = int(target_data["value"] * 1.2)
 
-            group_id = str(event.get_group_id())
-            user_id = str(event.get_sender_id())
-            nickname = event.get_sender_name()
+        # 检查金币是否足够
+        if buyer_data["currency"] < purchase_price:
+            return f"金币不足！需要 {purchase_price} 金币，你只有 {buyer_data['currency']} 金币"
 
-            # 确保玩家存在
-            data = self.ensure_player_exists(group_id, user_id, nickname)
+        # 执行购买
+        buyer_data["currency"] -= purchase_price
+        if "slaves" not in buyer_data:
+            buyer_data["slaves"] = []
+        buyer_data["slaves"].append(target_id)
 
-            # 构建回复消息
-            reply = f"👤 {nickname} 的信息\n"
-            reply += f"💰 金币: {data.get('currency', 0):,} 金币\n"
-            reply += f"💎 身价: {data.get('value', 0):,}\n"
-            reply += f"👥 奴隶数量: {len(data.get('slaves', []))}\n"
+        target_data["master"] = buyer_id
 
-            if data.get("slaves"):
-                reply += "\n📋 奴隶列表:\n"
-                for slave_id in data["slaves"]:
-                    slave_data = self.get_player_data(group_id, str(slave_id))
-                    if slave_data:
-                        reply += f"  • {slave_data['nickname']} (身价: {slave_data['value']})\n"
+        # 设置冷却时间
+        self.start_cooldown(txn.group_id, buyer_id, "purchase")
 
-            if data.get("master"):
-                master_data = self.get_player_data(group_id, str(data["master"]))
-                if master_data:
-                    reply += f"\n🔗 主人: {master_data['nickname']}"
+        logger.info(f"用户{buyer_id}购买用户{target_id}，花费{purchase_price}金币")
+        return f"✅ 成功购买奴隶 {target_data['nickname']}！\n💰 花费 {purchase_price} 金币"
 
-            yield event.plain_result(reply)
+    @filter.command("我的奴隶")
+    @admission_control("我的奴隶")
+    @unit_of_work()
+    async def my_slaves(self, event: AstrMessageEvent, ctx: RequestContext):
+        """查看我的奴隶信息
 
-        except Exception as e:
-            logger.error(f"我的奴隶指令执行失败: {e}")
-            yield event.plain_result("获取信息失败，请稍后重试")
+        显示玩家自己的信息和拥有的奴隶列表
+        """
+        group_id = ctx.group_id
+        nickname = ctx.nickname
+        data = ctx.player
+
+        # 构建回复消息
+        reply = f"👤 {nickname} 的信息\n"
+        reply += f"💰 金币: {data.get('currency', 0):,} 金币\n"
+        reply += f"💎 身价: {data.get('value', 0):,}\n"
+        reply += f"👥 奴隶数量: {len(data.get('slaves', []))}\n"
+
+        # 奴隶与主人的数据一次批量获取
+        slave_ids = [str(slave_id) for slave_id in data.get("slaves", [])]
+        related_ids = slave_ids + ([str(data["master"])] if data.get("master") else [])
+        related = await self.get_players_async(group_id, related_ids)
+
+        if slave_ids:
+            reply += "\n📋 奴隶列表:\n"
+            for slave_id in slave_ids:
+                slave_data = related.get(slave_id)
+                if slave_data:
+                    reply += f"  • {slave_data['nickname']} (身价: {slave_data['value']})\n"
+
+        if data.get("master"):
+            master_data = related.get(str(data["master"]))
+            if master_data:
+                reply += f"\n🔗 主人: {master_data['nickname']}"
+
+        yield event.plain_result(reply)
 
     @filter.command("抢劫")
     async def rob(self, event: AstrMessageEvent):
@@ -672,7 +1150,38 @@ class SlaveMarketPlugin(Star):
         async for result in self.rob_module.rob(event):
             yield result
 
+    @filter.command("我的冷却")
+    @admission_control("我的冷却")
+    async def my_cooldowns(self, event: AstrMessageEvent):
+        """查看自己所有指令的剩余冷却时间
+
+        一次查询内存中的冷却表，不读取玩家数据
+        """
+        if not event.get_group_id():
+            yield event.plain_result("该游戏只能在群内使用")
+            return
+
+        group_id = str(event.get_group_id())
+        user_id = str(event.get_sender_id())
+
+        if self.check_permission(user_id):
+            yield event.plain_result("⏱️ 你不受冷却时间限制")
+            return
+
+        active = self.cooldowns.active(group_id, user_id)
+        if not active:
+            yield event.plain_result("⏱️ 所有指令都可以使用")
+            return
+
+        reply = "⏱️ 我的冷却\n\n"
+        for action, name in ACTION_NAMES.items():
+            remaining = active.get(action)
+            if remaining:
+                reply += f"• #{name}: {format_remaining(remaining)}\n"
+        yield event.plain_result(reply.rstrip())
+
     @filter.command("奴隶帮助")
+    @admission_control("奴隶帮助")
     async def help(self, event: AstrMessageEvent):
         """显示帮助信息
 
@@ -688,13 +1197,15 @@ class SlaveMarketPlugin(Star):
 • #我的奴隶 - 查看个人信息
 • #打工 - 赚取金币
 • #抢劫 - 抢劫其他玩家金币
+• #我的冷却 - 查看各指令的剩余冷却时间
 
 🏦 银行系统:
 • #银行信息 - 查看银行信息
 • #存款 数量 - 存款
 • #取款 数量 - 取款
 • #升级信用 - 升级银行等级
-• #领取利息 - 领取利息
+• #领取利息 - 结算利息（每小时复利自动计入存款）
+• #银行流水 - 查看最近的银行流水
 
 ⚔️ 竞技系统:
 • #训练奴隶 - 训练奴隶提升价值
@@ -704,16 +1215,20 @@ class SlaveMarketPlugin(Star):
 👥 奴隶管理:
 • #赎身 - 赎回自由身
 • #放生奴隶 @群友/QQ号 - 放生奴隶
+• #奴隶关系 [@群友] - 查看主人链与本群最大的奴隶主
 
 📈 排行榜:
 • #排行榜 - 查看所有排行榜
-• #金币排行 - 金币排行榜
+• #金币排行 [页码] - 金币排行榜
 • #身价排行 - 身价排行榜
 • #奴隶排行 - 奴隶数量排行榜
+• #我的排名 [金币|身价|奴隶|段位] - 查看自己的名次
+• #身价走势 [@群友] - 查看历周身价变化
+• #历史最高 - 查看本群各项历史最高纪录
 
 🔄 系统功能:
 • #奴隶重置状态 - 查看重置状态
-• #上周排行榜 - 查看上周排行榜
+• #上周排行榜 [N] - 查看上周（或N周前）排行榜
 
 💡 提示:
 • 每周一00:00自动重置数据
@@ -727,6 +1242,193 @@ class SlaveMarketPlugin(Star):
             logger.error(f"帮助指令执行失败: {e}")
             yield event.plain_result("获取帮助信息失败")
 
+    def convert_data_tree(self, codec) -> int:
+        """将玩家数据和备份文件原地转换为指定编码（在IO线程中执行）
+
+        Args:
+            codec: 目标编码器
+
+        Returns:
+            int: 转换的记录/文件数量
+        """
+        converted = self.storage.convert(codec)
+        backup_dirs = [os.path.join(self.data_path, "backups")]
+        backup_dirs += [
+            os.path.join(self.data_path, "player", group_id, "backup")
+            for group_id in self.storage.list_groups()
+        ]
+        for backup_dir in backup_dirs:
+            if not os.path.isdir(backup_dir):
+                continue
+            for filename in os.listdir(backup_dir):
+                if filename.endswith(".json"):
+                    if convert_file(os.path.join(backup_dir, filename), codec):
+                        converted += 1
+        return converted
+
+    def has_bank_assets(self, group_id: str, user_id: str) -> bool:
+        """玩家在银行账本中是否有存款或升级过信用等级（需先读入群组账本）"""
+        account = self.bank_ledger.view(group_id, user_id)
+        return account.balance > 0 or account.level > self.config.bank.initial_level
+
+    async def cleanup_default_players(self) -> Dict[str, int]:
+        """删除所有群组中仍是默认状态的玩家数据
+
+        旧版本在玩家第一次发送指令时就写入默认数据，这些记录从未发生过实际变化，
+        删除后与从未创建等价，玩家再次发送指令时重新生成虚拟默认数据。
+        扫描不持有锁，删除前对每批玩家加锁并按最新数据再检查一次
+
+        Returns:
+            Dict[str, int]: 群组ID -> 删除的玩家数量
+        """
+        await self.flush_player_cache_async()
+        base_values = (100, self.config.weekly_reset.basic_value)
+        removed: Dict[str, int] = {}
+
+        for group_id in await self.run_io(self.storage.list_groups):
+            records = await self.run_io(self.storage.load_group, group_id)
+            await self.run_io(self.bank_ledger.load_group, group_id)
+            candidates = [
+                user_id for user_id, data in records.items()
+                if is_untouched_default(data, base_values) and not self.has_bank_assets(group_id, user_id)
+            ]
+            del records
+
+            count = 0
+            for start in range(0, len(candidates), self.CLEANUP_CHUNK_SIZE):
+                chunk = candidates[start:start + self.CLEANUP_CHUNK_SIZE]
+                async with self.transaction(group_id, *chunk):
+                    # 扫描之后可能有玩家发生了变化：优先看内存中的数据，不在内存中的重新从磁盘读取
+                    current = {}
+                    for user_id in chunk:
+                        data = self.player_cache.peek(group_id, user_id)
+                        if data is not None:
+                            current[user_id] = data
+                    missing = [user_id for user_id in chunk if user_id not in current]
+                    if missing:
+                        current.update(await self.run_io(self.storage.load_many, group_id, missing))
+                    doomed = [
+                        user_id for user_id, data in current.items()
+                        if is_untouched_default(data, base_values) and not self.has_bank_assets(group_id, user_id)
+                    ]
+                    if not doomed:
+                        continue
+
+                    count += await self.run_io(self.storage.delete_many, group_id, doomed)
+                    for user_id in doomed:
+                        self.player_cache.discard(group_id, user_id)
+                        self.roster.remove(group_id, user_id)
+                    self.leaderboard.players_removed(group_id, doomed)
+                    self.ownership.players_removed(group_id, doomed)
+
+            if count:
+                self.reply_cache.bump(group_id)
+                removed[group_id] = count
+                logger.info(f"群组 {group_id} 清理了 {count} 个默认玩家")
+        return removed
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("奴隶数据转换")
+    @admission_control("奴隶数据转换")
+    async def convert_data(self, event: AstrMessageEvent, codec_name: str = "json"):
+        """将已有数据原地转换为指定编码（管理员功能）
+
+        Args:
+            codec_name: 目标编码，json或msgpack
+        """
+        try:
+            codec, fallback_reason = get_codec(codec_name)
+            if fallback_reason:
+                yield event.plain_result(f"❌ {fallback_reason}")
+                return
+
+            await self.flush_player_cache_async()
+            start = time.perf_counter()
+            converted = await self.run_io(self.convert_data_tree, codec)
+            elapsed = time.perf_counter() - start
+
+            logger.info(f"数据已转换为{codec.name}编码，共{converted}项，耗时{elapsed:.2f}秒")
+            yield event.plain_result(
+                f"✅ 数据转换完成！\n📦 编码: {codec.name}\n📄 转换: {converted} 项\n⏱️ 耗时: {elapsed:.2f} 秒"
+            )
+
+        except Exception as e:
+            logger.error(f"数据转换指令执行失败: {e}")
+            yield event.plain_result("数据转换失败，请稍后重试")
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("清理默认玩家")
+    @admission_control("清理默认玩家")
+    async def cleanup_players(self, event: AstrMessageEvent):
+        """删除从未发生过实际变化的默认玩家数据（管理员功能）"""
+        try:
+            start = time.perf_counter()
+            removed = await self.cleanup_default_players()
+            elapsed = time.perf_counter() - start
+
+            total = sum(removed.values())
+            logger.info(f"默认玩家清理完成，共删除{total}个，耗时{elapsed:.2f}秒")
+            yield event.plain_result(
+                f"🧹 默认玩家清理完成！\n📄 删除: {total} 个玩家\n👥 涉及群组: {len(removed)} 个\n⏱️ 耗时: {elapsed:.2f} 秒"
+            )
+
+        except Exception as e:
+            logger.error(f"清理默认玩家指令执行失败: {e}")
+            yield event.plain_result("清理默认玩家失败，请稍后重试")
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("奴隶缓存统计")
+    @admission_control("奴隶缓存统计")
+    async def cache_stats(self, event: AstrMessageEvent):
+        """查看回复缓存与玩家数据缓存的命中情况（管理员功能）"""
+        stats = self.reply_cache.stats()
+        reply = "📊 缓存统计\n\n"
+        reply += "💬 回复缓存:\n"
+        reply += f"  • 命中: {stats['hits']} 次\n"
+        reply += f"  • 未命中: {stats['misses']} 次\n"
+        reply += f"  • 命中率: {stats['hitRate']:.1%}\n"
+        reply += f"  • 条数: {stats['size']}/{stats['capacity']}\n"
+        if self.renderer is not None:
+            render_stats = self.renderer.stats()
+            reply += f"\n🖼️ 卡片图片缓存（{render_stats['renderer']}）:\n"
+            reply += f"  • 命中: {render_stats['hits']} 次\n"
+            reply += f"  • 栅格化: {render_stats['misses']} 次\n"
+            reply += f"  • 命中率: {render_stats['hitRate']:.1%}\n"
+            reply += f"  • 张数: {render_stats['size']}/{render_stats['capacity']}\n"
+        reply += "\n🗂️ 玩家数据缓存:\n"
+        reply += f"  • 待写回: {self.player_cache.dirty_count()} 条"
+        yield event.plain_result(reply)
+
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("奴隶限流统计")
+    async def admission_stats(self, event: AstrMessageEvent):
+        """查看各指令被令牌桶放行与拒绝的次数（管理员功能）"""
+        stats = self.admission.stats()
+        if not stats:
+            yield event.plain_result("📊 还没有指令经过准入检查")
+            return
+
+        admitted = sum(counters["admitted"] for counters in stats.values())
+        replied = sum(counters["replied"] for counters in stats.values())
+        dropped = sum(counters["dropped"] for counters in stats.values())
+        total = admitted + replied + dropped
+        reply = "📊 指令限流统计\n\n"
+        reply += f"  • 放行: {admitted} 次\n"
+        reply += f"  • 拒绝并提示: {replied} 次\n"
+        reply += f"  • 静默丢弃: {dropped} 次\n"
+        reply += f"  • 拒绝比例: {(replied + dropped) / total:.1%}\n"
+
+        shed = sorted(
+            ((command, counters) for command, counters in stats.items() if counters["replied"] or counters["dropped"]),
+            key=lambda item: item[1]["replied"] + item[1]["dropped"],
+            reverse=True,
+        )
+        if shed:
+            reply += "\n🚦 被拒绝的指令:\n"
+            for command, counters in shed:
+                reply += f"  • #{command}: 拒绝 {counters['replied'] + counters['dropped']} 次 / 放行 {counters['admitted']} 次\n"
+        yield event.plain_result(reply.rstrip())
+
     def terminate(self):
         """插件终止函数
 
@@ -735,7 +1437,22 @@ class SlaveMarketPlugin(Star):
         """
         try:
             logger.info("奴隶市场插件正在卸载...")
-            # 这里可以添加清理逻辑
+            self._reset_task.cancel()
+            self._flush_task.cancel()
+            if self._journal_task is not None:
+                self._journal_task.cancel()
+            self._prune_task.cancel()
+            self._config_task.cancel()
+            self._ownership_task.cancel()
+            # 取消任务不会中断已提交到IO线程池的写回，先等它们完成，
+            # 否则较早的快照可能在最后一次写回之后才落盘，覆盖较新的数据
+            self.io_executor.shutdown(wait=True)
+            self.flush_player_cache()
+            self.cooldowns.flush()
+            self.bank_ledger.flush()
+            if self.renderer is not None:
+                self.renderer.close()
+            self.storage.close()
             logger.info("奴隶市场插件已卸载")
         except Exception as e:
             logger.error(f"插件卸载失败: {e}")
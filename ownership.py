@@ -0,0 +1,180 @@
+"""
+主奴关系索引模块
+按群组在内存中维护主人与奴隶的双向关系，每次保存玩家数据时增量更新，
+关系查询不需要读取玩家数据
+"""
+
+import heapq
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class GroupOwnership:
+    """单个群组的主奴关系图
+
+    以奴隶数据中的 master 字段为准：奴隶 -> 主人为正向边，
+    主人 -> 奴隶集合为反向边，两个方向同时维护，查询均为O(1)。
+    主人数据中的 slaves 列表与奴隶的 master 字段总在同一个事务中修改，不单独索引
+    """
+
+    def __init__(self):
+        self._master: Dict[str, str] = {}
+        self._slaves: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        """有主人的玩家数量"""
+        return len(self._master)
+
+    def set_master(self, user_id: str, master_id: Optional[str]) -> None:
+        """更新玩家的主人
+
+        Args:
+            user_id: 用户ID
+            master_id: 主人ID，没有主人时为None
+        """
+        master_id = str(master_id) if master_id else None
+        old = self._master.get(user_id)
+        if old == master_id:
+            return
+        if old is not None:
+            slaves = self._slaves[old]
+            slaves.discard(user_id)
+            if not slaves:
+                del self._slaves[old]
+        if master_id is None:
+            del self._master[user_id]
+        else:
+            self._master[user_id] = master_id
+            self._slaves.setdefault(master_id, set()).add(user_id)
+
+    def update(self, user_id: str, data: Dict[str, Any]) -> None:
+        """按玩家数据更新关系"""
+        self.set_master(user_id, data.get("master"))
+
+    def remove(self, user_id: str) -> None:
+        """玩家数据被删除，移除其作为奴隶的关系"""
+        self.set_master(user_id, None)
+
+    def master_of(self, user_id: str) -> Optional[str]:
+        """玩家的主人，没有主人时返回None"""
+        return self._master.get(user_id)
+
+    def owns(self, master_id: str, user_id: str) -> bool:
+        """user_id 是否是 master_id 的奴隶"""
+        return self._master.get(user_id) == master_id
+
+    def slaves_of(self, user_id: str) -> Set[str]:
+        """玩家拥有的奴隶（副本）"""
+        return set(self._slaves.get(user_id, ()))
+
+    def slave_count(self, user_id: str) -> int:
+        """玩家拥有的奴隶数量"""
+        return len(self._slaves.get(user_id, ()))
+
+    def chain(self, user_id: str) -> List[str]:
+        """玩家的主人链：主人、主人的主人……直到自由身
+
+        数据异常出现环时在回到已经过的玩家之前停止
+
+        Returns:
+            List[str]: 从直接主人开始的主人ID列表
+        """
+        chain = []
+        seen = {user_id}
+        master_id = self._master.get(user_id)
+        while master_id is not None and master_id not in seen:
+            chain.append(master_id)
+            seen.add(master_id)
+            master_id = self._master.get(master_id)
+        return chain
+
+    def chain_depth(self, user_id: str) -> int:
+        """主人链长度，自由身为0"""
+        return len(self.chain(user_id))
+
+    def largest_holdings(self, limit: int) -> List[Tuple[str, int]]:
+        """拥有奴隶最多的玩家
+
+        Returns:
+            List[Tuple[str, int]]: (主人ID, 奴隶数量)，按数量从多到少
+        """
+        top = heapq.nlargest(limit, list(self._slaves.items()), key=lambda item: len(item[1]))
+        return [(master_id, len(slaves)) for master_id, slaves in top]
+
+
+class OwnershipIndex:
+    """所有群组的主奴关系索引
+
+    群组索引由存储引擎中的主人字段构建（插件启动时在后台预热，未预热的群组在第一次查询时构建），
+    之后通过缓存写入回调增量维护；构建期间到达的更新先暂存，构建完成后再应用
+    """
+
+    def __init__(self):
+        self._graphs: Dict[str, GroupOwnership] = {}
+        self._building: Dict[str, Dict[str, Optional[str]]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, group_id: str) -> Optional[GroupOwnership]:
+        """获取已构建的群组索引，未构建时返回None"""
+        return self._graphs.get(group_id)
+
+    def begin_build(self, group_id: str) -> None:
+        """标记群组索引开始构建"""
+        with self._lock:
+            if group_id not in self._graphs:
+                self._building.setdefault(group_id, {})
+
+    def finish_build(self, group_id: str, masters: Dict[str, str]) -> GroupOwnership:
+        """用群组内所有奴隶的主人完成构建
+
+        Args:
+            group_id: 群组ID
+            masters: 奴隶ID到主人ID的映射
+
+        Returns:
+            GroupOwnership: 群组索引
+        """
+        with self._lock:
+            graph = self._graphs.get(group_id)
+            if graph is not None:
+                return graph
+            graph = GroupOwnership()
+            for user_id, master_id in masters.items():
+                graph.set_master(user_id, master_id)
+            if group_id not in self._building:
+                # 构建期间群组被整体重写，这份数据可能已过期，只用于本次查询
+                return graph
+            for user_id, master_id in self._building.pop(group_id).items():
+                graph.set_master(user_id, master_id)
+            self._graphs[group_id] = graph
+            return graph
+
+    def player_updated(self, group_id: str, records: Dict[str, Dict[str, Any]]) -> None:
+        """缓存写入回调：增量更新关系"""
+        with self._lock:
+            graph = self._graphs.get(group_id)
+            if graph is not None:
+                for user_id, data in records.items():
+                    graph.update(user_id, data)
+            elif group_id in self._building:
+                pending = self._building[group_id]
+                for user_id, data in records.items():
+                    pending[user_id] = data.get("master")
+
+    def players_removed(self, group_id: str, user_ids: List[str]) -> None:
+        """玩家数据被删除：从索引中移除"""
+        with self._lock:
+            graph = self._graphs.get(group_id)
+            if graph is not None:
+                for user_id in user_ids:
+                    graph.remove(user_id)
+            pending = self._building.get(group_id)
+            if pending is not None:
+                for user_id in user_ids:
+                    pending[user_id] = None
+
+    def group_invalidated(self, group_id: str) -> None:
+        """群组数据被整体重写时的回调：丢弃索引，下次查询时重建"""
+        with self._lock:
+            self._graphs.pop(group_id, None)
+            self._building.pop(group_id, None)
@@ -4,33 +4,74 @@
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api import logger
-import os
-import json
+from datetime import datetime
 from typing import Dict, Any, List, TYPE_CHECKING
 
+from .admission import admission_control
+from .timeseries import user_key
+
 if TYPE_CHECKING:
     from .main import SlaveMarketPlugin
 
+# 指令参数中的排行名称到指标名的映射
+METRIC_NAMES = {
+    "金币": "currency",
+    "身价": "value",
+    "奴隶": "slaves",
+    "段位": "points",
+}
+
+# 分页排行榜每页显示的人数
+PAGE_SIZE = 10
+
+# 身价走势显示的周数
+TREND_WEEKS = 12
+
 class RankingModule:
     def __init__(self, plugin: 'SlaveMarketPlugin'):
         self.plugin = plugin
     
-    def get_all_players(self, group_id: str) -> List[Dict[str, Any]]:
+    async def get_all_players(self, group_id: str) -> List[Dict[str, Any]]:
         """获取群组内所有玩家数据"""
-        players = []
-        group_path = os.path.join(self.plugin.data_path, "player", group_id)
-        
-        if os.path.exists(group_path):
-            for filename in os.listdir(group_path):
-                if filename.endswith(".json"):
-                    user_id = filename[:-5]  # 移除.json后缀
-                    player_data = self.plugin.get_player_data(group_id, user_id)
-                    if player_data:
-                        players.append(player_data)
-        
-        return players
+        await self.plugin.flush_player_cache_async()
+        records = await self.plugin.run_io(self.plugin.storage.load_group, group_id)
+        return list(records.values())
+    
+    async def get_top_players(self, group_id: str, metric: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """按指标获取排名靠前的玩家摘要
+        
+        直接读取增量维护的排行榜索引，只有群组第一次查询时才会读取存储
+        """
+        board = await self.plugin.get_leaderboard_async(group_id)
+        return board.top(metric, limit)
+    
+    def build_board(self, title: str, ranking: List[Dict[str, Any]], unit: str, offset: int = 0) -> Dict[str, Any]:
+        """构建rankings模板中一个排行表的数据
+        
+        Args:
+            title: 排行名称，如"金币"
+            ranking: 按名次排列的玩家摘要，每项的value为要显示的数值
+            unit: 数值单位
+            offset: 第一项之前的名次数
+        
+        Returns:
+            Dict[str, Any]: 排行表数据
+        """
+        return {
+            "type": title,
+            "info": [
+                {
+                    "rank": rank,
+                    "id": player.get("user_id", ""),
+                    "nickname": player.get("nickname", "未知"),
+                    "value": f"{value:,} {unit}",
+                }
+                for rank, (player, value) in enumerate(ranking, offset + 1)
+            ],
+        }
     
     @filter.command("排行榜")
+    @admission_control("排行榜")
     async def show_rankings(self, event: AstrMessageEvent):
         """显示排行榜"""
         if not event.get_group_id():
@@ -38,20 +79,27 @@ class RankingModule:
             return
         
         group_id = str(event.get_group_id())
-        players = self.get_all_players(group_id)
         
-        if not players:
-            yield event.plain_result("暂无玩家数据")
+        # 两次数据变化之间的重复查询直接返回缓存的回复
+        cache_key = self.plugin.reply_cache.key(group_id, "排行榜")
+        cached = self.plugin.reply_cache.get(cache_key)
+        if cached is not None:
+            reply, card = cached
+            yield await self.plugin.card_result(event, "rankings", card, reply)
             return
         
         # 金币排行榜
-        currency_ranking = sorted(players, key=lambda x: x.get("currency", 0), reverse=True)[:10]
+        currency_ranking = await self.get_top_players(group_id, "currency")
+        
+        if not currency_ranking:
+            yield event.plain_result("暂无玩家数据")
+            return
         
         # 身价排行榜
-        value_ranking = sorted(players, key=lambda x: x.get("value", 0), reverse=True)[:10]
+        value_ranking = await self.get_top_players(group_id, "value")
         
         # 奴隶数量排行榜
-        slaves_ranking = sorted(players, key=lambda x: len(x.get("slaves", [])), reverse=True)[:10]
+        slaves_ranking = await self.get_top_players(group_id, "slaves")
         
         # 构建回复消息
         reply = "🏆 奴隶市场排行榜 🏆\n\n"
@@ -70,38 +118,63 @@ class RankingModule:
         reply += "\n👥 奴隶数量排行榜:\n"
         for i, player in enumerate(slaves_ranking, 1):
             emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-            slave_count = len(player.get("slaves", []))
-            reply += f"{emoji} {player.get('nickname', '未知')} - {slave_count} 个奴隶\n"
+            reply += f"{emoji} {player.get('nickname', '未知')} - {player.get('slaves_count', 0)} 个奴隶\n"
         
-        yield event.plain_result(reply)
+        card = {"boards": [
+            self.build_board("金币", [(p, p.get("currency", 0)) for p in currency_ranking], "金币"),
+            self.build_board("身价", [(p, p.get("value", 0)) for p in value_ranking], "金币"),
+            self.build_board("奴隶数量", [(p, p.get("slaves_count", 0)) for p in slaves_ranking], "个"),
+        ]}
+        
+        # 同时缓存文字与卡片数据，卡片图片本身由渲染管线按内容缓存
+        self.plugin.reply_cache.put(cache_key, (reply, card))
+        yield await self.plugin.card_result(event, "rankings", card, reply)
     
     @filter.command("金币排行")
-    async def currency_ranking(self, event: AstrMessageEvent):
-        """金币排行榜"""
+    @admission_control("金币排行")
+    async def currency_ranking(self, event: AstrMessageEvent, page: int = 1):
+        """金币排行榜，可指定页码"""
         if not event.get_group_id():
             yield event.plain_result("该游戏只能在群内使用")
             return
         
         group_id = str(event.get_group_id())
-        players = self.get_all_players(group_id)
         
-        if not players:
+        board = await self.plugin.get_leaderboard_async(group_id)
+        total = len(board)
+        if total == 0:
             yield event.plain_result("暂无玩家数据")
             return
         
-        # 按金币排序
-        ranking = sorted(players, key=lambda x: x.get("currency", 0), reverse=True)[:10]
+        pages = (total + PAGE_SIZE - 1) // PAGE_SIZE
+        if page < 1 or page > pages:
+            yield event.plain_result(f"页码超出范围，共 {pages} 页")
+            return
         
-        reply = "💰 金币排行榜 TOP10 💰\n\n"
-        for i, player in enumerate(ranking, 1):
+        # 从索引中按名次定位到该页的第一名，不需要对全群排序
+        offset = (page - 1) * PAGE_SIZE
+        ranking = board.page("currency", offset, PAGE_SIZE)
+        
+        if page == 1:
+            reply = "💰 金币排行榜 TOP10 💰\n\n"
+        else:
+            reply = f"💰 金币排行榜 第{page}/{pages}页 💰\n\n"
+        for i, player in enumerate(ranking, offset + 1):
             emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i:2d}."
             nickname = player.get('nickname', '未知')
             currency = player.get('currency', 0)
             reply += f"{emoji} {nickname} - {currency:,} 金币\n"
         
-        yield event.plain_result(reply)
+        if pages > 1:
+            reply += f"\n📄 第{page}/{pages}页，发送 #金币排行 <页码> 翻页"
+        
+        card = {"boards": [
+            self.build_board("金币", [(p, p.get("currency", 0)) for p in ranking], "金币", offset)
+        ]}
+        yield await self.plugin.card_result(event, "rankings", card, reply)
     
     @filter.command("身价排行")
+    @admission_control("身价排行")
     async def value_ranking(self, event: AstrMessageEvent):
         """身价排行榜"""
         if not event.get_group_id():
@@ -109,15 +182,14 @@ class RankingModule:
             return
         
         group_id = str(event.get_group_id())
-        players = self.get_all_players(group_id)
         
-        if not players:
+        # 按身价排序
+        ranking = await self.get_top_players(group_id, "value")
+        
+        if not ranking:
             yield event.plain_result("暂无玩家数据")
             return
         
-        # 按身价排序
-        ranking = sorted(players, key=lambda x: x.get("value", 0), reverse=True)[:10]
-        
         reply = "💎 身价排行榜 TOP10 💎\n\n"
         for i, player in enumerate(ranking, 1):
             emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i:2d}."
@@ -125,9 +197,11 @@ class RankingModule:
             value = player.get('value', 0)
             reply += f"{emoji} {nickname} - {value:,} 金币\n"
         
-        yield event.plain_result(reply)
+        card = {"boards": [self.build_board("身价", [(p, p.get("value", 0)) for p in ranking], "金币")]}
+        yield await self.plugin.card_result(event, "rankings", card, reply)
     
     @filter.command("奴隶排行")
+    @admission_control("奴隶排行")
     async def slaves_ranking(self, event: AstrMessageEvent):
         """奴隶数量排行榜"""
         if not event.get_group_id():
@@ -135,25 +209,26 @@ class RankingModule:
             return
         
         group_id = str(event.get_group_id())
-        players = self.get_all_players(group_id)
         
-        if not players:
+        # 按奴隶数量排序
+        ranking = await self.get_top_players(group_id, "slaves")
+        
+        if not ranking:
             yield event.plain_result("暂无玩家数据")
             return
         
-        # 按奴隶数量排序
-        ranking = sorted(players, key=lambda x: len(x.get("slaves", [])), reverse=True)[:10]
-        
         reply = "👥 奴隶数量排行榜 TOP10 👥\n\n"
         for i, player in enumerate(ranking, 1):
             emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i:2d}."
             nickname = player.get('nickname', '未知')
-            slave_count = len(player.get("slaves", []))
+            slave_count = player.get('slaves_count', 0)
             reply += f"{emoji} {nickname} - {slave_count} 个奴隶\n"
         
-        yield event.plain_result(reply)
+        card = {"boards": [self.build_board("奴隶数量", [(p, p.get("slaves_count", 0)) for p in ranking], "个")]}
+        yield await self.plugin.card_result(event, "rankings", card, reply)
     
     @filter.command("段位排行")
+    @admission_control("段位排行")
     async def tier_ranking(self, event: AstrMessageEvent):
         """段位排行榜"""
         if not event.get_group_id():
@@ -161,14 +236,19 @@ class RankingModule:
             return
         
         group_id = str(event.get_group_id())
-        players = self.get_all_players(group_id)
         
-        if not players:
-            yield event.plain_result("暂无玩家数据")
+        cache_key = self.plugin.reply_cache.key(group_id, "段位排行")
+        reply = self.plugin.reply_cache.get(cache_key)
+        if reply is not None:
+            yield event.plain_result(reply)
             return
         
         # 按积分排序
-        ranking = sorted(players, key=lambda x: x.get("arena", {}).get("points", 0), reverse=True)[:10]
+        ranking = await self.get_top_players(group_id, "points")
+        
+        if not ranking:
+            yield event.plain_result("暂无玩家数据")
+            return
         
         reply = "🏆 段位排行榜 TOP10 🏆\n\n"
         for i, player in enumerate(ranking, 1):
@@ -182,4 +262,143 @@ class RankingModule:
             
             reply += f"{emoji} {nickname} - {tier} ({points}分) {wins}胜{losses}败\n"
         
+        self.plugin.reply_cache.put(cache_key, reply)
+        yield event.plain_result(reply)
+    
+    @filter.command("我的排名")
+    @admission_control("我的排名")
+    async def my_rank(self, event: AstrMessageEvent, metric_name: str = ""):
+        """查看自己在各项排行中的名次"""
+        if not event.get_group_id():
+            yield event.plain_result("该游戏只能在群内使用")
+            return
+        
+        if metric_name and metric_name not in METRIC_NAMES:
+            yield event.plain_result("用法: #我的排名 [金币|身价|奴隶|段位]")
+            return
+        
+        group_id = str(event.get_group_id())
+        user_id = str(event.get_sender_id())
+        
+        board = await self.plugin.get_leaderboard_async(group_id)
+        player = board.summary(user_id)
+        if player is None:
+            yield event.plain_result("你还没有玩家数据，先去 #打工 吧")
+            return
+        
+        names = [metric_name] if metric_name else list(METRIC_NAMES)
+        total = len(board)
+        
+        reply = f"📊 {player.get('nickname', '未知')} 的排名（共 {total} 人）\n\n"
+        for name in names:
+            metric = METRIC_NAMES[name]
+            rank = board.rank(metric, user_id)
+            if metric == "currency":
+                reply += f"💰 金币: 第{rank}名 ({player['currency']:,} 金币)\n"
+            elif metric == "value":
+                reply += f"💎 身价: 第{rank}名 ({player['value']:,} 金币)\n"
+            elif metric == "slaves":
+                reply += f"👥 奴隶: 第{rank}名 ({player['slaves_count']} 个奴隶)\n"
+            else:
+                arena_data = player["arena"]
+                reply += f"🏆 段位: 第{rank}名 ({arena_data['tier']} {arena_data['points']}分)\n"
+        
+        yield event.plain_result(reply)
+    
+    @filter.command("身价走势")
+    @admission_control("身价走势")
+    async def value_trend(self, event: AstrMessageEvent, target_user: str = ""):
+        """查看玩家历周的身价变化"""
+        if not event.get_group_id():
+            yield event.plain_result("该游戏只能在群内使用")
+            return
+        
+        group_id = str(event.get_group_id())
+        target_id = target_user[1:] if target_user.startswith("@") else target_user
+        target_id = target_id or str(event.get_sender_id())
+        
+        cache_key = self.plugin.reply_cache.key(group_id, "身价走势", target_id)
+        reply = self.plugin.reply_cache.get(cache_key)
+        if reply is not None:
+            yield event.plain_result(reply)
+            return
+        
+        series = await self.plugin.run_io(self.plugin.trends.player_series, group_id, target_id, TREND_WEEKS)
+        board = await self.plugin.get_leaderboard_async(group_id)
+        current = board.summary(target_id)
+        if not series and current is None:
+            yield event.plain_result("暂无该用户的数据")
+            return
+        
+        nickname = current.get("nickname", target_id) if current else target_id
+        reply = f"📈 {nickname} 的身价走势\n\n"
+        if not series:
+            reply += "暂无历史数据，每周重置后开始记录\n"
+        
+        previous = None
+        for week, metrics in series:
+            value = metrics["value"]
+            if previous is None or value == previous:
+                trend = "➖"
+            else:
+                trend = "🔺" if value > previous else "🔻"
+            date = datetime.fromtimestamp(week).strftime("%Y-%m-%d")
+            reply += f"{date} {trend} {value:,} 金币\n"
+            previous = value
+        
+        if current:
+            reply += f"\n💎 本周当前: {current['value']:,} 金币"
+        
+        self.plugin.reply_cache.put(cache_key, reply)
+        yield event.plain_result(reply)
+    
+    @filter.command("历史最高")
+    @admission_control("历史最高")
+    async def all_time_highs(self, event: AstrMessageEvent):
+        """查看本群各项指标的历史最高纪录"""
+        if not event.get_group_id():
+            yield event.plain_result("该游戏只能在群内使用")
+            return
+        
+        group_id = str(event.get_group_id())
+        
+        cache_key = self.plugin.reply_cache.key(group_id, "历史最高")
+        reply = self.plugin.reply_cache.get(cache_key)
+        if reply is not None:
+            yield event.plain_result(reply)
+            return
+        
+        best = await self.plugin.run_io(self.plugin.trends.highest, group_id)
+        if not best:
+            yield event.plain_result("暂无历史数据，每周重置后开始记录")
+            return
+        
+        # 时间序列中只保存用户键，通过当前名单还原昵称
+        roster = await self.plugin.get_roster_async(group_id)
+        board = await self.plugin.get_leaderboard_async(group_id)
+        user_ids = {user_key(user_id): user_id for user_id in roster.ids()}
+        
+        def holder(key: int) -> str:
+            user_id = user_ids.get(key)
+            summary = board.summary(user_id) if user_id else None
+            if summary:
+                return summary.get("nickname", user_id)
+            return user_id or "已离开的玩家"
+        
+        labels = {
+            "currency": ("💰 金币", "金币"),
+            "value": ("💎 身价", "金币"),
+            "slaves": ("👥 奴隶", "个奴隶"),
+            "points": ("🏆 积分", "分"),
+        }
+        
+        reply = "🏛️ 本群历史最高纪录\n\n"
+        for metric, (label, unit) in labels.items():
+            if metric not in best:
+                continue
+            value, key, week = best[metric]
+            date = datetime.fromtimestamp(week).strftime("%Y-%m-%d")
+            reply += f"{label}: {holder(key)} - {value:,} {unit}（{date}）\n"
+        
+        self.plugin.reply_cache.put(cache_key, reply)
         yield event.plain_result(reply)
\ No newline at end of file
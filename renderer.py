@@ -0,0 +1,464 @@
+"""
+卡片渲染模块
+将resources/html下的模板预编译为Jinja2模板，在有界线程池中栅格化为图片，
+并按内容哈希缓存渲染结果，相同内容的卡片只栅格化一次
+"""
+
+import asyncio
+import hashlib
+import io
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .config import RenderConfig
+
+try:
+    import jinja2
+except ImportError:  # pragma: no cover - 取决于运行环境
+    jinja2 = None
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # pragma: no cover - 取决于运行环境
+    Image = ImageDraw = ImageFont = None
+
+# 未配置字体时依次尝试的中文字体
+FONT_CANDIDATES = (
+    "/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-microhei.ttc",
+    "/usr/share/fonts/truetype/wqy/wqy-zenhei.ttc",
+    "/usr/share/fonts/truetype/droid/DroidSansFallbackFull.ttf",
+    "C:/Windows/Fonts/msyh.ttc",
+    "/System/Library/Fonts/PingFang.ttc",
+)
+
+# 另起一行的HTML标签
+_BLOCK_TAGS = {
+    "h1", "h2", "h3", "p", "div", "tr", "dt", "dd", "li",
+    "article", "section", "header", "main", "table", "br",
+}
+
+# 不输出文字的HTML标签
+_SKIP_TAGS = {"head", "style", "script", "title"}
+
+# 各行样式对应的字号与颜色
+_STYLES = {
+    "title": (34, (44, 62, 80)),
+    "heading": (24, (127, 90, 240)),
+    "body": (20, (43, 44, 52)),
+}
+
+
+class _TextExtractor(HTMLParser):
+    """把渲染好的HTML拆成带样式的文本行，供Pillow排版"""
+
+    def __init__(self):
+        super().__init__()
+        self.lines: List[Tuple[str, str]] = []
+        self._parts: List[str] = []
+        self._style = "body"
+        self._skip = 0
+
+    def _flush(self) -> None:
+        text = " ".join("".join(self._parts).split())
+        if text:
+            self.lines.append((self._style, text))
+        self._parts = []
+        self._style = "body"
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip += 1
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+            if tag == "h1":
+                self._style = "title"
+            elif tag in ("h2", "h3", "dt"):
+                self._style = "heading"
+        elif tag in ("td", "th"):
+            self._parts.append("  ")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif tag in _BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._parts.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+class PillowRenderer:
+    """离线栅格化：提取HTML中的文字，用Pillow按行排版绘制
+
+    不解析CSS，只保留标题、小标题与正文三种样式，不需要浏览器
+    """
+
+    name = "pillow"
+
+    def __init__(self, width: int = 800, font_path: str = ""):
+        """初始化渲染器
+
+        Args:
+            width: 图片宽度（像素）
+            font_path: 字体文件路径，为空时自动查找系统中文字体
+        """
+        self.width = width
+        self.font_path = font_path or next((path for path in FONT_CANDIDATES if os.path.exists(path)), "")
+        if not self.font_path:
+            logger.warning("未找到中文字体，卡片中的中文可能无法显示，可在render.fontPath中指定字体")
+        self._fonts = {style: self._load_font(size) for style, (size, _) in _STYLES.items()}
+
+    def _load_font(self, size: int):
+        if self.font_path:
+            return ImageFont.truetype(self.font_path, size)
+        try:
+            return ImageFont.load_default(size=size)
+        except TypeError:  # Pillow < 10.1
+            return ImageFont.load_default()
+
+    def _wrap(self, text: str, font, max_width: int) -> List[str]:
+        """按像素宽度逐字折行"""
+        lines, current = [], ""
+        for char in text:
+            if current and font.getlength(current + char) > max_width:
+                lines.append(current)
+                current = char
+            else:
+                current += char
+        if current:
+            lines.append(current)
+        return lines
+
+    def rasterize(self, html: str) -> bytes:
+        """将HTML栅格化为PNG
+
+        Args:
+            html: 渲染好的HTML
+
+        Returns:
+            bytes: PNG图片数据
+        """
+        extractor = _TextExtractor()
+        extractor.feed(html)
+        extractor.close()
+
+        padding = 32
+        max_width = self.width - padding * 2
+        rows = []
+        for style, text in extractor.lines:
+            font = self._fonts[style]
+            size, color = _STYLES[style]
+            gap = size // 2 if style != "body" else size // 4
+            for line in self._wrap(text, font, max_width):
+                rows.append((style, line, font, color, size + gap))
+
+        height = padding * 2 + sum(row[4] for row in rows)
+        image = Image.new("RGB", (self.width, max(height, padding * 2)), (245, 245, 245))
+        draw = ImageDraw.Draw(image)
+        y = padding
+        for style, line, font, color, row_height in rows:
+            if style == "title":
+                x = (self.width - font.getlength(line)) / 2
+            else:
+                x = padding
+            draw.text((x, y), line, font=font, fill=color)
+            y += row_height
+
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def close_thread(self) -> None:
+        """释放当前渲染线程持有的资源"""
+
+    def close(self) -> None:
+        """释放资源"""
+
+
+class BrowserRenderer:
+    """用无头浏览器（playwright）截图，完整支持模板中的CSS
+
+    每个渲染线程各自启动一个浏览器，线程退出前一直复用。
+    同步版playwright的对象只能在创建它的线程中使用，浏览器也要由该线程经 close_thread 关闭
+    """
+
+    name = "browser"
+
+    def __init__(self, width: int = 800):
+        """初始化渲染器
+
+        Args:
+            width: 页面宽度（像素）
+        """
+        from playwright.sync_api import sync_playwright  # noqa: F401 - 未安装时尽早报错
+
+        self.width = width
+        self._local = threading.local()
+        self._browsers = []
+        self._lock = threading.Lock()
+
+    def _browser(self):
+        browser = getattr(self._local, "browser", None)
+        if browser is None:
+            from playwright.sync_api import sync_playwright
+
+            playwright = sync_playwright().start()
+            browser = playwright.chromium.launch()
+            self._local.playwright = playwright
+            self._local.browser = browser
+            with self._lock:
+                self._browsers.append((playwright, browser))
+        return browser
+
+    def rasterize(self, html: str) -> bytes:
+        """将HTML截图为PNG"""
+        page = self._browser().new_page(viewport={"width": self.width, "height": 600})
+        try:
+            page.set_content(html, wait_until="load")
+            return page.screenshot(full_page=True, type="png")
+        finally:
+            page.close()
+
+    def close_thread(self) -> None:
+        """关闭当前渲染线程启动的浏览器"""
+        browser = getattr(self._local, "browser", None)
+        if browser is None:
+            return
+        playwright = self._local.playwright
+        self._local.browser = self._local.playwright = None
+        with self._lock:
+            self._browsers.remove((playwright, browser))
+        try:
+            browser.close()
+            playwright.stop()
+        except Exception as e:
+            logger.error(f"关闭浏览器失败: {e}")
+
+    def close(self) -> None:
+        """检查所有浏览器都已由各自的渲染线程关闭"""
+        with self._lock:
+            browsers, self._browsers = self._browsers, []
+        if browsers:
+            logger.warning(f"{len(browsers)}个浏览器未能在其渲染线程中关闭")
+
+
+class CardRenderer:
+    """模板卡片渲染管线
+
+    - 启动时把全部模板编译进同一个Jinja2环境，字节码缓存在 data/cache/templates，
+      重启后也不需要重新编译
+    - 渲染出的HTML按内容取哈希，相同内容直接返回已有的图片；
+      同一内容同时被多次请求时只栅格化一次，其余请求等待同一结果
+    - 栅格化在有界线程池中执行，不阻塞事件循环
+    - 图片写到 data/cache/images，按LRU只保留最近的capacity张；
+      被淘汰的图片可能已经返回但还没有发出，保留EVICT_GRACE秒后才删除
+    """
+
+    # 被淘汰的图片在删除前保留的秒数，覆盖从返回路径到消息发出的时间
+    EVICT_GRACE = 120
+
+    # 关闭时等待所有渲染线程领取关闭任务的最长秒数
+    CLOSE_TIMEOUT = 30
+
+    def __init__(self, resource_path: str, cache_path: str, config: RenderConfig):
+        """初始化渲染管线
+
+        Args:
+            resource_path: resources目录
+            cache_path: 缓存目录
+            config: render配置项
+        """
+        self.resource_path = resource_path
+        self.image_dir = os.path.join(cache_path, "images")
+        # 至少保留刚渲染出的一张，避免图片在发送前就被删除
+        self.capacity = max(1, config.cache_size)
+
+        bytecode_dir = os.path.join(cache_path, "templates")
+        os.makedirs(bytecode_dir, exist_ok=True)
+        # 图片缓存只在本次运行中有效，启动时清空
+        shutil.rmtree(self.image_dir, ignore_errors=True)
+        os.makedirs(self.image_dir, exist_ok=True)
+
+        self.env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(os.path.join(resource_path, "html")),
+            bytecode_cache=jinja2.FileSystemBytecodeCache(bytecode_dir),
+            autoescape=jinja2.select_autoescape(["html"]),
+            auto_reload=False,
+            cache_size=-1,
+        )
+        self.templates = {
+            name.split("/", 1)[0]: self.env.get_template(name)
+            for name in self.env.list_templates(extensions=["html"])
+        }
+
+        self.base_url = Path(resource_path).as_uri() + "/"
+        width = config.width
+        if config.renderer == "browser":
+            self.backend = BrowserRenderer(width)
+        else:
+            self.backend = PillowRenderer(width, config.font_path)
+
+        self.workers = config.workers
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="slave_market_render",
+        )
+        self._images: "OrderedDict[str, str]" = OrderedDict()
+        # 已淘汰、等待删除的图片：(删除时间, 内容哈希, 路径)
+        self._retired: Deque[Tuple[float, str, str]] = deque()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def render_html(self, template: str, context: Dict[str, Any]) -> str:
+        """用预编译的模板渲染HTML
+
+        Args:
+            template: 模板名（resources/html下的目录名）
+            context: 模板数据
+
+        Returns:
+            str: HTML内容
+        """
+        return self.templates[template].render(filePath=self.base_url, **context)
+
+    def _rasterize_to_file(self, digest: str, html: str) -> str:
+        """在渲染线程中栅格化并写入图片文件"""
+        png = self.backend.rasterize(html)
+        path = os.path.join(self.image_dir, f"{digest}.png")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+        return path
+
+    def _admit(self, digest: str, path: str) -> None:
+        """加入图片缓存，超出容量时淘汰最久未用的图片，过了保留期的图片才删除"""
+        self._images[digest] = path
+        self._images.move_to_end(digest)
+        now = time.monotonic()
+        while len(self._images) > self.capacity:
+            evicted_digest, evicted = self._images.popitem(last=False)
+            self._retired.append((now + self.EVICT_GRACE, evicted_digest, evicted))
+        while self._retired and self._retired[0][0] <= now:
+            _, retired_digest, retired = self._retired.popleft()
+            # 保留期内又渲染了相同内容时，文件已重新加入缓存
+            if retired_digest in self._images:
+                continue
+            try:
+                os.remove(retired)
+            except OSError:
+                pass
+
+    async def render(self, template: str, context: Dict[str, Any]) -> str:
+        """渲染卡片图片
+
+        Args:
+            template: 模板名
+            context: 模板数据
+
+        Returns:
+            str: 图片文件路径
+        """
+        html = self.render_html(template, context)
+        digest = hashlib.blake2b(
+            f"{self.backend.name}\0{html}".encode("utf-8"), digest_size=16
+        ).hexdigest()
+
+        path = self._images.get(digest)
+        if path is not None:
+            self._images.move_to_end(digest)
+            self.hits += 1
+            return path
+
+        pending = self._pending.get(digest)
+        if pending is not None:
+            self.hits += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._rasterize_to_file, digest, html)
+        self._pending[digest] = future
+        try:
+            path = await asyncio.shield(future)
+        finally:
+            self._pending.pop(digest, None)
+        self._admit(digest, path)
+        return path
+
+    def stats(self) -> Dict[str, Any]:
+        """图片缓存统计"""
+        total = self.hits + self.misses
+        return {
+            "renderer": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / total if total else 0.0,
+            "size": len(self._images),
+            "capacity": self.capacity,
+        }
+
+    def _close_worker(self, barrier: threading.Barrier) -> None:
+        """在渲染线程中释放该线程持有的后端资源"""
+        try:
+            # 所有关闭任务都到达屏障后才继续，保证每个渲染线程恰好领取一个
+            barrier.wait()
+        except threading.BrokenBarrierError:
+            pass
+        self.backend.close_thread()
+
+    def close(self) -> None:
+        """关闭浏览器与渲染线程池
+
+        浏览器只能在创建它的渲染线程中关闭，先向每个渲染线程各派发一个关闭任务，再关闭线程池
+        """
+        barrier = threading.Barrier(self.workers, timeout=self.CLOSE_TIMEOUT)
+        for _ in range(self.workers):
+            self.executor.submit(self._close_worker, barrier)
+        self.executor.shutdown(wait=True)
+        self.backend.close()
+
+
+def create_renderer(resource_path: str, cache_path: str, config: RenderConfig) -> Optional[CardRenderer]:
+    """根据配置创建渲染管线
+
+    未启用、缺少jinja2/Pillow或浏览器不可用时返回None，各指令回退为文字回复
+
+    Args:
+        resource_path: resources目录
+        cache_path: 缓存目录
+        config: render配置项
+
+    Returns:
+        Optional[CardRenderer]: 渲染管线
+    """
+    if not config.enabled:
+        return None
+    if jinja2 is None:
+        logger.warning("未安装jinja2，卡片渲染不可用，使用文字回复")
+        return None
+    if config.renderer != "browser" and Image is None:
+        logger.warning("未安装Pillow，卡片渲染不可用，使用文字回复")
+        return None
+    try:
+        return CardRenderer(resource_path, cache_path, config)
+    except Exception as e:
+        logger.error(f"初始化卡片渲染失败，使用文字回复: {e}")
+        return None
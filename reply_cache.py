@@ -0,0 +1,123 @@
+"""
+回复缓存模块
+按群组维护数据版本号，缓存只读指令生成的回复文本
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+ReplyKey = Tuple[str, str, Tuple[Any, ...], int]
+
+
+class ReplyCache:
+    """带版本号的只读指令回复缓存
+
+    每个群组有一个版本号，群组内任何玩家数据被保存或整体重写时加一。
+    缓存键为(群组ID, 指令, 参数, 版本号)，数据变化后旧版本的回复不会再被命中，
+    由LRU自然淘汰，不需要逐条失效。
+
+    用法::
+
+        key = cache.key(group_id, "排行榜")
+        reply = cache.get(key)
+        if reply is None:
+            reply = ...  # 生成回复
+            cache.put(key, reply)
+
+    需要在生成回复之前取得key，生成期间发生的保存会使这份回复直接过期。
+    """
+
+    def __init__(self, capacity: int = 512):
+        """初始化缓存
+
+        Args:
+            capacity: 最多缓存的回复条数，为0时不缓存
+        """
+        self.capacity = max(0, capacity)
+        self._entries: "OrderedDict[ReplyKey, str]" = OrderedDict()
+        self._versions: Dict[str, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def version(self, group_id: str) -> int:
+        """获取群组当前的数据版本号"""
+        return self._versions.get(group_id, 0)
+
+    def bump(self, group_id: str) -> None:
+        """群组数据发生变化，版本号加一"""
+        with self._lock:
+            self._versions[group_id] = self._versions.get(group_id, 0) + 1
+
+    def player_updated(self, group_id: str, records: Dict[str, Dict[str, Any]]) -> None:
+        """缓存写入回调"""
+        self.bump(group_id)
+
+    def group_invalidated(self, group_id: str) -> None:
+        """群组数据被整体重写时的回调"""
+        self.bump(group_id)
+
+    def key(self, group_id: str, command: str, *args: Any) -> ReplyKey:
+        """生成带当前版本号的缓存键
+
+        Args:
+            group_id: 群组ID
+            command: 指令名
+            *args: 指令参数
+
+        Returns:
+            ReplyKey: 缓存键
+        """
+        return (group_id, command, args, self.version(group_id))
+
+    def get(self, key: ReplyKey) -> Optional[str]:
+        """读取缓存的回复
+
+        Args:
+            key: key生成的缓存键
+
+        Returns:
+            Optional[str]: 回复文本，未命中时返回None
+        """
+        with self._lock:
+            reply = self._entries.get(key)
+            if reply is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return reply
+
+    def put(self, key: ReplyKey, reply: str) -> None:
+        """缓存回复
+
+        生成回复期间版本号已经变化的话不再缓存
+
+        Args:
+            key: 生成回复之前取得的缓存键
+            reply: 回复文本
+        """
+        if self.capacity == 0 or key[3] != self.version(key[0]):
+            return
+        with self._lock:
+            self._entries[key] = reply
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """获取命中统计
+
+        Returns:
+            Dict[str, Any]: 命中次数、未命中次数、命中率与当前条数
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / total if total else 0.0,
+                "size": len(self._entries),
+                "capacity": self.capacity,
+            }
@@ -4,18 +4,29 @@
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api import logger
-import time
 from typing import Dict, Any, TYPE_CHECKING
 
+from .admission import admission_control
+
 if TYPE_CHECKING:
+    from .config import PluginConfig
     from .main import SlaveMarketPlugin
+    from .transaction import PlayerTransaction
 
 class SlaveManagementModule:
+    # #奴隶关系 显示的奴隶主数量
+    HOLDINGS_SIZE = 5
+
     def __init__(self, plugin: 'SlaveMarketPlugin'):
         self.plugin = plugin
-        self.config = plugin.config
+    
+    @property
+    def config(self) -> 'PluginConfig':
+        """当前配置，配置文件热重载后自动使用新配置"""
+        return self.plugin.config
     
     @filter.command("赎身")
+    @admission_control("赎身")
     async def buy_back_freedom(self, event: AstrMessageEvent):
         """赎身"""
         if not event.get_group_id():
@@ -26,32 +37,47 @@ class SlaveManagementModule:
         user_id = str(event.get_sender_id())
         nickname = event.get_sender_name()
         
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
+        # 检查冷却时间，冷却中时不需要读取玩家数据
+        remaining = self.plugin.cooldown_remaining(group_id, user_id, "buyback")
+        if remaining:
+            yield event.plain_result(f"赎身冷却中，还需等待 {remaining//3600} 小时")
+            return
         
-        # 检查是否有主人
-        if not data.get("master"):
+        # 从主奴关系索引检查是否有主人，不需要读取玩家数据
+        graph = await self.plugin.get_ownership_async(group_id)
+        master_id = graph.master_of(user_id)
+        if master_id is None:
             yield event.plain_result("你已经是自由身了，不需要赎身")
             return
         
+        # 奴隶和主人在同一个事务中修改
+        async with self.plugin.transaction(group_id, user_id, master_id) as txn:
+            reply = await self.buy_back_in_transaction(txn, user_id, master_id)
+        yield event.plain_result(reply)
+    
+    async def buy_back_in_transaction(self, txn: 'PlayerTransaction', user_id: str, master_id: str) -> str:
+        """在事务中执行赎身"""
+        data = await txn.get(user_id)
+        
+        # 加锁前主人可能已经变化
+        if not data or str(data.get("master")) != master_id:
+            return "赎身失败：主人已变更，请重试"
+        
         # 获取主人信息
-        master_data = self.plugin.get_player_data(group_id, str(data["master"]))
+        master_data = await txn.get(master_id)
         if not master_data:
-            yield event.plain_result("赎身失败：主人数据不存在")
-            return
+            return "赎身失败：主人数据不存在"
         
         # 计算赎身价格（身价的1.5倍）
         buyback_price = int(data["value"] * 1.5)
         
         if data["currency"] < buyback_price:
-            yield event.plain_result(f"金币不足！赎身需要 {buyback_price} 金币，你只有 {data['currency']} 金币")
-            return
+            return f"金币不足！赎身需要 {buyback_price} 金币，你只有 {data['currency']} 金币"
         
-        # 检查冷却时间
-        if not self.plugin.check_cooldown(data, "buyback", self.config["buyBack"]["cooldown"]):
-            remaining = self.config["buyBack"]["cooldown"] - (int(time.time()) - data["cooldowns"]["buyback"])
-            yield event.plain_result(f"赎身冷却中，还需等待 {remaining//3600} 小时")
-            return
+        # 加锁后再次检查冷却，防止并发赎身
+        remaining = self.plugin.cooldown_remaining(txn.group_id, user_id, "buyback")
+        if remaining:
+            return f"赎身冷却中，还需等待 {remaining//3600} 小时"
         
         # 执行赎身
         data["currency"] -= buyback_price
@@ -62,7 +88,6 @@ class SlaveManagementModule:
             master_data["slaves"].remove(user_id)
         
         # 清除主人关系
-        old_master = data["master"]
         data["master"] = None
         
         # 身价降为原来的20%
@@ -70,15 +95,12 @@ class SlaveManagementModule:
         data["value"] = int(data["value"] * 0.2)
         
         # 设置冷却时间
-        self.plugin.set_cooldown(data, "buyback")
-        
-        # 保存数据
-        self.plugin.save_player_data(group_id, user_id, data)
-        self.plugin.save_player_data(group_id, str(old_master), master_data)
+        self.plugin.start_cooldown(txn.group_id, user_id, "buyback")
         
-        yield event.plain_result(f"✅ 赎身成功！\n💰 花费: {buyback_price} 金币\n💎 身价变化: {old_value} → {data['value']} 金币\n🎉 你现在自由了！")
+        return f"✅ 赎身成功！\n💰 花费: {buyback_price} 金币\n💎 身价变化: {old_value} → {data['value']} 金币\n🎉 你现在自由了！"
     
     @filter.command("放生奴隶")
+    @admission_control("放生奴隶")
     async def release_slave(self, event: AstrMessageEvent, target_user: str):
         """放生奴隶"""
         if not event.get_group_id():
@@ -89,9 +111,6 @@ class SlaveManagementModule:
         master_id = str(event.get_sender_id())
         master_name = event.get_sender_name()
         
-        # 确保主人存在
-        master_data = self.plugin.ensure_player_exists(group_id, master_id, master_name)
-        
         # 解析目标用户ID
         if target_user.startswith("@"):
             target_id = target_user[1:]
@@ -102,16 +121,30 @@ class SlaveManagementModule:
             yield event.plain_result("无法放生自己或无效的目标")
             return
         
-        # 检查是否是主人的奴隶
-        if target_id not in master_data.get("slaves", []):
+        # 先从主奴关系索引检查，不是自己的奴隶时不需要加锁读取数据
+        graph = await self.plugin.get_ownership_async(group_id)
+        if not graph.owns(master_id, target_id):
             yield event.plain_result("该用户不是你的奴隶")
             return
         
+        # 主人和奴隶在同一个事务中修改
+        async with self.plugin.transaction(group_id, master_id, target_id) as txn:
+            reply = await self.release_in_transaction(txn, master_id, master_name, target_id)
+        yield event.plain_result(reply)
+    
+    async def release_in_transaction(self, txn: 'PlayerTransaction', master_id: str, master_name: str, target_id: str) -> str:
+        """在事务中执行放生奴隶"""
+        # 确保主人存在
+        master_data = await txn.ensure(master_id, master_name)
+        
+        # 检查是否是主人的奴隶
+        if target_id not in master_data.get("slaves", []):
+            return "该用户不是你的奴隶"
+        
         # 获取奴隶数据
-        slave_data = self.plugin.get_player_data(group_id, target_id)
+        slave_data = await txn.get(target_id)
         if not slave_data:
-            yield event.plain_result("放生失败：奴隶数据不存在")
-            return
+            return "放生失败：奴隶数据不存在"
         
         # 从主人的奴隶列表中移除
         master_data["slaves"].remove(target_id)
@@ -123,13 +156,10 @@ class SlaveManagementModule:
         value_increase = int(slave_data["value"] * 0.1)  # 增加10%价值
         slave_data["value"] += value_increase
         
-        # 保存数据
-        self.plugin.save_player_data(group_id, master_id, master_data)
-        self.plugin.save_player_data(group_id, target_id, slave_data)
-        
-        yield event.plain_result(f"🕊️ 放生成功！\n👤 放生对象: {slave_data['nickname']}\n💎 身价提升: {value_increase} 金币\n🎉 {slave_data['nickname']} 现在自由了！")
+        return f"🕊️ 放生成功！\n👤 放生对象: {slave_data['nickname']}\n💎 身价提升: {value_increase} 金币\n🎉 {slave_data['nickname']} 现在自由了！"
     
     @filter.command("转让奴隶")
+    @admission_control("转让奴隶")
     async def transfer_slave(self, event: AstrMessageEvent, target_user: str, new_owner: str):
         """转让奴隶"""
         if not event.get_group_id():
@@ -140,9 +170,6 @@ class SlaveManagementModule:
         master_id = str(event.get_sender_id())
         master_name = event.get_sender_name()
         
-        # 确保主人存在
-        master_data = self.plugin.ensure_player_exists(group_id, master_id, master_name)
-        
         # 解析目标用户ID（要转让的奴隶）
         if target_user.startswith("@"):
             slave_id = target_user[1:]
@@ -168,19 +195,35 @@ class SlaveManagementModule:
             yield event.plain_result("无法将奴隶转让给自己")
             return
         
-        # 检查是否是主人的奴隶
-        if slave_id not in master_data.get("slaves", []):
+        # 先从主奴关系索引检查，不是自己的奴隶时不需要加锁读取数据
+        graph = await self.plugin.get_ownership_async(group_id)
+        if not graph.owns(master_id, slave_id):
             yield event.plain_result("该用户不是你的奴隶")
             return
         
+        # 原主人、奴隶和新主人在同一个事务中修改
+        async with self.plugin.transaction(group_id, master_id, slave_id, new_master_id) as txn:
+            reply = await self.transfer_in_transaction(txn, master_id, master_name, slave_id, new_master_id)
+        yield event.plain_result(reply)
+    
+    async def transfer_in_transaction(
+        self, txn: 'PlayerTransaction', master_id: str, master_name: str, slave_id: str, new_master_id: str
+    ) -> str:
+        """在事务中执行转让奴隶"""
+        # 确保主人存在
+        master_data = await txn.ensure(master_id, master_name)
+        
+        # 检查是否是主人的奴隶
+        if slave_id not in master_data.get("slaves", []):
+            return "该用户不是你的奴隶"
+        
         # 获取奴隶数据
-        slave_data = self.plugin.get_player_data(group_id, slave_id)
+        slave_data = await txn.get(slave_id)
         if not slave_data:
-            yield event.plain_result("转让失败：奴隶数据不存在")
-            return
+            return "转让失败：奴隶数据不存在"
         
         # 确保新主人存在
-        new_master_data = self.plugin.ensure_player_exists(group_id, new_master_id, f"用户{new_master_id}")
+        new_master_data = await txn.ensure(new_master_id, f"用户{new_master_id}")
         
         # 执行转让
         # 从原主人的奴隶列表中移除
@@ -194,14 +237,10 @@ class SlaveManagementModule:
         # 更新奴隶的主人
         slave_data["master"] = new_master_id
         
-        # 保存数据
-        self.plugin.save_player_data(group_id, master_id, master_data)
-        self.plugin.save_player_data(group_id, new_master_id, new_master_data)
-        self.plugin.save_player_data(group_id, slave_id, slave_data)
-        
-        yield event.plain_result(f"🔄 转让成功！\n👤 奴隶: {slave_data['nickname']}\n🏠 新主人: {new_master_data['nickname']}\n🎉 转让完成！")
+        return f"🔄 转让成功！\n👤 奴隶: {slave_data['nickname']}\n🏠 新主人: {new_master_data['nickname']}\n🎉 转让完成！"
     
     @filter.command("奴隶详情")
+    @admission_control("奴隶详情")
     async def slave_details(self, event: AstrMessageEvent, target_user: str):
         """查看奴隶详情"""
         if not event.get_group_id():
@@ -220,8 +259,16 @@ class SlaveManagementModule:
             yield event.plain_result("请指定要查看的用户")
             return
         
+        # 银行余额随时间计息，不随玩家数据版本变化，每次从账本读取后插入缓存的两段回复之间
+        await self.plugin.run_io(self.plugin.bank_ledger.load_group, group_id)
+        cache_key = self.plugin.reply_cache.key(group_id, "奴隶详情", target_id)
+        cached = self.plugin.reply_cache.get(cache_key)
+        if cached is not None:
+            yield event.plain_result(cached[0] + self.bank_lines(group_id, target_id) + cached[1])
+            return
+        
         # 获取用户数据
-        target_data = self.plugin.get_player_data(group_id, target_id)
+        target_data = await self.plugin.get_player_data_async(group_id, target_id)
         if not target_data:
             yield event.plain_result("用户数据不存在")
             return
@@ -238,23 +285,70 @@ class SlaveManagementModule:
         reply += f"⭐ 积分: {arena_data.get('points', 0)}\n"
         reply += f"📊 战绩: {arena_data.get('wins', 0)}胜 {arena_data.get('losses', 0)}败\n"
         
-        # 银行信息
-        bank_data = target_data.get("bank", {})
-        reply += f"🏦 银行存款: {bank_data.get('balance', 0)}\n"
-        reply += f"💳 信用等级: {bank_data.get('level', 1)}\n"
+        head, reply = reply, ""
+        
+        # 奴隶与主人的数据一次批量获取
+        slave_ids = [str(slave_id) for slave_id in target_data.get("slaves", [])]
+        related_ids = slave_ids + ([str(target_data["master"])] if target_data.get("master") else [])
+        related = await self.plugin.get_players_async(group_id, related_ids)
         
         # 主人信息
         if target_data.get("master"):
-            master_data = self.plugin.get_player_data(group_id, str(target_data["master"]))
+            master_data = related.get(str(target_data["master"]))
             if master_data:
                 reply += f"🔗 主人: {master_data.get('nickname', '未知')}\n"
         
         # 奴隶列表
-        if target_data.get("slaves"):
+        if slave_ids:
             reply += "\n👥 拥有的奴隶:\n"
-            for slave_id in target_data["slaves"]:
-                slave_data = self.plugin.get_player_data(group_id, str(slave_id))
+            for slave_id in slave_ids:
+                slave_data = related.get(slave_id)
                 if slave_data:
                     reply += f"  • {slave_data.get('nickname', '未知')} (身价: {slave_data.get('value', 0)})\n"
         
-        yield event.plain_result(reply)
\ No newline at end of file
+        self.plugin.reply_cache.put(cache_key, (head, reply))
+        yield event.plain_result(head + self.bank_lines(group_id, target_id) + reply)
+    
+    @filter.command("奴隶关系")
+    @admission_control("奴隶关系")
+    async def ownership_info(self, event: AstrMessageEvent, target_user: str = ""):
+        """查看主人链与本群拥有奴隶最多的玩家
+
+        关系全部来自主奴关系索引，只为显示昵称批量读取涉及的玩家
+        """
+        if not event.get_group_id():
+            yield event.plain_result("该游戏只能在群内使用")
+            return
+        
+        group_id = str(event.get_group_id())
+        target_id = target_user[1:] if target_user.startswith("@") else target_user
+        target_id = target_id or str(event.get_sender_id())
+        
+        graph = await self.plugin.get_ownership_async(group_id)
+        chain = graph.chain(target_id)
+        holdings = graph.largest_holdings(self.HOLDINGS_SIZE)
+        
+        related_ids = list(dict.fromkeys([target_id, *chain, *(master_id for master_id, _ in holdings)]))
+        related = await self.plugin.get_players_async(group_id, related_ids)
+        
+        def name(user_id: str) -> str:
+            return related.get(user_id, {}).get("nickname") or f"用户{user_id}"
+        
+        reply = f"🔗 {name(target_id)} 的主奴关系\n\n"
+        if chain:
+            reply += f"⛓️ 主人链（{len(chain)}层）: {' → '.join(name(user_id) for user_id in chain)}\n"
+        else:
+            reply += "🕊️ 自由身\n"
+        reply += f"👥 拥有奴隶: {graph.slave_count(target_id)} 个\n"
+        
+        if holdings:
+            reply += "\n👑 本群奴隶最多的主人:\n"
+            for i, (master_id, count) in enumerate(holdings, 1):
+                reply += f"{i}. {name(master_id)} - {count} 个奴隶\n"
+        
+        yield event.plain_result(reply.rstrip())
+    
+    def bank_lines(self, group_id: str, user_id: str) -> str:
+        """奴隶详情中的银行信息"""
+        account = self.plugin.bank_ledger.view(group_id, user_id)
+        return f"🏦 银行存款: {account.balance}\n💳 信用等级: {account.level}\n"
\ No newline at end of file
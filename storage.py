@@ -0,0 +1,1105 @@
+"""
+玩家数据存储模块
+提供JSON文件与SQLite两种存储引擎，以及玩家数据的写回式LRU缓存
+"""
+
+import copy
+import heapq
+import os
+import random
+import sqlite3
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from astrbot.api import logger
+
+from .codec import JsonCodec, convert_file, decode_bytes, get_codec, read_file, write_file
+from .config import StorageConfig
+from .journal import MutationJournal, diff_records
+
+PlayerKey = Tuple[str, str]
+
+# 排行榜支持的指标
+METRICS = ("currency", "value", "slaves", "points")
+
+
+def player_metrics(data: Dict[str, Any]) -> Dict[str, int]:
+    """提取玩家数据中用于排行的指标
+
+    Args:
+        data: 玩家数据
+
+    Returns:
+        Dict[str, int]: 指标名到数值的映射
+    """
+    return {
+        "currency": int(data.get("currency", 0)),
+        "value": int(data.get("value", 0)),
+        "slaves": len(data.get("slaves", [])),
+        "points": int(data.get("arena", {}).get("points", 0)),
+    }
+
+
+def is_untouched_default(data: Dict[str, Any], base_values: Tuple[int, ...]) -> bool:
+    """玩家数据是否仍是新建或每周重置后的默认状态，从未发生过实际变化
+
+    昵称、创建时间和冷却字段不算作实际变化
+
+    Args:
+        data: 玩家数据
+        base_values: 默认身价（新玩家与每周重置后的身价）
+
+    Returns:
+        bool: 是否为未修改的默认数据
+    """
+    arena = data.get("arena") or {}
+    bank = data.get("bank") or {}
+    return (
+        not data.get("currency")
+        and data.get("value") in base_values
+        and not data.get("slaves")
+        and not data.get("master")
+        and not arena.get("points")
+        and not arena.get("wins")
+        and not arena.get("losses")
+        and arena.get("tier", "青铜") == "青铜"
+        and not data.get("lastWorkTime")
+        and not bank.get("balance")
+        and bank.get("level", 1) <= 1
+    )
+
+
+class JsonFileStorage:
+    """JSON文件存储引擎
+
+    每个玩家一个文件：data/player/<group_id>/<user_id>.json，
+    文件内容的编码由codec决定，读取时按文件头自动识别
+    """
+
+    # 各文件相互独立，批量冷读取可以拆分到多个IO线程并行执行
+    parallel_reads = True
+
+    def __init__(self, data_path: str, codec=None):
+        """初始化存储引擎
+
+        Args:
+            data_path: 插件数据目录
+            codec: 写入时使用的编码器，默认为紧凑JSON
+        """
+        self.player_dir = os.path.join(data_path, "player")
+        self.codec = codec or JsonCodec()
+        # 已确认存在的群组目录，避免每次访问都调用makedirs
+        self._known_dirs: set = set()
+        os.makedirs(self.player_dir, exist_ok=True)
+
+    def player_path(self, group_id: str, user_id: str) -> str:
+        """获取玩家数据文件路径
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+
+        Returns:
+            str: 文件路径
+        """
+        group_path = os.path.join(self.player_dir, group_id)
+        if group_id not in self._known_dirs:
+            os.makedirs(group_path, exist_ok=True)
+            self._known_dirs.add(group_id)
+        return os.path.join(group_path, f"{user_id}.json")
+
+    def load(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """读取玩家数据"""
+        file_path = self.player_path(group_id, user_id)
+        if os.path.exists(file_path):
+            try:
+                return read_file(file_path)
+            except Exception as e:
+                logger.error(f"读取玩家数据失败: {e}")
+        return None
+
+    def load_many(self, group_id: str, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量读取同一群组的玩家数据，不存在的玩家不出现在结果中"""
+        records = {}
+        for user_id in user_ids:
+            data = self.load(group_id, user_id)
+            if data:
+                records[user_id] = data
+        return records
+
+    def save(self, group_id: str, user_id: str, data: Dict[str, Any]) -> None:
+        """写入玩家数据"""
+        write_file(self.player_path(group_id, user_id), data, self.codec)
+
+    def save_many(self, group_id: str, records: Dict[str, Dict[str, Any]]) -> None:
+        """批量写入同一群组的玩家数据
+
+        每个文件都以临时文件加重命名的方式替换，但多个文件之间不是原子的，
+        中途退出时由变更日志恢复未写完的部分
+        """
+        for user_id, data in records.items():
+            self.save(group_id, user_id, data)
+
+    def delete_many(self, group_id: str, user_ids: List[str]) -> int:
+        """删除同一群组的多个玩家文件
+
+        Returns:
+            int: 实际删除的文件数量
+        """
+        deleted = 0
+        for user_id in user_ids:
+            file_path = self.player_path(group_id, user_id)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+                deleted += 1
+        return deleted
+
+    def list_players(self, group_id: str) -> List[str]:
+        """获取群组内所有玩家ID"""
+        group_path = os.path.join(self.player_dir, group_id)
+        if not os.path.isdir(group_path):
+            return []
+        return [
+            filename[:-5]
+            for filename in os.listdir(group_path)
+            if filename.endswith(".json")
+        ]
+
+    def list_groups(self) -> List[str]:
+        """获取所有群组ID"""
+        if not os.path.exists(self.player_dir):
+            return []
+        return [
+            dirname
+            for dirname in os.listdir(self.player_dir)
+            if os.path.isdir(os.path.join(self.player_dir, dirname))
+        ]
+
+    def load_group(
+        self, group_id: str, user_ids: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """读取群组内所有玩家数据
+
+        Args:
+            group_id: 群组ID
+            user_ids: 已知的玩家ID列表（来自名单索引），提供时不再列目录
+        """
+        if user_ids is None:
+            user_ids = self.list_players(group_id)
+        return self.load_many(group_id, user_ids)
+
+    def top_players(
+        self, group_id: str, metric: str, limit: int
+    ) -> List[Dict[str, Any]]:
+        """按指标获取群组内排名靠前的玩家"""
+        players = self.load_group(group_id).values()
+        return heapq.nlargest(
+            limit, players, key=lambda data: player_metrics(data)[metric]
+        )
+
+    def load_masters(self, group_id: str) -> Dict[str, str]:
+        """读取群组内所有奴隶的主人
+
+        Returns:
+            Dict[str, str]: 奴隶ID -> 主人ID，没有主人的玩家不包含在内
+        """
+        return {
+            user_id: str(data["master"])
+            for user_id, data in self.load_group(group_id).items()
+            if data.get("master")
+        }
+
+    def count(self) -> int:
+        """获取玩家总数"""
+        return sum(len(self.list_players(g)) for g in self.list_groups())
+
+    def convert(self, codec) -> int:
+        """将所有玩家文件原地转换为指定编码
+
+        Args:
+            codec: 目标编码器
+
+        Returns:
+            int: 发生转换的文件数量
+        """
+        self.codec = codec
+        converted = 0
+        for group_id in self.list_groups():
+            for user_id in self.list_players(group_id):
+                if convert_file(self.player_path(group_id, user_id), codec):
+                    converted += 1
+        return converted
+
+    def close(self) -> None:
+        """关闭存储引擎"""
+
+
+class SqliteStorage:
+    """SQLite存储引擎
+
+    所有玩家存放在同一张players表中，以(group_id, user_id)为主键，
+    排行所需的指标单独成列并建立索引，排行榜查询直接走索引。
+    """
+
+    # 所有查询共用一个连接，并行读取没有收益
+    parallel_reads = False
+
+    # 单条IN查询携带的最大参数数量，低于SQLite默认上限999
+    _IN_BATCH = 500
+
+    _METRIC_COLUMNS = {
+        "currency": "currency",
+        "value": "value",
+        "slaves": "slave_count",
+        "points": "arena_points",
+    }
+
+    def __init__(self, db_path: str, codec=None):
+        """初始化存储引擎
+
+        Args:
+            db_path: 数据库文件路径
+            codec: data列使用的编码器，默认为紧凑JSON
+        """
+        self.db_path = db_path
+        self.codec = codec or JsonCodec()
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS players (
+                group_id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                currency INTEGER NOT NULL DEFAULT 0,
+                value INTEGER NOT NULL DEFAULT 0,
+                slave_count INTEGER NOT NULL DEFAULT 0,
+                arena_points INTEGER NOT NULL DEFAULT 0,
+                master TEXT,
+                PRIMARY KEY (group_id, user_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_players_currency
+                ON players (group_id, currency DESC);
+            CREATE INDEX IF NOT EXISTS idx_players_value
+                ON players (group_id, value DESC);
+            CREATE INDEX IF NOT EXISTS idx_players_slave_count
+                ON players (group_id, slave_count DESC);
+            CREATE INDEX IF NOT EXISTS idx_players_arena_points
+                ON players (group_id, arena_points DESC);
+            CREATE INDEX IF NOT EXISTS idx_players_master
+                ON players (group_id, master);
+            """
+        )
+        self._conn.commit()
+
+    def _row(
+        self, group_id: str, user_id: str, data: Dict[str, Any]
+    ) -> Tuple[Any, ...]:
+        """构造一行待写入的数据"""
+        metrics = player_metrics(data)
+        master = data.get("master")
+        return (
+            group_id,
+            user_id,
+            self.codec.encode(data),
+            metrics["currency"],
+            metrics["value"],
+            metrics["slaves"],
+            metrics["points"],
+            str(master) if master else None,
+        )
+
+    def load(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """读取玩家数据"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM players WHERE group_id = ? AND user_id = ?",
+                (group_id, user_id),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return decode_bytes(row[0])
+        except Exception as e:
+            logger.error(f"读取玩家数据失败: {e}")
+            return None
+
+    def load_many(self, group_id: str, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量读取同一群组的玩家数据，按参数上限分批用IN查询"""
+        records = {}
+        user_ids = list(dict.fromkeys(user_ids))
+        for start in range(0, len(user_ids), self._IN_BATCH):
+            batch = user_ids[start:start + self._IN_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            with self._lock:
+                rows = self._conn.execute(
+                    f"SELECT user_id, data FROM players WHERE group_id = ? "
+                    f"AND user_id IN ({placeholders})",
+                    (group_id, *batch),
+                ).fetchall()
+            for user_id, data in rows:
+                try:
+                    records[user_id] = decode_bytes(data)
+                except Exception as e:
+                    logger.error(f"读取玩家数据失败: {e}")
+        return records
+
+    def save(self, group_id: str, user_id: str, data: Dict[str, Any]) -> None:
+        """写入玩家数据"""
+        self.save_many(group_id, {user_id: data})
+
+    def save_many(self, group_id: str, records: Dict[str, Dict[str, Any]]) -> None:
+        """在一个事务中批量写入同一群组的玩家数据"""
+        rows = [self._row(group_id, uid, data) for uid, data in records.items()]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO players "
+                "(group_id, user_id, data, currency, value, slave_count, arena_points, master) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def delete_many(self, group_id: str, user_ids: List[str]) -> int:
+        """在一个事务中删除同一群组的多个玩家，按参数上限分批
+
+        Returns:
+            int: 实际删除的行数
+        """
+        user_ids = list(dict.fromkeys(user_ids))
+        deleted = 0
+        with self._lock, self._conn:
+            for start in range(0, len(user_ids), self._IN_BATCH):
+                batch = user_ids[start:start + self._IN_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                deleted += self._conn.execute(
+                    f"DELETE FROM players WHERE group_id = ? AND user_id IN ({placeholders})",
+                    (group_id, *batch),
+                ).rowcount
+        return deleted
+
+    def list_players(self, group_id: str) -> List[str]:
+        """获取群组内所有玩家ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id FROM players WHERE group_id = ?", (group_id,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def list_groups(self) -> List[str]:
+        """获取所有群组ID"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT DISTINCT group_id FROM players"
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def load_group(
+        self, group_id: str, user_ids: Optional[List[str]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """读取群组内所有玩家数据
+
+        Args:
+            group_id: 群组ID
+            user_ids: 已知的玩家ID列表，SQLite引擎按群组整体查询，无需使用
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, data FROM players WHERE group_id = ?", (group_id,)
+            ).fetchall()
+        return {user_id: decode_bytes(data) for user_id, data in rows}
+
+    def top_players(
+        self, group_id: str, metric: str, limit: int
+    ) -> List[Dict[str, Any]]:
+        """按指标获取群组内排名靠前的玩家"""
+        column = self._METRIC_COLUMNS[metric]
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM players WHERE group_id = ? "
+                f"ORDER BY {column} DESC LIMIT ?",
+                (group_id, limit),
+            ).fetchall()
+        return [decode_bytes(row[0]) for row in rows]
+
+    def load_masters(self, group_id: str) -> Dict[str, str]:
+        """读取群组内所有奴隶的主人，只走master列的索引，不解码玩家数据
+
+        Returns:
+            Dict[str, str]: 奴隶ID -> 主人ID，没有主人的玩家不包含在内
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user_id, master FROM players "
+                "WHERE group_id = ? AND master IS NOT NULL",
+                (group_id,),
+            ).fetchall()
+        return dict(rows)
+
+    def count(self) -> int:
+        """获取玩家总数"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM players").fetchone()[0]
+
+    def convert(self, codec) -> int:
+        """将所有玩家数据重新编码为指定格式
+
+        Args:
+            codec: 目标编码器
+
+        Returns:
+            int: 重新编码的玩家数量
+        """
+        self.codec = codec
+        converted = 0
+        for group_id in self.list_groups():
+            records = self.load_group(group_id)
+            if records:
+                self.save_many(group_id, records)
+                converted += len(records)
+        return converted
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
+
+
+class GroupRoster:
+    """单个群组的玩家名单
+
+    列表加位置索引的组合，增删和随机抽取都是O(1)
+    """
+
+    __slots__ = ("_ids", "_positions")
+
+    def __init__(self, user_ids: List[str]):
+        self._ids: List[str] = []
+        self._positions: Dict[str, int] = {}
+        for user_id in user_ids:
+            self.add(user_id)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._positions
+
+    def ids(self) -> List[str]:
+        """获取玩家ID列表的副本"""
+        return list(self._ids)
+
+    def add(self, user_id: str) -> None:
+        """加入玩家"""
+        if user_id not in self._positions:
+            self._positions[user_id] = len(self._ids)
+            self._ids.append(user_id)
+
+    def remove(self, user_id: str) -> None:
+        """移除玩家（与末尾元素交换后弹出）"""
+        position = self._positions.pop(user_id, None)
+        if position is None:
+            return
+        last = self._ids.pop()
+        if position < len(self._ids):
+            self._ids[position] = last
+            self._positions[last] = position
+
+    def random_choice(self, exclude: Optional[str] = None) -> Optional[str]:
+        """随机抽取一名玩家
+
+        Args:
+            exclude: 需要排除的玩家ID
+
+        Returns:
+            Optional[str]: 玩家ID，没有可选玩家时返回None
+        """
+        candidates = len(self._ids) - (1 if exclude in self._positions else 0)
+        if candidates <= 0:
+            return None
+        while True:
+            user_id = self._ids[random.randrange(len(self._ids))]
+            if user_id != exclude:
+                return user_id
+
+
+class RosterIndex:
+    """按群组维护的玩家名单索引
+
+    每个群组的名单在第一次使用时从存储引擎构建一次，之后随新玩家创建增量更新，
+    查询名单和随机抽取目标都不再访问磁盘
+    """
+
+    def __init__(self):
+        self._rosters: Dict[str, GroupRoster] = {}
+        # 名单尚未构建时新建的玩家，构建完成时合并
+        self._pending: Dict[str, set] = {}
+        self._lock = threading.Lock()
+
+    def get(self, group_id: str) -> Optional[GroupRoster]:
+        """获取已构建的群组名单，未构建时返回None"""
+        return self._rosters.get(group_id)
+
+    def load(self, group_id: str, user_ids: List[str]) -> GroupRoster:
+        """用存储引擎中的玩家ID构建群组名单
+
+        Args:
+            group_id: 群组ID
+            user_ids: 存储引擎中的玩家ID列表
+
+        Returns:
+            GroupRoster: 群组名单（若已被其他调用构建则返回已有名单）
+        """
+        with self._lock:
+            roster = self._rosters.get(group_id)
+            if roster is None:
+                roster = GroupRoster(user_ids)
+                for user_id in self._pending.pop(group_id, ()):
+                    roster.add(user_id)
+                self._rosters[group_id] = roster
+            return roster
+
+    def add(self, group_id: str, user_id: str) -> None:
+        """记录新建的玩家"""
+        with self._lock:
+            roster = self._rosters.get(group_id)
+            if roster is not None:
+                roster.add(user_id)
+            else:
+                self._pending.setdefault(group_id, set()).add(user_id)
+
+    def remove(self, group_id: str, user_id: str) -> None:
+        """移除玩家"""
+        with self._lock:
+            roster = self._rosters.get(group_id)
+            if roster is not None:
+                roster.remove(user_id)
+            pending = self._pending.get(group_id)
+            if pending:
+                pending.discard(user_id)
+
+
+class _VirtualRecord(dict):
+    """交给调用方的默认玩家数据
+
+    可以被弱引用：被LRU淘汰后，只要还有指令持有这份数据，就仍能按玩家找回同一个字典
+    """
+
+    __slots__ = ("__weakref__", "snapshot")
+
+
+class VirtualPlayers:
+    """尚未落盘的默认玩家数据
+
+    查询不存在的玩家时返回内存中的默认数据，同一玩家的多次查询返回同一个字典；
+    第一次保存且内容与默认数据不同时才转为真实玩家写入存储引擎，
+    只被查看、校验失败的目标玩家不会产生任何文件。
+    按LRU保留有限条数；被淘汰但仍被指令持有的数据保存在弱引用表中，
+    持有者保存时照常判断是否修改过，也不会为同一玩家生成第二份默认数据
+    """
+
+    def __init__(self, capacity: int = 2048):
+        """初始化
+
+        Args:
+            capacity: 最多保留的默认玩家数量
+        """
+        self.capacity = max(1, capacity)
+        self._entries: "OrderedDict[PlayerKey, _VirtualRecord]" = OrderedDict()
+        # 已被LRU淘汰、仍被调用方持有的默认数据，最后一个持有者释放后自动移除
+        self._retired: "weakref.WeakValueDictionary[PlayerKey, _VirtualRecord]" = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: PlayerKey) -> Optional[_VirtualRecord]:
+        """查找登记的默认数据，淘汰后仍被持有的重新放回LRU（调用方需持有锁）"""
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+            return data
+        data = self._retired.pop(key, None)
+        if data is not None:
+            self._entries[key] = data
+            self._evict()
+        return data
+
+    def _evict(self) -> None:
+        """超出容量时把最久未用的数据移到弱引用表（调用方需持有锁）"""
+        while len(self._entries) > self.capacity:
+            key, data = self._entries.popitem(last=False)
+            self._retired[key] = data
+
+    def get(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """获取默认玩家数据，不存在时返回None"""
+        with self._lock:
+            return self._lookup((group_id, user_id))
+
+    def add(self, group_id: str, user_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+        """登记新生成的默认玩家数据
+
+        Returns:
+            Dict[str, Any]: 登记的数据（已有登记时返回已有的数据）
+        """
+        key = (group_id, user_id)
+        with self._lock:
+            current = self._lookup(key)
+            if current is not None:
+                return current
+            record = _VirtualRecord(data)
+            record.snapshot = copy.deepcopy(data)
+            self._entries[key] = record
+            self._evict()
+            return record
+
+    def claim(
+        self, group_id: str, records: Dict[str, Dict[str, Any]]
+    ) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """从待保存的记录中剔除未修改的默认玩家，修改过的转为真实玩家
+
+        Args:
+            group_id: 群组ID
+            records: 用户ID到玩家数据的映射
+
+        Returns:
+            Tuple[Dict[str, Dict[str, Any]], List[str]]: 需要保存的记录，以及其中首次落盘的用户ID
+        """
+        with self._lock:
+            if not self._entries and not self._retired:
+                return records, []
+            kept = {}
+            created = []
+            for user_id, data in records.items():
+                key = (group_id, user_id)
+                entry = self._entries.get(key)
+                if entry is None:
+                    entry = self._retired.get(key)
+                if entry is None:
+                    kept[user_id] = data
+                elif entry is not data or data != entry.snapshot:
+                    # 修改过的默认数据，或直接保存了另一份数据（如从归档恢复）
+                    self._entries.pop(key, None)
+                    self._retired.pop(key, None)
+                    entry.snapshot = None
+                    kept[user_id] = data
+                    created.append(user_id)
+            return kept, created
+
+    def discard_group(self, group_id: str) -> None:
+        """丢弃某个群组的全部默认玩家（每周重置时调用）"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == group_id]:
+                del self._entries[key]
+            for key in [key for key in list(self._retired.keys()) if key[0] == group_id]:
+                self._retired.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries) + len(self._retired)
+
+
+def migrate_json_to_sqlite(source: JsonFileStorage, target: SqliteStorage) -> int:
+    """将JSON文件目录中的玩家数据一次性迁移到SQLite
+
+    Args:
+        source: JSON文件存储引擎
+        target: SQLite存储引擎
+
+    Returns:
+        int: 迁移的玩家数量
+    """
+    migrated = 0
+    for group_id in source.list_groups():
+        records = source.load_group(group_id)
+        if records:
+            target.save_many(group_id, records)
+            migrated += len(records)
+    return migrated
+
+
+def create_storage(data_path: str, storage_config: StorageConfig):
+    """根据配置创建存储引擎
+
+    选择SQLite引擎且数据库为空时，会自动迁移已有的JSON文件数据
+
+    Args:
+        data_path: 插件数据目录
+        storage_config: storage配置项
+
+    Returns:
+        JsonFileStorage | SqliteStorage: 存储引擎
+    """
+    codec, fallback_reason = get_codec(storage_config.codec)
+    if fallback_reason:
+        logger.warning(fallback_reason)
+
+    engine = storage_config.engine
+    if engine == "sqlite":
+        db_path = os.path.join(data_path, storage_config.sqlite_path)
+        storage = SqliteStorage(db_path, codec)
+        if storage.count() == 0:
+            migrated = migrate_json_to_sqlite(JsonFileStorage(data_path, codec), storage)
+            if migrated:
+                logger.info(f"已将 {migrated} 条玩家数据从JSON文件迁移到SQLite")
+        return storage
+    if engine != "json":
+        logger.warning(f"未知的存储引擎 {engine}，使用JSON文件存储")
+    return JsonFileStorage(data_path, codec)
+
+
+class PlayerCache:
+    """玩家数据写回缓存
+
+    读取命中时直接返回内存中的字典；写入只更新内存并打上脏标记，
+    由定时任务或脏数据数量达到阈值时统一写回磁盘，
+    同一玩家在两次写回之间的多次保存只会落盘一次。
+
+    写回分为两步：collect_dirty在事件循环线程中对脏数据做快照，
+    write_back可以放到IO线程中执行，写盘期间不会读到正在被修改的字典。
+
+    配置了变更日志时，每次写入都会与上一次的快照比较，
+    只把字段级增量记入日志，两次写回之间的崩溃可以通过回放日志恢复。
+
+    通过add_listener注册的监听器会在每次写入、整组丢弃时收到通知，
+    用于增量维护排行榜等派生索引。监听器需实现player_updated
+    与group_invalidated两个方法。
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str, str], Optional[Dict[str, Any]]],
+        writer: Callable[[str, str, Dict[str, Any]], None],
+        capacity: int = 2048,
+        flush_threshold: int = 64,
+        journal: Optional["MutationJournal"] = None,
+        batch_loader: Optional[Callable[[str, List[str]], Dict[str, Dict[str, Any]]]] = None,
+        batch_writer: Optional[Callable[[str, Dict[str, Dict[str, Any]]], None]] = None,
+    ):
+        """初始化缓存
+
+        Args:
+            loader: 缓存未命中时从磁盘读取玩家数据的函数
+            writer: 将玩家数据写回磁盘的函数
+            capacity: 最多缓存的玩家数量
+            flush_threshold: 脏数据达到该数量时需要立即写回
+            journal: 变更日志，为None时不记录增量
+            batch_loader: 批量读取同一群组玩家数据的函数，为None时逐个调用loader
+            batch_writer: 批量写入同一群组玩家数据的函数，为None时逐个调用writer
+        """
+        self._loader = loader
+        self._batch_loader = batch_loader
+        self._writer = writer
+        self._batch_writer = batch_writer
+        self.capacity = max(1, capacity)
+        self.flush_threshold = max(1, flush_threshold)
+        self._entries: "OrderedDict[PlayerKey, Dict[str, Any]]" = OrderedDict()
+        self._dirty: set = set()
+        # 已被淘汰但尚未写回的脏数据
+        self._evicted: Dict[PlayerKey, Dict[str, Any]] = {}
+        # 已由collect_dirty取出、尚未写回完成的快照，写回期间从磁盘读到的是旧数据
+        self._in_flight: Dict[PlayerKey, Dict[str, Any]] = {}
+        # 上一次记入变更日志时的数据快照，用于计算增量
+        self._shadow: Dict[PlayerKey, Dict[str, Any]] = {}
+        self.journal = journal
+        self._listeners: List[Any] = []
+        self._lock = threading.RLock()
+
+    def add_listener(self, listener: Any) -> None:
+        """注册写入监听器
+
+        Args:
+            listener: 实现player_updated(group_id, records)与group_invalidated(group_id)的对象
+        """
+        self._listeners.append(listener)
+
+    def peek(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """只从内存读取玩家数据，不访问磁盘
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 玩家数据，未缓存时返回None
+        """
+        key = (group_id, user_id)
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                return data
+            data = self._evicted.pop(key, None)
+            if data is not None:
+                self._entries[key] = data
+                self._dirty.add(key)
+                self._evict()
+                return data
+            snapshot = self._in_flight.get(key)
+            if snapshot is not None:
+                return self._admit(key, snapshot)
+            return None
+
+    def get(self, group_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """读取玩家数据，未命中时从磁盘加载
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+
+        Returns:
+            Optional[Dict[str, Any]]: 玩家数据或None
+        """
+        data = self.peek(group_id, user_id)
+        if data is not None:
+            return data
+
+        data = self._loader(group_id, user_id)
+        if data is not None:
+            with self._lock:
+                data = self._admit((group_id, user_id), data)
+        return data
+
+    def get_many(self, group_id: str, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量读取同一群组的玩家数据，未命中的部分一次性从磁盘加载
+
+        Args:
+            group_id: 群组ID
+            user_ids: 用户ID列表
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 用户ID到玩家数据的映射，不存在的玩家不出现在结果中
+        """
+        records = {}
+        missing = []
+        for user_id in user_ids:
+            data = self.peek(group_id, user_id)
+            if data is not None:
+                records[user_id] = data
+            else:
+                missing.append(user_id)
+        if not missing:
+            return records
+
+        if self._batch_loader is not None:
+            loaded = self._batch_loader(group_id, missing)
+        else:
+            loaded = {}
+            for user_id in missing:
+                data = self._loader(group_id, user_id)
+                if data is not None:
+                    loaded[user_id] = data
+        with self._lock:
+            for user_id, data in loaded.items():
+                records[user_id] = self._admit((group_id, user_id), data)
+        return records
+
+    def _admit(self, key: PlayerKey, data: Dict[str, Any]) -> Dict[str, Any]:
+        """将从磁盘加载的数据放入缓存（调用方需持有锁）
+
+        加载期间可能已有新的写入，此时以内存中的版本为准；
+        该玩家的快照正在写回时，磁盘上还是旧数据，以快照为准
+        """
+        current = self._entries.get(key)
+        if current is not None:
+            return current
+        snapshot = self._in_flight.get(key)
+        if snapshot is not None:
+            data = copy.deepcopy(snapshot)
+        self._entries[key] = data
+        if self.journal is not None:
+            self._shadow[key] = copy.deepcopy(data)
+        self._evict()
+        return data
+
+    def put(self, group_id: str, user_id: str, data: Dict[str, Any]) -> bool:
+        """写入玩家数据并标记为脏
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            data: 玩家数据
+
+        Returns:
+            bool: 脏数据是否已达到写回阈值
+        """
+        return self.put_many(group_id, {user_id: data})
+
+    def put_many(self, group_id: str, records: Dict[str, Dict[str, Any]]) -> bool:
+        """写入同一群组的多条玩家数据并标记为脏
+
+        这些记录的增量作为一次变更写入变更日志，回放时要么全部生效要么全部丢弃
+
+        Args:
+            group_id: 群组ID
+            records: 用户ID到玩家数据的映射
+
+        Returns:
+            bool: 脏数据是否已达到写回阈值
+        """
+        with self._lock:
+            if self.journal is not None:
+                changes = {}
+                for user_id, data in records.items():
+                    key = (group_id, user_id)
+                    delta = diff_records(self._shadow.get(key), data)
+                    if delta is not None:
+                        changes[user_id] = delta
+                        self._shadow[key] = copy.deepcopy(data)
+                self.journal.record(group_id, changes)
+            for user_id, data in records.items():
+                key = (group_id, user_id)
+                self._evicted.pop(key, None)
+                self._entries[key] = data
+                self._entries.move_to_end(key)
+                self._dirty.add(key)
+            self._evict()
+            for listener in self._listeners:
+                listener.player_updated(group_id, records)
+            return len(self._dirty) + len(self._evicted) >= self.flush_threshold
+
+    def invalidate_group(self, group_id: str) -> None:
+        """丢弃缓存中某个群组的全部数据（不写回）
+
+        Args:
+            group_id: 群组ID
+        """
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == group_id]:
+                del self._entries[key]
+                self._dirty.discard(key)
+            for key in [key for key in self._evicted if key[0] == group_id]:
+                del self._evicted[key]
+            for key in [key for key in self._in_flight if key[0] == group_id]:
+                del self._in_flight[key]
+            for key in [key for key in self._shadow if key[0] == group_id]:
+                del self._shadow[key]
+            for listener in self._listeners:
+                listener.group_invalidated(group_id)
+
+    def discard(self, group_id: str, user_id: str) -> None:
+        """丢弃缓存中的玩家数据（不写回）
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+        """
+        key = (group_id, user_id)
+        with self._lock:
+            self._entries.pop(key, None)
+            self._evicted.pop(key, None)
+            self._in_flight.pop(key, None)
+            self._shadow.pop(key, None)
+            self._dirty.discard(key)
+
+    def dirty_count(self) -> int:
+        """获取当前脏数据数量"""
+        with self._lock:
+            return len(self._dirty) + len(self._evicted)
+
+    def collect_dirty(self, group_id: Optional[str] = None) -> List[Tuple[PlayerKey, Dict[str, Any]]]:
+        """取出脏数据的快照并清除脏标记
+
+        快照在write_back完成之前登记为写回中，期间缓存未命中的读取以快照为准
+
+        Args:
+            group_id: 只取出该群组的脏数据，None表示所有群组
+
+        Returns:
+            List[Tuple[PlayerKey, Dict[str, Any]]]: 待写回的(键, 数据快照)列表
+        """
+        with self._lock:
+            dirty = [key for key in self._dirty if group_id is None or key[0] == group_id]
+            evicted = [key for key in self._evicted if group_id is None or key[0] == group_id]
+            pending = [
+                (key, copy.deepcopy(self._entries[key]))
+                for key in dirty
+                if key in self._entries
+            ]
+            pending.extend((key, copy.deepcopy(self._evicted[key])) for key in evicted)
+            for key in evicted:
+                self._shadow.pop(key, None)
+                del self._evicted[key]
+            self._dirty.difference_update(dirty)
+            for key, data in pending:
+                self._in_flight[key] = data
+        return pending
+
+    def write_back(self, pending: List[Tuple[PlayerKey, Dict[str, Any]]]) -> int:
+        """将collect_dirty取出的快照写回磁盘，失败的数据重新标记为脏
+
+        配置了batch_writer时同一群组的数据合并为一次批量写入，
+        批量写入失败时该群组的所有数据都重新标记为脏
+
+        Args:
+            pending: 待写回的(键, 数据快照)列表
+
+        Returns:
+            int: 写回成功的玩家数量
+        """
+        if self._batch_writer is None:
+            written = 0
+            for key, data in pending:
+                try:
+                    self._writer(key[0], key[1], data)
+                    written += 1
+                except Exception as e:
+                    logger.error(f"写回玩家数据失败: 群{key[0]} 用户{key[1]}: {e}")
+                    self._write_failed([(key, data)])
+                else:
+                    self._written([(key, data)])
+            return written
+
+        groups: Dict[str, List[Tuple[PlayerKey, Dict[str, Any]]]] = {}
+        for key, data in pending:
+            groups.setdefault(key[0], []).append((key, data))
+        written = 0
+        for group_id, items in groups.items():
+            try:
+                self._batch_writer(group_id, {key[1]: data for key, data in items})
+                written += len(items)
+            except Exception as e:
+                logger.error(f"写回玩家数据失败: 群{group_id} {len(items)}名玩家: {e}")
+                self._write_failed(items)
+            else:
+                self._written(items)
+        return written
+
+    def _finish_in_flight(self, key: PlayerKey, data: Dict[str, Any]) -> None:
+        """结束快照的写回登记（调用方需持有锁），之后又取出的新快照不受影响"""
+        if self._in_flight.get(key) is data:
+            del self._in_flight[key]
+
+    def _written(self, items: List[Tuple[PlayerKey, Dict[str, Any]]]) -> None:
+        """快照已写回磁盘"""
+        with self._lock:
+            for key, data in items:
+                self._finish_in_flight(key, data)
+
+    def _write_failed(self, items: List[Tuple[PlayerKey, Dict[str, Any]]]) -> None:
+        """写回失败的数据重新标记为脏，已被淘汰的保留快照等待下次写回"""
+        with self._lock:
+            for key, data in items:
+                self._finish_in_flight(key, data)
+                if key in self._entries:
+                    self._dirty.add(key)
+                elif key not in self._in_flight:
+                    # 之后又取出的新快照正在写回时，以新快照为准
+                    self._evicted.setdefault(key, data)
+
+    def flush(self) -> int:
+        """将所有脏数据写回磁盘
+
+        Returns:
+            int: 写回的玩家数量
+        """
+        return self.write_back(self.collect_dirty())
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的数据，脏数据暂存到下次写回"""
+        while len(self._entries) > self.capacity:
+            key, data = self._entries.popitem(last=False)
+            if key in self._dirty:
+                self._dirty.discard(key)
+                self._evicted[key] = data
+            else:
+                self._shadow.pop(key, None)
@@ -0,0 +1,20 @@
+"""
+测试配置
+插件在AstrBot中以插件目录名作为包名加载，测试中把插件目录登记为同名的包，
+各模块按包内的相对导入正常加载（不执行 __init__.py，因此不需要启动插件）
+"""
+
+import importlib.util
+import os
+import sys
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PACKAGE_NAME = "astrbot_plugin_slave_market"
+
+if PACKAGE_NAME not in sys.modules:
+    spec = importlib.util.spec_from_file_location(
+        PACKAGE_NAME,
+        os.path.join(PLUGIN_DIR, "__init__.py"),
+        submodule_search_locations=[PLUGIN_DIR],
+    )
+    sys.modules[PACKAGE_NAME] = importlib.util.module_from_spec(spec)
@@ -0,0 +1,85 @@
+"""变更日志的增量记录与回放"""
+
+import os
+
+from astrbot_plugin_slave_market.journal import MutationJournal, apply_delta, diff_records
+from astrbot_plugin_slave_market.storage import JsonFileStorage, PlayerCache
+
+GROUP = "g1"
+
+
+def make_cache(storage, journal):
+    return PlayerCache(
+        storage.load,
+        storage.save,
+        capacity=1000,
+        flush_threshold=1000,
+        journal=journal,
+        batch_writer=storage.save_many,
+    )
+
+
+def test_diff_and_apply_round_trip():
+    old = {"currency": 10, "slaves": ["a"], "bank": {"balance": 5, "level": 1}, "tag": "x"}
+    new = {"currency": 20, "slaves": ["a", "b"], "bank": {"balance": 5, "level": 2}}
+    delta = diff_records(old, new)
+    assert apply_delta(dict(old, bank=dict(old["bank"])), delta) == new
+    assert diff_records(new, dict(new)) is None
+
+
+def test_replay_recovers_changes_not_written_back(tmp_path):
+    storage = JsonFileStorage(str(tmp_path))
+    storage.save(GROUP, "buyer", {"currency": 500, "slaves": []})
+    journal = MutationJournal(str(tmp_path / "journal"))
+    cache = make_cache(storage, journal)
+
+    buyer = dict(cache.get(GROUP, "buyer"))
+    buyer["currency"] -= 100
+    buyer["slaves"] = ["target"]
+    cache.put_many(GROUP, {"buyer": buyer, "target": {"currency": 0, "master": "buyer"}})
+    journal.commit()
+
+    # 进程在写回之前退出：存储引擎中还是旧数据，重启时回放日志
+    assert storage.load(GROUP, "buyer")["currency"] == 500
+    assert MutationJournal(str(tmp_path / "journal")).replay(storage) == 1
+    assert storage.load(GROUP, "buyer") == {"currency": 400, "slaves": ["target"]}
+    assert storage.load(GROUP, "target") == {"currency": 0, "master": "buyer"}
+    assert os.listdir(tmp_path / "journal") == []
+
+
+def test_replay_skips_torn_tail_as_a_whole(tmp_path):
+    storage = JsonFileStorage(str(tmp_path))
+    journal = MutationJournal(str(tmp_path / "journal"))
+    cache = make_cache(storage, journal)
+    cache.put(GROUP, "a", {"currency": 1})
+    journal.commit()
+    cache.put_many(GROUP, {"a": {"currency": 2}, "b": {"currency": 2}})
+    journal.commit()
+
+    # 第二次变更写到一半时退出：两名玩家的增量都不生效
+    path = tmp_path / "journal" / f"{GROUP}.0.log"
+    lines = path.read_bytes().splitlines(keepends=True)
+    path.write_bytes(lines[0] + lines[1][: len(lines[1]) // 2])
+
+    assert MutationJournal(str(tmp_path / "journal")).replay(storage) == 1
+    assert storage.load(GROUP, "a") == {"currency": 1}
+    assert storage.load(GROUP, "b") is None
+
+
+def test_checkpoint_removes_only_sealed_generations(tmp_path):
+    storage = JsonFileStorage(str(tmp_path))
+    journal = MutationJournal(str(tmp_path / "journal"))
+    cache = make_cache(storage, journal)
+    cache.put(GROUP, "a", {"currency": 1})
+
+    sealed = journal.seal()
+    pending = cache.collect_dirty()
+    # 封存之后、写回期间发生的变更属于新的一代
+    cache.put(GROUP, "b", {"currency": 2})
+    journal.commit()
+    assert cache.write_back(pending) == 1
+    journal.remove_sealed(sealed)
+
+    assert os.listdir(tmp_path / "journal") == [f"{GROUP}.1.log"]
+    assert MutationJournal(str(tmp_path / "journal")).replay(storage) == 1
+    assert storage.load(GROUP, "b") == {"currency": 2}
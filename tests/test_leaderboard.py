@@ -0,0 +1,65 @@
+"""跳表的名次查询与按名次读取"""
+
+import random
+
+from astrbot_plugin_slave_market.leaderboard import GroupLeaderboard, SkipList
+
+
+def check_against_sorted(skip_list, keys):
+    expected = sorted(keys)
+    assert len(skip_list) == len(expected)
+    assert list(skip_list) == expected
+    for index, key in enumerate(expected):
+        assert skip_list.rank(key) == index + 1
+    for offset in (0, 1, len(expected) // 2, len(expected) - 1):
+        assert list(skip_list.iter_from(offset)) == expected[offset:]
+
+
+def test_rank_and_range_match_sorted_order():
+    rng = random.Random(7)
+    random.seed(7)
+    skip_list = SkipList()
+    keys = set()
+    for step in range(2000):
+        key = (rng.randint(-50, 50), f"u{rng.randint(0, 300)}")
+        if key in keys and rng.random() < 0.5:
+            assert skip_list.remove(key)
+            keys.discard(key)
+        elif key not in keys:
+            skip_list.insert(key)
+            keys.add(key)
+        if step % 250 == 0:
+            check_against_sorted(skip_list, keys)
+    check_against_sorted(skip_list, keys)
+
+
+def test_missing_keys_and_out_of_range_offsets():
+    skip_list = SkipList()
+    assert skip_list.rank((0, "a")) is None
+    assert list(skip_list.iter_from(0)) == []
+    for key in [(-3, "c"), (-1, "a"), (-2, "b")]:
+        skip_list.insert(key)
+    assert skip_list.rank((-2, "z")) is None
+    assert not skip_list.remove((-2, "z"))
+    assert list(skip_list.iter_from(3)) == []
+    assert list(skip_list.iter_from(-1)) == []
+    assert list(skip_list.iter_from(2)) == [(-1, "a")]
+
+
+def test_group_leaderboard_rank_and_page():
+    board = GroupLeaderboard()
+    for index in range(10):
+        board.update(f"u{index}", {"nickname": f"u{index}", "currency": index * 10})
+    # 相同金币按用户ID排序
+    board.update("u10", {"nickname": "u10", "currency": 50})
+
+    assert [player["user_id"] for player in board.top("currency", 3)] == ["u9", "u8", "u7"]
+    assert [player["user_id"] for player in board.page("currency", 4, 3)] == ["u10", "u5", "u4"]
+    assert board.rank("currency", "u0") == 11
+
+    board.update("u0", {"nickname": "u0", "currency": 1000})
+    assert board.rank("currency", "u0") == 1
+    board.remove("u9")
+    assert board.rank("currency", "u9") is None
+    assert board.rank("currency", "u8") == 2
+    assert len(board.page("currency", 8, 5)) == 2
@@ -0,0 +1,110 @@
+"""银行账本的复利计息、记账与重新读入"""
+
+import pytest
+
+from astrbot_plugin_slave_market.config import compile_config
+from astrbot_plugin_slave_market.journal import MutationJournal
+from astrbot_plugin_slave_market.ledger import BankLedger, accrue_interest
+from astrbot_plugin_slave_market.storage import JsonFileStorage, PlayerCache
+
+GROUP = "g1"
+HOUR = 3600
+
+
+def test_accrue_interest_compounds_hourly():
+    assert accrue_interest(500, 10, 0.01, 10 ** 9) == int(500 * 1.01 ** 10)
+    assert accrue_interest(500, 1, 0.01, 10 ** 9) == 505
+
+
+def test_accrue_interest_caps_at_limit():
+    assert accrue_interest(900, 100, 0.01, 1000) == 1000
+    assert accrue_interest(1000, 5, 0.01, 1000) == 1000
+    # 长时间未结算也不会在幂运算中溢出
+    assert accrue_interest(1, 10 ** 9, 0.5, 1000) == 1000
+    assert accrue_interest(0, 10, 0.01, 1000) == 0
+    assert accrue_interest(500, 0, 0.01, 1000) == 500
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    config = compile_config({"bank": {"interestRate": 0.01, "snapshotInterval": 2}})
+    ledger = BankLedger(str(tmp_path / "bank"), lambda: config.bank)
+    ledger.load_group(GROUP)
+    return ledger
+
+
+def test_unloaded_group_is_not_read_on_the_caller_thread(tmp_path):
+    config = compile_config()
+    ledger = BankLedger(str(tmp_path / "bank"), lambda: config.bank)
+    with pytest.raises(RuntimeError):
+        ledger.view(GROUP, "a")
+    with pytest.raises(RuntimeError):
+        ledger.post(GROUP, "a", "deposit", 1, balance_change=1)
+
+
+def test_view_includes_interest_without_posting(ledger):
+    ledger.post(GROUP, "a", "deposit", 500, balance_change=500, now=0)
+    assert ledger.view(GROUP, "a", now=2 * HOUR + 59).balance == accrue_interest(500, 2, 0.01, 1000)
+    assert ledger.pending_interest(GROUP, "a", now=2 * HOUR) == accrue_interest(500, 2, 0.01, 1000) - 500
+    # 只读查询不会推进计息时间
+    assert ledger.account_state(GROUP, "a").accrued_at == 0
+
+
+def test_post_settles_interest_before_the_entry(ledger):
+    ledger.post(GROUP, "a", "deposit", 500, balance_change=500, now=0)
+    account, interest = ledger.post(GROUP, "a", "withdraw", 100, balance_change=-100, now=3 * HOUR + 10)
+    assert interest == accrue_interest(500, 3, 0.01, 1000) - 500
+    assert account.balance == 500 + interest - 100
+    # 不足一小时的部分留到下次计息
+    assert account.accrued_at == 3 * HOUR
+
+    account, interest = ledger.post(GROUP, "a", "interest", now=3 * HOUR + 20)
+    assert interest == 0
+    with pytest.raises(ValueError):
+        ledger.post(GROUP, "a", "withdraw", 10 ** 6, balance_change=-(10 ** 6), now=3 * HOUR + 30)
+
+    ops = [entry["op"] for entry in ledger.statement(GROUP, "a", 10)]
+    assert ops.count("interest") == 1
+
+
+def test_reload_from_snapshot_and_log(ledger, tmp_path):
+    ledger.post(GROUP, "a", "deposit", 500, balance_change=500, now=0)
+    ledger.post(GROUP, "b", "deposit", 200, balance_change=200, now=0)
+    ledger.flush()
+    # 第一次写入达到快照间隔，之后的流水只在日志中
+    ledger.post(GROUP, "a", "withdraw", 50, balance_change=-50, now=HOUR)
+    ledger.flush()
+
+    reloaded = BankLedger(ledger.ledger_dir, ledger.settings)
+    reloaded.load_group(GROUP)
+    for user_id in ("a", "b"):
+        expected = ledger.view(GROUP, user_id, now=5 * HOUR)
+        actual = reloaded.view(GROUP, user_id, now=5 * HOUR)
+        assert (actual.balance, actual.level, actual.accrued_at) == (
+            expected.balance, expected.level, expected.accrued_at
+        )
+
+
+def test_crash_after_journal_commit_keeps_bank_and_cash_together(tmp_path):
+    config = compile_config()
+    storage = JsonFileStorage(str(tmp_path))
+    storage.save(GROUP, "a", {"currency": 500})
+    journal = MutationJournal(str(tmp_path / "journal"))
+    ledger = BankLedger(str(tmp_path / "bank"), lambda: config.bank)
+    ledger.load_group(GROUP)
+    journal.add_precommit(ledger.flush)
+    cache = PlayerCache(storage.load, storage.save, journal=journal)
+
+    # 存款：现金减少与存款增加来自同一次记账
+    player = dict(cache.get(GROUP, "a"))
+    player["currency"] -= 200
+    ledger.post(GROUP, "a", "deposit", 200, balance_change=200, now=0)
+    cache.put(GROUP, "a", player)
+    journal.commit()
+
+    # 组提交之后、定时写回之前异常退出：重启时回放日志并重新读入账本
+    assert MutationJournal(str(tmp_path / "journal")).replay(storage) == 1
+    reloaded = BankLedger(str(tmp_path / "bank"), lambda: config.bank)
+    reloaded.load_group(GROUP)
+    assert storage.load(GROUP, "a")["currency"] == 300
+    assert reloaded.view(GROUP, "a", now=0).balance == 200
@@ -0,0 +1,106 @@
+"""卡片渲染的图片缓存与渲染线程"""
+
+import asyncio
+import os
+import threading
+from collections import deque
+
+import pytest
+
+pytest.importorskip("jinja2")
+pytest.importorskip("PIL")
+
+from astrbot_plugin_slave_market.config import compile_config
+from astrbot_plugin_slave_market.renderer import CardRenderer
+
+
+class ThreadBoundBackend:
+    """模拟同步版playwright：每个线程一个浏览器，只能在创建它的线程中关闭"""
+
+    name = "fake"
+
+    def __init__(self):
+        self._local = threading.local()
+        self.opened = []
+        self.closed = []
+
+    def rasterize(self, html: str) -> bytes:
+        if getattr(self._local, "browser", None) is None:
+            self._local.browser = threading.get_ident()
+            self.opened.append(self._local.browser)
+        return html.encode("utf-8")
+
+    def close_thread(self) -> None:
+        browser = getattr(self._local, "browser", None)
+        if browser is not None:
+            assert browser == threading.get_ident()
+            self.closed.append(browser)
+            self._local.browser = None
+
+    def close(self) -> None:
+        pass
+
+
+@pytest.fixture
+def renderer(tmp_path):
+    template_dir = tmp_path / "resources" / "html" / "card"
+    template_dir.mkdir(parents=True)
+    (template_dir / "card.html").write_text("<h1>{{ title }}</h1>", encoding="utf-8")
+    config = compile_config({"render": {"cacheSize": 1, "workers": 2}}).render
+    card_renderer = CardRenderer(str(tmp_path / "resources"), str(tmp_path / "cache"), config)
+    card_renderer.backend = ThreadBoundBackend()
+    yield card_renderer
+    card_renderer.executor.shutdown(wait=True)
+
+
+def test_evicted_image_survives_grace_window(renderer):
+    async def main():
+        first = await renderer.render("card", {"title": "a"})
+        second = await renderer.render("card", {"title": "b"})
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert os.path.exists(first) and os.path.exists(second)
+    assert renderer.stats()["size"] == 1
+
+    # 保留期已过：下一次加入缓存时删除
+    renderer._retired = deque((0.0, digest, path) for _, digest, path in renderer._retired)
+    asyncio.run(renderer.render("card", {"title": "c"}))
+    assert not os.path.exists(first)
+
+
+def test_rerendered_image_is_not_deleted_after_grace(renderer):
+    renderer.EVICT_GRACE = 0
+
+    async def main():
+        first = await renderer.render("card", {"title": "a"})
+        # a 被淘汰后再次渲染，文件重新加入缓存；随后淘汰到期的旧记录不能删掉它
+        await renderer.render("card", {"title": "b"})
+        again = await renderer.render("card", {"title": "a"})
+        return first, again
+
+    first, again = asyncio.run(main())
+    assert first == again
+    assert os.path.exists(again)
+
+
+def test_close_releases_browsers_on_their_own_threads(renderer):
+    barrier = threading.Barrier(2)
+    backend = renderer.backend
+
+    def rasterize_on_both_threads(html):
+        barrier.wait()
+        return ThreadBoundBackend.rasterize(backend, html)
+
+    backend.rasterize = rasterize_on_both_threads
+
+    async def main():
+        await asyncio.gather(
+            renderer.render("card", {"title": "a"}),
+            renderer.render("card", {"title": "b"}),
+        )
+
+    asyncio.run(main())
+    assert len(set(backend.opened)) == 2
+    renderer.close()
+    assert sorted(backend.closed) == sorted(backend.opened)
@@ -0,0 +1,124 @@
+"""玩家数据缓存的写回与存储引擎"""
+
+import gc
+
+from astrbot_plugin_slave_market.storage import PlayerCache, SqliteStorage, VirtualPlayers
+
+
+class CountingStorage:
+    """记录每次写入调用的存储引擎"""
+
+    def __init__(self, fail_groups=()):
+        self.records = {}
+        self.calls = []
+        self.fail_groups = set(fail_groups)
+
+    def load(self, group_id, user_id):
+        return self.records.get((group_id, user_id))
+
+    def save(self, group_id, user_id, data):
+        self.save_many(group_id, {user_id: data})
+
+    def save_many(self, group_id, records):
+        self.calls.append((group_id, sorted(records)))
+        if group_id in self.fail_groups:
+            raise OSError("disk full")
+        for user_id, data in records.items():
+            self.records[(group_id, user_id)] = data
+
+
+def make_cache(storage, **kwargs):
+    return PlayerCache(storage.load, storage.save, batch_writer=storage.save_many, **kwargs)
+
+
+def test_write_back_batches_each_group():
+    storage = CountingStorage()
+    cache = make_cache(storage, capacity=1000, flush_threshold=1000)
+    cache.put_many("g1", {str(i): {"value": i} for i in range(200)})
+    cache.put("g2", "a", {"value": 1})
+
+    assert cache.write_back(cache.collect_dirty()) == 201
+    assert sorted(group_id for group_id, _ in storage.calls) == ["g1", "g2"]
+    assert len(storage.records) == 201
+
+
+def test_write_back_failure_marks_whole_group_dirty():
+    storage = CountingStorage(fail_groups={"g1"})
+    cache = make_cache(storage, capacity=1000, flush_threshold=1000)
+    cache.put_many("g1", {"a": {"value": 1}, "b": {"value": 2}})
+    cache.put("g2", "c", {"value": 3})
+
+    assert cache.write_back(cache.collect_dirty()) == 1
+    storage.fail_groups.clear()
+    storage.calls.clear()
+    assert cache.write_back(cache.collect_dirty()) == 2
+    assert storage.calls == [("g1", ["a", "b"])]
+
+
+def test_write_back_to_sqlite_in_one_call(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "player.db"))
+    cache = make_cache(storage, capacity=1000, flush_threshold=1000)
+    cache.put_many("g1", {str(i): {"user_id": str(i), "value": i} for i in range(200)})
+
+    assert cache.write_back(cache.collect_dirty()) == 200
+    assert len(storage.load_many("g1", [str(i) for i in range(200)])) == 200
+
+
+def test_read_during_write_back_sees_collected_snapshot():
+    storage = CountingStorage()
+    storage.records[("g1", "a")] = {"currency": 0}
+    storage.records[("g1", "b")] = {"currency": 0}
+    cache = make_cache(storage, capacity=1, flush_threshold=1000)
+    cache.put("g1", "a", {"currency": 100})
+    # 淘汰到待写回区后取出快照，写回还没有完成
+    cache.get("g1", "b")
+    pending = cache.collect_dirty()
+
+    assert cache.get("g1", "a") == {"currency": 100}
+    assert cache.get_many("g1", ["a"]) == {"a": {"currency": 100}}
+    assert cache.write_back(pending) == 1
+    assert storage.records[("g1", "a")] == {"currency": 100}
+    assert cache.get("g1", "a") == {"currency": 100}
+
+
+def test_failed_write_back_keeps_snapshot_readable():
+    storage = CountingStorage(fail_groups={"g1"})
+    storage.records[("g1", "a")] = {"currency": 0}
+    storage.records[("g2", "x")] = storage.records[("g2", "y")] = {"currency": 0}
+    cache = make_cache(storage, capacity=1, flush_threshold=1000)
+    cache.put("g1", "a", {"currency": 100})
+    cache.get("g2", "x")
+    pending = cache.collect_dirty()
+    assert cache.write_back(pending) == 0
+
+    cache.get("g2", "y")
+    assert cache.get("g1", "a") == {"currency": 100}
+    storage.fail_groups.clear()
+    assert cache.write_back(cache.collect_dirty()) == 1
+    assert storage.records[("g1", "a")] == {"currency": 100}
+
+
+def test_evicted_virtual_player_held_by_a_handler_is_still_tracked():
+    virtual = VirtualPlayers(capacity=1)
+    held = virtual.add("g1", "a", {"currency": 0})
+    virtual.add("g1", "b", {"currency": 0})
+
+    # 被淘汰后仍被持有：不会生成第二份默认数据，未修改时也不会落盘
+    assert virtual.get("g1", "a") is held
+    assert virtual.add("g1", "a", {"currency": 0}) is held
+    virtual.add("g1", "c", {"currency": 0})
+    assert virtual.claim("g1", {"a": held}) == ({}, [])
+
+    held["currency"] = 10
+    virtual.add("g1", "d", {"currency": 0})
+    assert virtual.claim("g1", {"a": held}) == ({"a": held}, ["a"])
+    assert virtual.get("g1", "a") is None
+
+
+def test_released_virtual_players_are_dropped_after_eviction():
+    virtual = VirtualPlayers(capacity=1)
+    virtual.add("g1", "a", {"currency": 0})
+    virtual.add("g1", "b", {"currency": 0})
+    gc.collect()
+    assert virtual.get("g1", "a") is None
+    assert len(virtual) == 1
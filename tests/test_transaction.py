@@ -0,0 +1,214 @@
+"""事务与工作单元的加锁、提交与回滚"""
+
+import asyncio
+import copy
+
+import pytest
+
+from astrbot_plugin_slave_market.config import compile_config
+from astrbot_plugin_slave_market.ledger import BankLedger
+from astrbot_plugin_slave_market.transaction import (
+    PlayerLockManager,
+    PlayerTransaction,
+    RequestContext,
+)
+
+GROUP = "g1"
+
+
+class FakeEvent:
+    def __init__(self, user_id: str, group_id: str = GROUP):
+        self.user_id = user_id
+        self.group_id = group_id
+
+    def get_sender_id(self):
+        return self.user_id
+
+    def get_sender_name(self):
+        return f"玩家{self.user_id}"
+
+    def get_group_id(self):
+        return self.group_id
+
+
+class FakePlugin:
+    """只实现事务用到的接口，玩家数据与缓存一样在各请求之间共享同一个字典"""
+
+    def __init__(self, ledger_dir: str):
+        self.config = compile_config()
+        self.player_locks = PlayerLockManager()
+        self.players = {}
+        self.saved = []
+        self.cooldowns = []
+        self.bank_ledger = BankLedger(ledger_dir, lambda: self.config.bank)
+        self.bank_ledger.load_group(GROUP)
+
+    def add(self, user_id: str, **fields):
+        data = {"user_id": user_id, "nickname": user_id, "currency": 0, "value": 100, "slaves": [], "master": None}
+        data.update(fields)
+        self.players[user_id] = data
+        return data
+
+    def transaction(self, group_id: str, *user_ids: str) -> PlayerTransaction:
+        return PlayerTransaction(self, group_id, list(user_ids))
+
+    async def get_player_data_async(self, group_id, user_id):
+        await asyncio.sleep(0)
+        return self.players.get(user_id)
+
+    async def get_players_async(self, group_id, user_ids):
+        await asyncio.sleep(0)
+        return {user_id: self.players[user_id] for user_id in user_ids if user_id in self.players}
+
+    async def ensure_player_exists_async(self, group_id, user_id, nickname=""):
+        await asyncio.sleep(0)
+        return self.players.get(user_id) or self.add(user_id, nickname=nickname)
+
+    async def save_players_async(self, group_id, records):
+        await asyncio.sleep(0)
+        self.saved.append(copy.deepcopy(records))
+
+    def start_cooldown(self, group_id, user_id, action):
+        self.cooldowns.append((group_id, user_id, action))
+
+
+def slaves_of(player):
+    return player.get("slaves", [])
+
+
+@pytest.fixture
+def plugin(tmp_path):
+    return FakePlugin(str(tmp_path / "bank"))
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_transactions_on_same_player_do_not_lose_updates(plugin):
+    plugin.add("a", currency=0)
+
+    async def add_one():
+        async with plugin.transaction(GROUP, "a") as txn:
+            data = await txn.get("a")
+            current = data["currency"]
+            await asyncio.sleep(0)
+            data["currency"] = current + 1
+
+    async def main():
+        await asyncio.gather(*(add_one() for _ in range(20)))
+
+    run(main())
+    assert plugin.players["a"]["currency"] == 20
+
+
+def test_request_context_locks_declared_players(plugin):
+    plugin.add("owner", slaves=["slave"])
+    plugin.add("slave", value=100)
+    order = []
+
+    async def unit():
+        async with RequestContext(plugin, FakeEvent("owner"), slaves_of) as ctx:
+            assert ctx.user_ids == ["owner", "slave"]
+            slave = (await ctx.get_many(["slave"]))["slave"]
+            value = slave["value"]
+            await asyncio.sleep(0.01)
+            slave["value"] = value + 10
+            order.append("unit")
+
+    async def other():
+        await asyncio.sleep(0)
+        async with plugin.transaction(GROUP, "slave") as txn:
+            slave = await txn.get("slave")
+            slave["value"] += 1
+            order.append("other")
+
+    async def main():
+        await asyncio.gather(unit(), other())
+
+    run(main())
+    assert order == ["unit", "other"]
+    assert plugin.players["slave"]["value"] == 111
+
+
+def test_request_context_rejects_undeclared_players(plugin):
+    plugin.add("owner")
+    plugin.add("stranger", currency=50)
+
+    async def main():
+        async with RequestContext(plugin, FakeEvent("owner")) as ctx:
+            with pytest.raises(KeyError):
+                await ctx.get("stranger")
+            with pytest.raises(KeyError):
+                await ctx.get_many(["stranger"])
+            copy_of_stranger = await ctx.read("stranger")
+            copy_of_stranger["currency"] = 0
+
+    run(main())
+    assert plugin.players["stranger"]["currency"] == 50
+    assert all("stranger" not in records for records in plugin.saved)
+
+
+def test_request_context_recomputes_lock_scope(plugin):
+    plugin.add("owner", slaves=["a"])
+    plugin.add("a")
+    plugin.add("b")
+    scopes = []
+
+    async def buy_b_first():
+        async with plugin.transaction(GROUP, "owner", "b") as txn:
+            owner = await txn.get("owner")
+            await asyncio.sleep(0.01)
+            owner["slaves"].append("b")
+            (await txn.get("b"))["master"] = "owner"
+
+    async def unit():
+        await asyncio.sleep(0)
+        async with RequestContext(plugin, FakeEvent("owner"), slaves_of) as ctx:
+            scopes.append(list(ctx.user_ids))
+
+    async def main():
+        await asyncio.gather(buy_b_first(), unit())
+
+    run(main())
+    assert scopes == [["a", "b", "owner"]]
+
+
+def test_request_context_rollback_undoes_side_effects(plugin):
+    plugin.add("owner", currency=500)
+    plugin.bank_ledger.post(GROUP, "owner", "deposit", 100, balance_change=100)
+    before = plugin.bank_ledger.view(GROUP, "owner").balance
+
+    async def main():
+        with pytest.raises(RuntimeError):
+            async with RequestContext(plugin, FakeEvent("owner")) as ctx:
+                ctx.player["currency"] -= 200
+                ctx.post("deposit", 200, balance_change=200)
+                ctx.start_cooldown("work")
+                raise RuntimeError("boom")
+
+    run(main())
+    assert plugin.players["owner"]["currency"] == 500
+    assert plugin.cooldowns == []
+    assert plugin.saved == []
+    assert plugin.bank_ledger.view(GROUP, "owner").balance == before
+
+    # 撤销流水写入日志后，重新读入账本得到的仍是恢复后的余额
+    plugin.bank_ledger.flush()
+    reloaded = BankLedger(plugin.bank_ledger.ledger_dir, lambda: plugin.config.bank)
+    reloaded.load_group(GROUP)
+    assert reloaded.view(GROUP, "owner").balance == before
+
+
+def test_request_context_commit_starts_cooldowns(plugin):
+    plugin.add("owner", currency=0)
+
+    async def main():
+        async with RequestContext(plugin, FakeEvent("owner")) as ctx:
+            ctx.player["currency"] += 10
+            ctx.start_cooldown("work")
+            assert plugin.cooldowns == []
+
+    run(main())
+    assert plugin.cooldowns == [(GROUP, "owner", "work")]
+    assert plugin.saved == [{"owner": plugin.players["owner"]}]
@@ -0,0 +1,185 @@
+"""每周重置与并发指令、续跑的交互"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from astrbot_plugin_slave_market.admission import AdmissionController
+from astrbot_plugin_slave_market.config import compile_config
+from astrbot_plugin_slave_market.cooldown import CooldownService
+from astrbot_plugin_slave_market.ledger import BankLedger
+from astrbot_plugin_slave_market.storage import PlayerCache, RosterIndex, SqliteStorage, VirtualPlayers
+from astrbot_plugin_slave_market.timeseries import MetricTimeSeries
+from astrbot_plugin_slave_market.transaction import PlayerLockManager, PlayerTransaction
+from astrbot_plugin_slave_market.weekly_reset import WeeklyResetModule
+
+GROUP = "g1"
+
+
+class ResetPlugin:
+    """由真实的存储、缓存与账本组成，只实现每周重置用到的插件接口"""
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.config = compile_config()
+        self.storage = SqliteStorage(os.path.join(data_path, "players.db"))
+        self.journal = None
+        self.player_cache = PlayerCache(
+            self.storage.load,
+            self.storage.save,
+            batch_loader=self.storage.load_many,
+            batch_writer=self.storage.save_many,
+        )
+        self.roster = RosterIndex()
+        self.virtual_players = VirtualPlayers()
+        self.admission = AdmissionController(lambda: self.config.admission)
+        self.player_locks = PlayerLockManager()
+        self.cooldowns = CooldownService(os.path.join(data_path, "cooldowns"))
+        self.bank_ledger = BankLedger(os.path.join(data_path, "bank"), lambda: self.config.bank)
+        self.trends = MetricTimeSeries(os.path.join(data_path, "trends"))
+        self.io_executor = ThreadPoolExecutor(max_workers=2)
+
+    async def run_io(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.io_executor, func, *args)
+
+    def get_roster(self, group_id):
+        roster = self.roster.get(group_id)
+        if roster is None:
+            roster = self.roster.load(group_id, self.storage.list_players(group_id))
+        return roster
+
+    def get_all_players(self, group_id):
+        return self.get_roster(group_id).ids()
+
+    async def get_roster_async(self, group_id):
+        return self.get_roster(group_id)
+
+    def transaction(self, group_id, *user_ids):
+        return PlayerTransaction(self, group_id, list(user_ids))
+
+    async def get_player_data_async(self, group_id, user_id):
+        return self.player_cache.get(group_id, user_id)
+
+    async def save_players_async(self, group_id, records):
+        self.player_cache.put_many(group_id, records)
+
+    async def flush_group_async(self, group_id):
+        pending = self.player_cache.collect_dirty(group_id)
+        if pending:
+            await self.run_io(self.player_cache.write_back, pending)
+
+    async def flush_player_cache_async(self):
+        await self.run_io(self.player_cache.flush)
+
+
+def player(user_id, **fields):
+    data = {
+        "user_id": user_id, "nickname": user_id, "currency": 0, "value": 100,
+        "slaves": [], "master": None, "arena": {"tier": "青铜", "points": 0, "wins": 0, "losses": 0},
+    }
+    data.update(fields)
+    return data
+
+
+@pytest.fixture
+def plugin(tmp_path):
+    plugin = ResetPlugin(str(tmp_path))
+    plugin.storage.save_many(GROUP, {
+        "1": player("1", currency=500, value=900, slaves=["2"]),
+        "2": player("2", master="1"),
+    })
+    yield plugin
+    plugin.io_executor.shutdown()
+    plugin.storage.close()
+
+
+def test_reset_waits_for_in_flight_transaction(plugin):
+    module = WeeklyResetModule(plugin)
+    job_id = "20240101_000000"
+    entered = asyncio.Event()
+
+    async def in_flight():
+        async with plugin.transaction(GROUP, "1") as txn:
+            data = await txn.get("1")
+            entered.set()
+            await asyncio.sleep(0.05)
+            data["currency"] = 700
+
+    async def reset():
+        await entered.wait()
+        return await module.reset_group_async(GROUP, job_id)
+
+    async def main():
+        results = await asyncio.gather(in_flight(), reset())
+        return results[1]
+
+    assert asyncio.run(main()) == 2
+    # 重置前提交的修改进入归档，重置后的数据不会被旧的缓存覆盖
+    assert module.archive.read_player(GROUP, job_id, "1")["currency"] == 700
+    asyncio.run(plugin.flush_player_cache_async())
+    reset_data = plugin.storage.load(GROUP, "1")
+    assert reset_data["currency"] == 0
+    assert reset_data["slaves"] == []
+    assert plugin.storage.load(GROUP, "2")["master"] is None
+
+
+def test_admission_paused_during_reset(plugin):
+    admitted, notice = plugin.admission.admit(GROUP, "1", "打工", now=0.0)
+    assert admitted
+    plugin.admission.pause(GROUP)
+    admitted, notice = plugin.admission.admit(GROUP, "1", "打工", now=1.0)
+    assert not admitted and "重置" in notice
+    plugin.admission.resume(GROUP)
+    assert plugin.admission.admit(GROUP, "1", "打工", now=2.0)[0]
+
+
+def test_resumed_reset_keeps_archive_history_and_trends(plugin):
+    module = WeeklyResetModule(plugin)
+    job_id = "20240101_000000"
+    week = 1704038400
+
+    assert module.reset_group(GROUP, job_id) == 2
+    # 续跑：存储中已经是重置后的数据，再次重置同一群组
+    assert module.reset_group(GROUP, job_id) == 2
+
+    assert module.archive.read_player(GROUP, job_id, "1")["currency"] == 500
+    assert len(module.history.weeks(GROUP)) == 1
+    players = {entry["user_id"]: entry for entry in module.history.read(GROUP)["players"]}
+    assert players["1"]["currency"] == 500
+
+    series = plugin.trends.player_series(GROUP, "1")
+    assert len(series) == 1
+    assert series[0][1]["currency"] == 500
+    assert series[0][1]["value"] == 900
+    assert plugin.trends.highest(GROUP)["currency"][0] == 500
+
+
+def test_resume_after_archive_uses_archived_records(plugin):
+    module = WeeklyResetModule(plugin)
+    job_id = "20240101_000000"
+    # 上次执行写完归档并重置了数据，但在追加时间序列之前中断
+    module.archive.write_group(GROUP, job_id, plugin.storage.load_group(GROUP))
+    plugin.storage.save_many(GROUP, {"1": player("1"), "2": player("2")})
+
+    module.reset_group(GROUP, job_id)
+
+    series = plugin.trends.player_series(GROUP, "1")
+    assert [metrics["currency"] for _, metrics in series] == [500]
+    players = {entry["user_id"]: entry for entry in module.history.read(GROUP)["players"]}
+    assert players["1"]["value"] == 900
+
+
+def test_append_week_skips_existing_week(tmp_path):
+    trends = MetricTimeSeries(str(tmp_path))
+    assert trends.append_week(GROUP, 100, {"1": player("1", currency=500, value=900)}) == 1
+    assert trends.append_week(GROUP, 100, {"1": player("1")}) == 0
+    assert trends.append_week(GROUP, 200, {"1": player("1", currency=50)}) == 1
+    assert [(week, metrics["currency"]) for week, metrics in trends.player_series(GROUP, "1")] == [(100, 500), (200, 50)]
+
+    # 写了一半的尾部记录被截掉
+    with open(trends.series_path(GROUP), "ab") as f:
+        f.write(b"\x00" * 5)
+    assert trends.append_week(GROUP, 300, {"1": player("1", currency=7)}) == 1
+    assert trends.player_series(GROUP, "1")[-1] == (300, {"currency": 7, "value": 100, "slaves": 0, "points": 0})
@@ -0,0 +1,146 @@
+"""
+排行指标时间序列模块
+每个群组一个定长记录文件，每周重置时追加，读取时内存映射
+"""
+
+import hashlib
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .storage import METRICS, player_metrics
+
+# 一条记录：周时间戳、用户键、金币、身价、奴隶数、积分
+RECORD = struct.Struct("<qqqqii")
+
+
+def user_key(user_id: str) -> int:
+    """将用户ID转换为定长记录中的64位整数键
+
+    纯数字ID直接使用数值，其他ID取哈希
+    """
+    if user_id.isdigit() and int(user_id) < 2 ** 63:
+        return int(user_id)
+    return int.from_bytes(hashlib.blake2b(user_id.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+
+
+class MetricTimeSeries:
+    """按群组保存的每周排行指标
+
+    文件 data/trends/<group_id>.bin 由定长记录首尾相接组成，
+    同一周的记录连续存放、按周递增。读取时内存映射整个文件并直接按结构解包，
+    不需要解析JSON，查询多周数据只是一次顺序扫描。
+    """
+
+    def __init__(self, series_dir: str):
+        """初始化时间序列
+
+        Args:
+            series_dir: 数据目录
+        """
+        self.series_dir = series_dir
+
+    def series_path(self, group_id: str) -> str:
+        """获取群组记录文件路径"""
+        return os.path.join(self.series_dir, f"{group_id}.bin")
+
+    def append_week(self, group_id: str, week: int, records: Dict[str, Dict]) -> int:
+        """追加一周的记录
+
+        文件末尾已有同一周的完整记录时（重置任务中断后续跑）直接跳过，不会被之后的数据覆盖；
+        只去掉写了一半的尾部记录
+
+        Args:
+            group_id: 群组ID
+            week: 周时间戳（重置任务开始时间）
+            records: 用户ID到玩家数据的映射
+
+        Returns:
+            int: 写入的记录条数，本周已经写入时为0
+        """
+        os.makedirs(self.series_dir, exist_ok=True)
+        buffer = bytearray()
+        for user_id, data in records.items():
+            metrics = player_metrics(data)
+            buffer += RECORD.pack(
+                week,
+                user_key(user_id),
+                metrics["currency"],
+                metrics["value"],
+                metrics["slaves"],
+                metrics["points"],
+            )
+
+        path = self.series_path(group_id)
+        with open(path, "ab+") as f:
+            size = f.seek(0, os.SEEK_END)
+            end = size - size % RECORD.size
+            if end >= RECORD.size:
+                f.seek(end - RECORD.size)
+                if RECORD.unpack(f.read(RECORD.size))[0] == week:
+                    return 0
+            # 去掉写了一半的尾部记录
+            if end != size:
+                f.truncate(end)
+            f.seek(end)
+            f.write(buffer)
+        return len(records)
+
+    def _scan(self, group_id: str) -> Iterator[Tuple[int, int, int, int, int, int]]:
+        """内存映射记录文件并逐条解包"""
+        path = self.series_path(group_id)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            size -= size % RECORD.size
+            if size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)[:size]
+                try:
+                    yield from RECORD.iter_unpack(view)
+                finally:
+                    view.release()
+
+    def player_series(
+        self, group_id: str, user_id: str, limit: Optional[int] = None
+    ) -> List[Tuple[int, Dict[str, int]]]:
+        """获取玩家每周的指标
+
+        Args:
+            group_id: 群组ID
+            user_id: 用户ID
+            limit: 只返回最近的limit周，为None时返回全部
+
+        Returns:
+            List[Tuple[int, Dict[str, int]]]: 按时间从旧到新排序的(周时间戳, 指标)列表
+        """
+        key = user_key(user_id)
+        series = [
+            (week, dict(zip(METRICS, values)))
+            for week, record_key, *values in self._scan(group_id)
+            if record_key == key
+        ]
+        if limit is not None:
+            series = series[-limit:]
+        return series
+
+    def highest(self, group_id: str) -> Dict[str, Tuple[int, int, int]]:
+        """获取群组历史上每个指标的最高记录
+
+        Args:
+            group_id: 群组ID
+
+        Returns:
+            Dict[str, Tuple[int, int, int]]: 指标名到(数值, 用户键, 周时间戳)的映射，
+                同值时取较早的记录
+        """
+        best: Dict[str, Tuple[int, int, int]] = {}
+        for week, key, *values in self._scan(group_id):
+            for metric, value in zip(METRICS, values):
+                current = best.get(metric)
+                if current is None or value > current[0]:
+                    best[metric] = (value, key, week)
+        return best
@@ -5,45 +5,47 @@
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api import logger
 import random
-import time
-from typing import Dict, Any, TYPE_CHECKING
+from typing import Dict, Any, List, TYPE_CHECKING
+
+from .admission import admission_control
+from .training_engine import SUCCESS, UNAFFORDABLE, train_batch
+from .transaction import unit_of_work
 
 if TYPE_CHECKING:
+    from .config import PluginConfig
     from .main import SlaveMarketPlugin
+    from .transaction import RequestContext
+
+
+def owned_slaves(player: Dict[str, Any]) -> List[Any]:
+    """训练与决斗会修改发送者的奴隶，工作单元需要一并加锁"""
+    return player.get("slaves", [])
+
 
 class TrainingModule:
     def __init__(self, plugin: 'SlaveMarketPlugin'):
         self.plugin = plugin
-        self.config = plugin.config
+    
+    @property
+    def config(self) -> 'PluginConfig':
+        """当前配置，配置文件热重载后自动使用新配置"""
+        return self.plugin.config
     
     @filter.command("训练奴隶")
-    async def train_slave(self, event: AstrMessageEvent):
+    @admission_control("训练奴隶")
+    @unit_of_work(cooldown="training", locks=owned_slaves)
+    async def train_slave(self, event: AstrMessageEvent, ctx: 'RequestContext'):
         """训练奴隶
         
         可以训练单个奴隶或批量训练所有奴隶
         """
-        if not event.get_group_id():
-            yield event.plain_result("该游戏只能在群内使用")
-            return
-        
-        group_id = str(event.get_group_id())
-        user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
+        data = ctx.player
         
         # 检查是否有奴隶
         if not data.get("slaves"):
             yield event.plain_result("你没有奴隶，无法训练")
             return
         
-        # 检查冷却时间
-        if not self.plugin.check_cooldown(data, "training", self.config["training"]["cooldown"]):
-            remaining = self.config["training"]["cooldown"] - (int(time.time()) - data["cooldowns"]["training"])
-            yield event.plain_result(f"训练冷却中，还需等待 {remaining//60} 分钟")
-            return
-        
         # 解析训练参数
         message_str = event.message_str.strip()
         target_slave_id = None
@@ -72,69 +74,65 @@ class TrainingModule:
         
         # 执行训练
         results = []
-        total_cost = 0
         success_count = 0
         fail_count = 0
         
-        for slave_id in slaves_to_train:
-            slave_data = self.plugin.get_player_data(group_id, str(slave_id))
-            if not slave_data:
-                continue
-            
-            # 计算训练费用
-            training_cost = int(slave_data["value"] * self.config["training"]["costRate"])
-            
-            if data["currency"] < training_cost:
+        # 一次批量读取所有奴隶，训练结束后与主人数据一起提交
+        slave_records = await ctx.get_many([str(slave_id) for slave_id in slaves_to_train])
+        slave_ids = [str(slave_id) for slave_id in slaves_to_train if slave_records.get(str(slave_id))]
+        
+        # 一次计算所有奴隶的训练结果（奴隶较多且安装了NumPy时向量化）
+        training_config = self.config.training
+        outcome = train_batch(
+            data["currency"],
+            [slave_records[slave_id]["value"] for slave_id in slave_ids],
+            training_config.cost_rate,
+            training_config.success_rate,
+            training_config.value_increase_rate,
+        )
+        data["currency"] = outcome.currency
+        total_cost = outcome.total_cost
+        
+        for i, slave_id in enumerate(slave_ids):
+            slave_data = slave_records[slave_id]
+            if outcome.status[i] == UNAFFORDABLE:
                 results.append({
+                    "id": slave_id,
                     "name": slave_data["nickname"],
                     "status": "failed",
-                    "result": f"金币不足，需要{training_cost}金币",
-                    "valueChange": 0
+                    "result": f"金币不足，需要{outcome.costs[i]}金币",
+                    "valueChange": 0,
+                    "currentValue": slave_data["value"]
                 })
                 fail_count += 1
-                continue
-            
-            # 检查训练成功率
-            if random.random() < self.config["training"]["successRate"]:
-                # 训练成功
-                value_increase = int(slave_data["value"] * self.config["training"]["valueIncreaseRate"])
-                
-                # 扣除费用
-                data["currency"] -= training_cost
-                total_cost += training_cost
-                
-                # 提升奴隶价值
+            elif outcome.status[i] == SUCCESS:
+                # 训练成功，提升奴隶价值
+                value_increase = outcome.gains[i]
                 slave_data["value"] += value_increase
                 
-                # 保存奴隶数据
-                self.plugin.save_player_data(group_id, str(slave_id), slave_data)
-                
                 results.append({
+                    "id": slave_id,
                     "name": slave_data["nickname"],
                     "status": "success",
                     "result": f"训练成功，身价提升{value_increase}金币",
-                    "valueChange": value_increase
+                    "valueChange": value_increase,
+                    "currentValue": slave_data["value"]
                 })
                 success_count += 1
             else:
-                # 训练失败
-                half_cost = training_cost // 2
-                data["currency"] -= half_cost
-                total_cost += half_cost
-                
+                # 训练失败，损失一半费用
                 results.append({
+                    "id": slave_id,
                     "name": slave_data["nickname"],
                     "status": "failed",
-                    "result": f"训练失败，损失{half_cost}金币",
-                    "valueChange": 0
+                    "result": f"训练失败，损失{outcome.charged[i]}金币",
+                    "valueChange": 0,
+                    "currentValue": slave_data["value"]
                 })
                 fail_count += 1
         
         # 设置冷却时间
-        self.plugin.set_cooldown(data, "training")
-        
-        # 保存主人数据
-        self.plugin.save_player_data(group_id, user_id, data)
+        ctx.start_cooldown("training")
         
         # 生成训练报告
         if len(slaves_to_train) == 1:
@@ -146,7 +144,7 @@ class TrainingModule:
                     f"👤 奴隶: {result['name']}\n"
                     f"💰 花费: {total_cost} 金币\n"
                     f"📈 价值提升: {result['valueChange']} 金币\n"
-                    f"💎 新身价: {self.plugin.get_player_data(group_id, slaves_to_train[0])['value']} 金币"
+                    f"💎 新身价: {slave_records[str(slaves_to_train[0])]['value']} 金币"
                 )
             else:
                 yield event.plain_result(
@@ -185,42 +183,30 @@ class TrainingModule:
                     if result["status"] == "failed":
                         report += f"• {result['name']}\n"
             
-            yield event.plain_result(report)
+            card = {"summary": summary, "results": results}
+            yield await self.plugin.card_result(event, "training", card, report)
     
     @filter.command("奴隶决斗")
-    async def slave_arena(self, event: AstrMessageEvent):
+    @admission_control("奴隶决斗")
+    @unit_of_work(cooldown="arena", locks=owned_slaves)
+    async def slave_arena(self, event: AstrMessageEvent, ctx: 'RequestContext'):
         """奴隶决斗"""
-        if not event.get_group_id():
-            yield event.plain_result("该游戏只能在群内使用")
-            return
-        
-        group_id = str(event.get_group_id())
-        user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
+        data = ctx.player
         
         # 检查是否有奴隶
         if not data.get("slaves"):
             yield event.plain_result("你没有奴隶，无法参与决斗")
             return
         
-        # 检查冷却时间
-        if not self.plugin.check_cooldown(data, "arena", self.config["arena"]["cooldown"]):
-            remaining = self.config["arena"]["cooldown"] - (int(time.time()) - data["cooldowns"]["arena"])
-            yield event.plain_result(f"决斗冷却中，还需等待 {remaining//60} 分钟")
-            return
-        
         # 检查参赛费用
-        entry_fee = self.config["arena"]["entryFee"]
+        entry_fee = self.config.arena.entry_fee
         if data["currency"] < entry_fee:
             yield event.plain_result(f"金币不足！参赛需要 {entry_fee} 金币，你只有 {data['currency']} 金币")
             return
         
         # 选择一个奴隶参赛
         slave_id = random.choice(data["slaves"])
-        slave_data = self.plugin.get_player_data(group_id, str(slave_id))
+        slave_data = await ctx.get(str(slave_id))
         
         if not slave_data:
             yield event.plain_result("决斗失败：奴隶数据不存在")
@@ -232,8 +218,8 @@ class TrainingModule:
         # 模拟决斗结果
         if random.random() < 0.5:
             # 获胜
-            reward = int(entry_fee * (1 + self.config["arena"]["rewardRate"]))
-            value_bonus = int(slave_data["value"] * self.config["arena"]["valueBonus"])
+            reward = int(entry_fee * (1 + self.config.arena.reward_rate))
+            value_bonus = int(slave_data["value"] * self.config.arena.value_bonus)
             
             # 发放奖励
             data["currency"] += reward
@@ -244,34 +230,17 @@ class TrainingModule:
             # 失败
             result_message = f"💔 决斗失败！\n👤 参赛者: {slave_data['nickname']}\n💰 损失报名费: {entry_fee} 金币"
         
-        # 设置冷却时间
-        self.plugin.set_cooldown(data, "arena")
-        
-        # 保存数据
-        self.plugin.save_player_data(group_id, user_id, data)
-        self.plugin.save_player_data(group_id, str(slave_id), slave_data)
+        # 设置冷却时间，主人与奴隶的数据在处理结束后一起提交
+        ctx.start_cooldown("arena")
         
         yield event.plain_result(result_message)
     
     @filter.command("排位赛")
-    async def ranking_battle(self, event: AstrMessageEvent):
+    @admission_control("排位赛")
+    @unit_of_work(cooldown="ranking")
+    async def ranking_battle(self, event: AstrMessageEvent, ctx: 'RequestContext'):
         """排位赛"""
-        if not event.get_group_id():
-            yield event.plain_result("该游戏只能在群内使用")
-            return
-        
-        group_id = str(event.get_group_id())
-        user_id = str(event.get_sender_id())
-        nickname = event.get_sender_name()
-        
-        # 确保玩家存在
-        data = self.plugin.ensure_player_exists(group_id, user_id, nickname)
-        
-        # 检查冷却时间
-        if not self.plugin.check_cooldown(data, "ranking", self.config["ranking"]["cooldown"]):
-            remaining = self.config["ranking"]["cooldown"] - (int(time.time()) - data["cooldowns"]["ranking"])
-            yield event.plain_result(f"排位赛冷却中，还需等待 {remaining//60} 分钟")
-            return
+        data = ctx.player
         
         # 获取当前段位
         arena_data = data.get("arena", {})
@@ -281,9 +250,9 @@ class TrainingModule:
         # 模拟排位赛结果
         if random.random() < 0.6:  # 60%胜率
             # 获胜
-            base_reward = self.config["ranking"]["baseReward"]
-            tier_bonus = self.config["ranking"]["tierBonus"].get(current_tier, 1)
-            win_bonus = int(base_reward * self.config["ranking"]["winBonus"])
+            base_reward = self.config.ranking.base_reward
+            tier_bonus = self.config.ranking.tier_bonus.get(current_tier, 1)
+            win_bonus = int(base_reward * self.config.ranking.win_bonus)
             
             total_reward = int(base_reward * tier_bonus + win_bonus)
             points_gained = random.randint(10, 25)
@@ -311,23 +280,12 @@ class TrainingModule:
             result_message = f"💔 排位赛失败！\n📊 当前段位: {current_tier}\n⭐ 积分: -{points_lost}"
         
         # 设置冷却时间
-        self.plugin.set_cooldown(data, "ranking")
+        ctx.start_cooldown("ranking")
         
-        # 保存数据
         data["arena"] = arena_data
-        self.plugin.save_player_data(group_id, user_id, data)
         
         yield event.plain_result(result_message)
     
     def check_tier_promotion(self, points: int) -> str:
         """检查段位提升"""
-        if points >= 2000:
-            return "钻石"
-        elif points >= 1500:
-            return "铂金"
-        elif points >= 1000:
-            return "黄金"
-        elif points >= 500:
-            return "白银"
-        else:
-            return "青铜"
\ No newline at end of file
+        return self.config.ranking.tier_for(points)
@@ -0,0 +1,170 @@
+"""
+批量训练计算模块
+按训练规则一次性计算多个奴隶的训练结果，安装了NumPy时使用向量化实现
+"""
+
+import random
+from typing import Callable, List, Optional, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 取决于运行环境
+    np = None
+
+# 训练结果状态
+UNAFFORDABLE = 0
+SUCCESS = 1
+FAILED = 2
+
+# 奴隶数量达到该值时才使用向量化实现，数量较少时创建数组的开销超过逐个计算（见benchmarks/bench_training.py）
+VECTORIZE_MIN = 128
+
+
+class TrainingOutcome:
+    """一次批量训练的结果，各列表与输入的奴隶顺序一致"""
+
+    __slots__ = ("status", "costs", "charged", "gains", "currency")
+
+    def __init__(
+        self,
+        status: List[int],
+        costs: List[int],
+        charged: List[int],
+        gains: List[int],
+        currency: int,
+    ):
+        self.status = status
+        # 训练费用（金币不足时即为所需金币）
+        self.costs = costs
+        # 实际扣除的金币
+        self.charged = charged
+        # 身价提升
+        self.gains = gains
+        # 训练结束后剩余的金币
+        self.currency = currency
+
+    @property
+    def total_cost(self) -> int:
+        """实际扣除的金币总数"""
+        return sum(self.charged)
+
+
+def train_batch_loop(
+    currency: int,
+    values: Sequence[int],
+    cost_rate: float,
+    success_rate: float,
+    increase_rate: float,
+    rand: Callable[[], float] = random.random,
+) -> TrainingOutcome:
+    """逐个按顺序训练
+
+    规则：费用为身价乘以cost_rate取整；金币不足时跳过该奴隶（不扣费、不抽签），
+    继续尝试后面的奴隶；成功时扣除全部费用，身价提升身价乘以increase_rate取整；
+    失败时扣除一半费用
+
+    Args:
+        currency: 主人当前金币
+        values: 各奴隶的身价
+        cost_rate: 训练费用比例
+        success_rate: 训练成功率
+        increase_rate: 成功时的身价提升比例
+        rand: 返回[0, 1)均匀随机数的函数
+
+    Returns:
+        TrainingOutcome: 训练结果
+    """
+    status, costs, charged, gains = [], [], [], []
+    for value in values:
+        cost = int(value * cost_rate)
+        costs.append(cost)
+        if currency < cost:
+            status.append(UNAFFORDABLE)
+            charged.append(0)
+            gains.append(0)
+            continue
+        if rand() < success_rate:
+            status.append(SUCCESS)
+            charged.append(cost)
+            gains.append(int(value * increase_rate))
+            currency -= cost
+        else:
+            status.append(FAILED)
+            charged.append(cost // 2)
+            gains.append(0)
+            currency -= cost // 2
+    return TrainingOutcome(status, costs, charged, gains, currency)
+
+
+def train_batch_vectorized(
+    currency: int,
+    values: Sequence[int],
+    cost_rate: float,
+    success_rate: float,
+    increase_rate: float,
+    rng: Optional["np.random.Generator"] = None,
+) -> TrainingOutcome:
+    """向量化的批量训练，结果分布与train_batch_loop完全一致
+
+    一次抽取所有奴隶的训练结果，用前缀和计算每个奴隶训练前剩余的金币，
+    找到第一个付不起费用的位置：在此之前的结果可以整体确定；
+    从该位置开始，被跳过的奴隶不扣费会改变后续的余额，改为逐个计算
+    （沿用已经抽取的结果，各次抽签独立同分布，分布不变）
+
+    Args:
+        currency: 主人当前金币
+        values: 各奴隶的身价
+        cost_rate: 训练费用比例
+        success_rate: 训练成功率
+        increase_rate: 成功时的身价提升比例
+        rng: NumPy随机数生成器，默认新建一个
+
+    Returns:
+        TrainingOutcome: 训练结果
+    """
+    rng = rng or np.random.default_rng()
+    value_array = np.asarray(values, dtype=np.int64)
+    n = len(value_array)
+
+    # 与int(value * rate)相同：float64相乘后向零取整
+    cost = (value_array * cost_rate).astype(np.int64)
+    gain_if_success = (value_array * increase_rate).astype(np.int64)
+    success = rng.random(n) < success_rate
+    charge = np.where(success, cost, cost // 2)
+
+    spent_before = np.cumsum(charge) - charge
+    affordable = currency - spent_before >= cost
+    stop = n if affordable.all() else int(np.argmin(affordable))
+
+    status = np.where(success, SUCCESS, FAILED).tolist()
+    costs = cost.tolist()
+    charged = charge.tolist()
+    gains = np.where(success, gain_if_success, 0).tolist()
+    currency -= sum(charged[:stop])
+
+    # 第一个付不起的位置之后逐个计算
+    for i in range(stop, n):
+        if currency < costs[i]:
+            status[i] = UNAFFORDABLE
+            charged[i] = 0
+            gains[i] = 0
+        else:
+            currency -= charged[i]
+
+    return TrainingOutcome(status, costs, charged, gains, currency)
+
+
+def train_batch(
+    currency: int,
+    values: Sequence[int],
+    cost_rate: float,
+    success_rate: float,
+    increase_rate: float,
+) -> TrainingOutcome:
+    """批量训练，安装了NumPy且奴隶较多时使用向量化实现
+
+    参数与返回值见train_batch_loop
+    """
+    if np is not None and len(values) >= VECTORIZE_MIN:
+        return train_batch_vectorized(currency, values, cost_rate, success_rate, increase_rate)
+    return train_batch_loop(currency, values, cost_rate, success_rate, increase_rate)
@@ -0,0 +1,353 @@
+"""
+玩家数据事务模块
+以确定的顺序获取玩家锁，对多个玩家的修改一次性提交或全部回滚；
+unit_of_work 装饰器把单个发送者的指令包装成一个事务
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple, TYPE_CHECKING
+
+from astrbot.api import logger
+
+if TYPE_CHECKING:
+    from .main import SlaveMarketPlugin
+
+
+class PlayerLockManager:
+    """按(群组ID, 用户ID)分配的细粒度异步锁
+
+    锁对象只在被持有或等待时存在，不会随玩家数量无限增长
+    """
+
+    def __init__(self):
+        self._locks: "weakref.WeakValueDictionary[Tuple[str, str], asyncio.Lock]" = (
+            weakref.WeakValueDictionary()
+        )
+
+    def get(self, group_id: str, user_id: str) -> asyncio.Lock:
+        """获取玩家对应的锁"""
+        key = (group_id, user_id)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[key] = lock
+        return lock
+
+
+class PlayerTransaction:
+    """涉及多个玩家的事务
+
+    用法::
+
+        async with plugin.transaction(group_id, buyer_id, target_id) as txn:
+            buyer = await txn.ensure(buyer_id, nickname)
+            target = await txn.get(target_id)
+            ...
+
+    进入时按用户ID排序依次加锁，不同事务之间不会死锁，也不会阻塞无关玩家的指令；
+    正常退出时把发生变化的记录作为一次变更整体提交（变更日志中写在同一行），
+    抛出异常时把记录恢复到事务开始时的状态。
+    """
+
+    def __init__(self, plugin: "SlaveMarketPlugin", group_id: str, user_ids: List[str]):
+        self.plugin = plugin
+        self.group_id = group_id
+        self.user_ids = sorted(set(user_ids))
+        self._locks: List[asyncio.Lock] = []
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._snapshots: Dict[str, Dict[str, Any]] = {}
+
+    async def __aenter__(self) -> "PlayerTransaction":
+        try:
+            for user_id in self.user_ids:
+                lock = self.plugin.player_locks.get(self.group_id, user_id)
+                await lock.acquire()
+                self._locks.append(lock)
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                await self.commit()
+            else:
+                self.rollback()
+        finally:
+            self._release()
+
+    def _release(self) -> None:
+        """按加锁的相反顺序释放锁"""
+        while self._locks:
+            self._locks.pop().release()
+
+    def _track(self, user_id: str, data: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """记录玩家数据在事务开始时的快照"""
+        if data is not None and user_id not in self._records:
+            self._records[user_id] = data
+            self._snapshots[user_id] = copy.deepcopy(data)
+        return data
+
+    def _check_locked(self, user_id: str) -> None:
+        if user_id not in self.user_ids:
+            raise KeyError(f"用户{user_id}不在事务的加锁范围内")
+
+    async def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """读取事务内的玩家数据
+
+        Args:
+            user_id: 用户ID，必须在创建事务时声明
+
+        Returns:
+            Optional[Dict[str, Any]]: 玩家数据或None
+        """
+        self._check_locked(user_id)
+        if user_id in self._records:
+            return self._records[user_id]
+        data = await self.plugin.get_player_data_async(self.group_id, user_id)
+        return self._track(user_id, data)
+
+    async def ensure(self, user_id: str, nickname: str = "") -> Dict[str, Any]:
+        """读取事务内的玩家数据，不存在时创建
+
+        Args:
+            user_id: 用户ID，必须在创建事务时声明
+            nickname: 昵称
+
+        Returns:
+            Dict[str, Any]: 玩家数据
+        """
+        self._check_locked(user_id)
+        if user_id in self._records:
+            return self._records[user_id]
+        data = await self.plugin.ensure_player_exists_async(self.group_id, user_id, nickname)
+        return self._track(user_id, data)
+
+    async def commit(self) -> None:
+        """提交事务内发生变化的玩家数据"""
+        changed = {
+            user_id: data
+            for user_id, data in self._records.items()
+            if data != self._snapshots[user_id]
+        }
+        if changed:
+            await self.plugin.save_players_async(self.group_id, changed)
+        self._snapshots = {user_id: copy.deepcopy(data) for user_id, data in self._records.items()}
+
+    def rollback(self) -> None:
+        """将事务内的玩家数据恢复到开始时的状态"""
+        for user_id, data in self._records.items():
+            data.clear()
+            data.update(self._snapshots[user_id])
+
+
+class RequestContext(PlayerTransaction):
+    """一次指令处理的工作单元
+
+    进入时锁定发送者以及 locks 声明的其他玩家（与多玩家事务一样按用户ID排序依次加锁），
+    读入发送者数据（不存在时创建）存放在 player 中；处理过程中经 get、ensure、get_many
+    读取的玩家必须在加锁范围内，处理函数结束时所有发生变化的记录作为一次变更提交，
+    抛出异常时全部恢复。不在加锁范围内的玩家只能经 read 读取与事务无关的副本。
+
+    冷却经 start_cooldown 登记、在提交成功后才开始；银行记账经 post 立即生效，
+    失败时追加撤销流水恢复账户。
+    """
+
+    # 加锁后发现声明的玩家发生变化时，重新计算并加锁的最多次数
+    MAX_LOCK_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        plugin: "SlaveMarketPlugin",
+        event: Any,
+        locks: Optional[Callable[[Dict[str, Any]], Iterable[Any]]] = None,
+    ):
+        """初始化工作单元
+
+        Args:
+            plugin: 插件实例
+            event: 消息事件
+            locks: 根据发送者数据返回处理函数还会修改的其他玩家ID，None表示只修改发送者
+        """
+        self.user_id = str(event.get_sender_id())
+        self.nickname = event.get_sender_name()
+        super().__init__(plugin, str(event.get_group_id()), [self.user_id])
+        self.locks = locks
+        self.player: Dict[str, Any] = {}
+        self._cooldowns: List[str] = []
+        # 第一次记账前的账户状态，_bank_posted 为False时表示本工作单元没有记账
+        self._bank_posted = False
+        self._bank_state: Any = None
+
+    def _lock_targets(self, data: Optional[Dict[str, Any]]) -> Set[str]:
+        """发送者数据对应的加锁范围"""
+        targets = {self.user_id}
+        if self.locks is not None and data:
+            targets.update(str(user_id) for user_id in self.locks(data))
+        return targets
+
+    async def __aenter__(self) -> "RequestContext":
+        for _ in range(self.MAX_LOCK_ATTEMPTS):
+            # 加锁范围取决于发送者数据（如奴隶列表），先不加锁读取一次来确定
+            preview = None
+            if self.locks is not None:
+                preview = await self.plugin.get_player_data_async(self.group_id, self.user_id)
+            self.user_ids = sorted(self._lock_targets(preview))
+            await super().__aenter__()
+            try:
+                self.player = await self.ensure(self.user_id, self.nickname)
+                if self._lock_targets(self.player) <= set(self.user_ids):
+                    return self
+            except BaseException:
+                self._release()
+                raise
+            # 读取之后、加锁之前数据发生了变化，放开全部锁重新计算
+            self._release()
+            self._records.clear()
+            self._snapshots.clear()
+        raise RuntimeError("玩家数据持续变化，无法确定加锁范围")
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                try:
+                    await self.commit()
+                except BaseException:
+                    self.rollback()
+                    raise
+            else:
+                self.rollback()
+        finally:
+            self._release()
+
+    async def get_many(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """批量读取并跟踪多个玩家的数据
+
+        Args:
+            user_ids: 用户ID列表，必须都在加锁范围内
+
+        Returns:
+            Dict[str, Dict[str, Any]]: 存在的玩家数据，用户ID到数据的映射
+        """
+        for user_id in user_ids:
+            self._check_locked(user_id)
+        missing = [user_id for user_id in user_ids if user_id not in self._records]
+        if missing:
+            loaded = await self.plugin.get_players_async(self.group_id, missing)
+            for user_id, data in loaded.items():
+                self._track(user_id, data)
+        return {user_id: self._records[user_id] for user_id in user_ids if user_id in self._records}
+
+    async def read(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """读取任意玩家数据的副本，不加锁也不跟踪，修改副本不会被提交
+
+        Returns:
+            Optional[Dict[str, Any]]: 玩家数据副本或None
+        """
+        data = await self.plugin.get_player_data_async(self.group_id, user_id)
+        return copy.deepcopy(data) if data is not None else None
+
+    def start_cooldown(self, action: str) -> None:
+        """登记发送者的冷却，提交成功后才开始"""
+        self._cooldowns.append(action)
+
+    def post(
+        self, op: str, amount: int = 0, balance_change: int = 0, level_change: int = 0
+    ) -> Tuple[Any, int]:
+        """在发送者的银行账户上记一笔流水，工作单元失败时撤销
+
+        参数与返回值同 BankLedger.post
+        """
+        ledger = self.plugin.bank_ledger
+        if not self._bank_posted:
+            self._bank_state = ledger.account_state(self.group_id, self.user_id)
+            self._bank_posted = True
+        return ledger.post(self.group_id, self.user_id, op, amount, balance_change, level_change)
+
+    async def commit(self) -> None:
+        """提交发生变化的玩家数据，然后开始登记的冷却"""
+        await super().commit()
+        for action in self._cooldowns:
+            self.plugin.start_cooldown(self.group_id, self.user_id, action)
+        self._cooldowns = []
+        self._bank_posted = False
+
+    def rollback(self) -> None:
+        """恢复玩家数据，丢弃登记的冷却并撤销银行记账"""
+        super().rollback()
+        self._cooldowns = []
+        if self._bank_posted:
+            self.plugin.bank_ledger.revert(self.group_id, self.user_id, self._bank_state)
+            self._bank_posted = False
+
+
+def unit_of_work(
+    cooldown: Optional[str] = None,
+    locks: Optional[Callable[[Dict[str, Any]], Iterable[Any]]] = None,
+) -> Callable:
+    """把指令处理函数包装成一个工作单元
+
+    用法::
+
+        @filter.command("打工")
+        @admission_control("打工")
+        @unit_of_work(cooldown="work")
+        async def work(self, event: AstrMessageEvent, ctx: RequestContext):
+            ctx.player["currency"] += 10
+            yield event.plain_result("...")
+
+    包装后的函数统一完成：私聊拒绝、冷却检查（读取玩家数据之前检查一次，加锁后再检查一次）、
+    创建 RequestContext 并作为 event 之后的参数传入、结束时一次提交、异常时回滚并回复失败提示。
+    处理函数产生的回复在提交、释放锁之后才发出。包装后的签名中不含 ctx，指令参数解析不受影响
+
+    会修改其他玩家的指令用 locks 声明这些玩家，例如训练奴隶::
+
+        @unit_of_work(cooldown="training", locks=lambda player: player.get("slaves", []))
+
+    Args:
+        cooldown: 需要检查的冷却动作名，None表示不检查
+        locks: 根据发送者数据返回还要加锁的玩家ID，None表示只锁定发送者
+    """
+    def decorate(handler: Callable) -> Callable:
+        signature = inspect.signature(handler)
+
+        @functools.wraps(handler)
+        async def wrapper(self, event, *args: Any, **kwargs: Any):
+            if not event.get_group_id():
+                yield event.plain_result("该游戏只能在群内使用")
+                return
+
+            plugin = getattr(self, "plugin", self)
+            ctx = RequestContext(plugin, event, locks)
+            if cooldown:
+                notice = plugin.cooldown_notice(ctx.group_id, ctx.user_id, cooldown)
+                if notice:
+                    yield event.plain_result(notice)
+                    return
+
+            results = []
+            try:
+                async with ctx:
+                    notice = plugin.cooldown_notice(ctx.group_id, ctx.user_id, cooldown) if cooldown else None
+                    if notice:
+                        results.append(event.plain_result(notice))
+                    else:
+                        async for result in handler(self, event, ctx, *args, **kwargs):
+                            results.append(result)
+            except Exception as e:
+                logger.error(f"指令 {handler.__name__} 执行失败: {e}")
+                results = [event.plain_result("操作失败，请稍后重试")]
+
+            for result in results:
+                yield result
+
+        wrapper.__signature__ = signature.replace(
+            parameters=[param for name, param in signature.parameters.items() if name != "ctx"]
+        )
+        return wrapper
+    return decorate
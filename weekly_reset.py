@@ -4,38 +4,77 @@
 
 from astrbot.api.event import filter, AstrMessageEvent
 from astrbot.api import logger
+import asyncio
 import os
 import json
 import time
 import shutil
 from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import astrbot.api.message_components as Comp
 from typing import TYPE_CHECKING
 
+from .admission import admission_control
+from .archive import RankingHistory, SnapshotArchive
+from .codec import JsonCodec, read_file, write_file
+from .leaderboard import player_summary
+
 if TYPE_CHECKING:
+    from .config import PluginConfig
     from .main import SlaveMarketPlugin
 
+# datetime.weekday()对应的星期名称
+WEEKDAY_NAMES = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
+
 class WeeklyResetModule:
     def __init__(self, plugin: 'SlaveMarketPlugin'):
         self.plugin = plugin
-        self.config = plugin.config
+        self.progress_path = os.path.join(plugin.data_path, "reset_progress.json")
+        self.backup_dir = os.path.join(plugin.data_path, "backups")
+        self.archive = SnapshotArchive(os.path.join(plugin.data_path, "archives"))
+        self.history = RankingHistory(os.path.join(plugin.data_path, "rankings"))
+        # 防止自动重置与手动重置同时执行
+        self._reset_lock = asyncio.Lock()
     
-    def should_reset(self) -> bool:
-        """检查是否应该执行重置"""
-        if not self.config["weeklyReset"]["enabled"]:
-            return False
+    @property
+    def config(self) -> 'PluginConfig':
+        """当前配置，配置文件热重载后自动使用新配置"""
+        return self.plugin.config
+    
+    def previous_reset_time(self, now: Optional[datetime] = None) -> datetime:
+        """计算不晚于now的最近一个计划重置时间
+        
+        resetTime.day 与配置文件一致：0=周日, 1=周一, ..., 6=周六
+        """
+        now = now or datetime.now()
+        reset_time = self.config.weekly_reset
+        # 转换为datetime.weekday()的约定（0=周一）
+        weekday = (reset_time.day - 1) % 7
         
-        reset_time = self.config["weeklyReset"]["resetTime"]
-        now = datetime.now()
+        deadline = now.replace(
+            hour=reset_time.hour, minute=reset_time.minute, second=0, microsecond=0
+        ) - timedelta(days=(now.weekday() - weekday) % 7)
+        if deadline > now:
+            deadline -= timedelta(days=7)
+        return deadline
+    
+    def next_reset_time(self, now: Optional[datetime] = None) -> datetime:
+        """计算晚于now的下一个计划重置时间"""
+        return self.previous_reset_time(now) + timedelta(days=7)
+    
+    def is_reset_due(self, deadline: datetime, last_reset_time: int) -> bool:
+        """计划时间deadline的重置是否还需要执行
         
-        # 检查是否是重置时间
-        if (now.weekday() == reset_time["day"] and 
-            now.hour == reset_time["hour"] and 
-            now.minute == reset_time["minute"]):
-            return True
+        Args:
+            deadline: 计划重置时间
+            last_reset_time: 上次重置完成的时间戳
         
-        return False
+        Returns:
+            bool: 启用了每周重置且上次重置早于计划时间
+        """
+        if not self.config.weekly_reset.enabled:
+            return False
+        return last_reset_time < deadline.timestamp()
     
     def get_last_reset_time(self) -> int:
         """获取上次重置时间"""
@@ -61,170 +100,346 @@ class WeeklyResetModule:
         except Exception as e:
             logger.error(f"保存重置时间失败: {e}")
     
-    def backup_rankings(self) -> None:
-        """备份排行榜数据"""
-        backup_dir = os.path.join(self.plugin.data_path, "backups")
-        os.makedirs(backup_dir, exist_ok=True)
+    def backup_rankings(self, group_id: str, job_id: str, records: Dict[str, Dict[str, Any]]) -> None:
+        """将群组重置前的排行数据追加到该群组的排行榜历史分片与指标时间序列
         
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_file = os.path.join(backup_dir, f"rankings_{timestamp}.json")
+        Args:
+            group_id: 群组ID
+            job_id: 重置任务ID，同一任务重复调用时不会重复追加
+            records: 重置前的玩家数据
+        """
+        if not records:
+            return
+        week = int(datetime.strptime(job_id, "%Y%m%d_%H%M%S").timestamp())
+        self.plugin.trends.append_week(group_id, week, records)
+        self.history.append(group_id, job_id, {
+            "timestamp": int(time.time()),
+            "date": datetime.now().isoformat(),
+            "players": [player_summary(user_id, data) for user_id, data in records.items()]
+        })
+    
+    def build_reset_data(self, user_id: str, original_data: Dict[str, Any]) -> Dict[str, Any]:
+        """根据原始数据生成重置后的玩家数据"""
+        preserve_data = self.config.weekly_reset
         
-        # 获取所有群组的数据
-        all_rankings = {}
+        return {
+            "user_id": user_id,
+            "nickname": original_data.get("nickname", f"用户{user_id}") if preserve_data.preserve_nickname else f"用户{user_id}",
+            "currency": 0,
+            "value": preserve_data.basic_value,
+            "slaves": [],
+            "master": None,
+            "cooldowns": {},
+            "arena": {
+                "tier": "青铜",
+                "points": 0,
+                "wins": 0,
+                "losses": 0
+            },
+            "lastWorkTime": 0,
+            "createdAt": original_data.get("createdAt", int(time.time()))
+        }
+    
+    async def reset_group_async(self, group_id: str, job_id: str) -> int:
+        """在事件循环中协调一个群组的重置
         
-        player_dir = os.path.join(self.plugin.data_path, "player")
-        if os.path.exists(player_dir):
-            for group_id in os.listdir(player_dir):
-                group_path = os.path.join(player_dir, group_id)
-                if os.path.isdir(group_path):
-                    players = []
-                    for filename in os.listdir(group_path):
-                        if filename.endswith(".json") and filename != "backup":
-                            user_id = filename[:-5]
-                            player_data = self.plugin.get_player_data(group_id, user_id)
-                            if player_data:
-                                players.append({
-                                    "user_id": user_id,
-                                    "nickname": player_data.get("nickname", ""),
-                                    "currency": player_data.get("currency", 0),
-                                    "value": player_data.get("value", 0),
-                                    "slaves_count": len(player_data.get("slaves", [])),
-                                    "arena": player_data.get("arena", {})
-                                })
-                    
-                    if players:
-                        all_rankings[group_id] = {
-                            "timestamp": int(time.time()),
-                            "date": datetime.now().isoformat(),
-                            "players": players
-                        }
+        先暂停本群的指令准入，再按顺序锁定本群所有玩家：正在执行的事务提交后才轮到重置，
+        之后的事务要等重置完成、缓存失效后才能读到（重置后的）数据。
+        加锁后只写回本群的脏数据，然后在IO线程中读出、归档并重置
+        
+        Args:
+            group_id: 群组ID
+            job_id: 重置任务ID
         
+        Returns:
+            int: 重置的玩家数量
+        """
+        admission = self.plugin.admission
+        admission.pause(group_id)
         try:
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(all_rankings, f, ensure_ascii=False, indent=4)
-            logger.info(f"排行榜数据已备份到: {backup_file}")
-        except Exception as e:
-            logger.error(f"备份排行榜数据失败: {e}")
+            while True:
+                roster = await self.plugin.get_roster_async(group_id)
+                user_ids = roster.ids()
+                async with self.plugin.transaction(group_id, *user_ids):
+                    # 等锁期间可能有新玩家第一次保存，名单变化时重新加锁
+                    if set(roster.ids()) - set(user_ids):
+                        continue
+                    await self.plugin.flush_group_async(group_id)
+                    return await self.plugin.run_io(self.reset_group, group_id, job_id)
+        finally:
+            admission.resume(group_id)
     
-    def reset_player_data(self, group_id: str, user_id: str) -> None:
-        """重置单个玩家数据"""
+    def reset_group(self, group_id: str, job_id: str) -> int:
+        """重置一个群组内所有玩家的数据，应在 reset_group_async 持有本群所有玩家的锁时调用
+        
+        整个群组一次读出、一次批量写回（SQLite引擎下为单个事务）。
+        重置前的数据先写入本次任务的群组归档，再由归档中的数据追加排行榜历史与指标时间序列。
+        续跑时归档已经存在，存储中可能已经是重置后的数据，因此归档不再覆盖，
+        排行榜历史与时间序列仍以归档为准，且同一任务、同一周只追加一次
+        
+        Args:
+            group_id: 群组ID
+            job_id: 重置任务ID
+        
+        Returns:
+            int: 重置的玩家数量
+        """
+        user_ids = self.plugin.get_all_players(group_id)
+        original_records = self.plugin.storage.load_group(group_id, user_ids)
+        
+        # 归档写入失败时直接抛出，不在没有备份的情况下重置
+        if self.archive.has_group(group_id, job_id):
+            # 续跑：上次已经归档（可能也已经重置），排行数据以归档中重置前的数据为准
+            archived_records = self.archive.read_group(group_id, job_id)
+        else:
+            archived_records = original_records
+            if original_records:
+                # 银行账户保存在账本中，归档时并入玩家数据，恢复玩家时一并恢复
+                accounts = self.plugin.bank_ledger.export(group_id)
+                for user_id, record in original_records.items():
+                    if user_id in accounts:
+                        record["bank"] = accounts[user_id]
+                self.archive.write_group(group_id, job_id, original_records)
+        self.backup_rankings(group_id, job_id, archived_records)
+        
+        new_records = {}
+        for user_id, original_data in original_records.items():
+            try:
+                new_records[user_id] = self.build_reset_data(user_id, original_data)
+            except Exception as e:
+                logger.error(f"重置玩家 {user_id} 数据失败: {e}")
+        
+        if new_records:
+            self.plugin.storage.save_many(group_id, new_records)
+        self.plugin.player_cache.invalidate_group(group_id)
+        self.plugin.cooldowns.clear_group(group_id)
+        self.plugin.virtual_players.discard_group(group_id)
+        self.plugin.bank_ledger.reset_group(group_id)
+        if self.plugin.journal is not None:
+            # 重置前的增量已经没有意义，避免异常重启后被回放
+            self.plugin.journal.discard_group(group_id)
+        return len(new_records)
+    
+    def load_progress(self) -> Optional[Dict[str, Any]]:
+        """读取未完成的重置任务进度
+        
+        Returns:
+            Optional[Dict[str, Any]]: 任务进度，没有未完成的任务时返回None
+        """
+        if not os.path.exists(self.progress_path):
+            return None
         try:
-            # 读取原始数据
-            original_data = self.plugin.get_player_data(group_id, user_id)
-            if not original_data:
-                return
-            
-            # 创建备份
-            backup_dir = os.path.join(self.plugin.data_path, "player", group_id, "backup")
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            backup_file = os.path.join(backup_dir, f"{user_id}_{timestamp}.json")
-            
-            with open(backup_file, 'w', encoding='utf-8') as f:
-                json.dump(original_data, f, ensure_ascii=False, indent=4)
-            
-            # 重置数据
-            preserve_data = self.config["weeklyReset"]["preserveData"]
-            
-            new_data = {
-                "user_id": user_id,
-                "nickname": original_data.get("nickname", f"用户{user_id}") if preserve_data["nickname"] else f"用户{user_id}",
-                "currency": 0,
-                "value": preserve_data["basicValue"],
-                "slaves": [],
-                "master": None,
-                "bank": {
-                    "balance": 0,
-                    "level": 1,
-                    "limit": self.config["bank"]["initialLimit"],
-                    "lastInterestTime": int(time.time())
-                },
-                "cooldowns": {},
-                "arena": {
-                    "tier": "青铜",
-                    "points": 0,
-                    "wins": 0,
-                    "losses": 0
-                },
-                "lastWorkTime": 0,
-                "createdAt": original_data.get("createdAt", int(time.time()))
-            }
-            
-            self.plugin.save_player_data(group_id, user_id, new_data)
-            
+            return read_file(self.progress_path)
         except Exception as e:
-            logger.error(f"重置玩家 {user_id} 数据失败: {e}")
+            logger.error(f"读取重置进度失败: {e}")
+            return None
     
-    def perform_weekly_reset(self) -> Dict[str, Any]:
-        """执行每周重置"""
-        logger.info("开始执行每周重置...")
+    def save_progress(self, progress: Dict[str, Any]) -> None:
+        """保存重置任务进度（原子替换）"""
+        write_file(self.progress_path, progress, JsonCodec())
+    
+    def finish_job(self) -> None:
+        """记录重置时间并清除任务进度"""
+        self.save_last_reset_time()
+        if os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+    
+    def has_pending_job(self) -> bool:
+        """是否有中断后尚未完成的重置任务"""
+        return os.path.exists(self.progress_path)
+    
+    async def run_weekly_reset(self) -> Dict[str, Any]:
+        """执行每周重置
         
-        reset_count = 0
+        群组按批次放到IO线程池中并行重置，每完成一批就把进度写入
+        reset_progress.json；任务中途退出后再次执行会跳过已完成的群组继续，
+        不会重复重置
         
-        try:
-            # 备份排行榜数据
-            self.backup_rankings()
-            
-            # 重置所有群组的玩家数据
-            player_dir = os.path.join(self.plugin.data_path, "player")
-            if os.path.exists(player_dir):
-                for group_id in os.listdir(player_dir):
-                    group_path = os.path.join(player_dir, group_id)
-                    if os.path.isdir(group_path):
-                        for filename in os.listdir(group_path):
-                            if filename.endswith(".json") and filename != "backup":
-                                user_id = filename[:-5]
-                                self.reset_player_data(group_id, user_id)
-                                reset_count += 1
-            
-            # 保存重置时间
-            self.save_last_reset_time()
-            
-            logger.info(f"每周重置完成，共重置 {reset_count} 个玩家数据")
-            
-            return {
-                "success": True,
-                "resetCount": reset_count,
-                "message": f"每周重置完成，共重置 {reset_count} 个玩家数据"
-            }
-            
-        except Exception as e:
-            logger.error(f"每周重置失败: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+        Returns:
+            Dict[str, Any]: 执行结果
+        """
+        async with self._reset_lock:
+            try:
+                # 先写回缓存，保证存储中的数据是最新的
+                await self.plugin.flush_player_cache_async()
+                
+                progress = await self.plugin.run_io(self.load_progress)
+                if progress is None:
+                    logger.info("开始执行每周重置...")
+                    progress = {
+                        "jobId": datetime.now().strftime("%Y%m%d_%H%M%S"),
+                        "startedAt": int(time.time()),
+                        "doneGroups": [],
+                        "resetCount": 0,
+                    }
+                    await self.plugin.run_io(self.save_progress, progress)
+                else:
+                    logger.info(
+                        f"继续执行未完成的每周重置，已完成 {len(progress['doneGroups'])} 个群组"
+                    )
+                job_id = progress["jobId"]
+                
+                start = time.perf_counter()
+                
+                # 分批并行重置各群组的玩家数据
+                done_groups = set(progress["doneGroups"])
+                all_groups = await self.plugin.run_io(self.plugin.storage.list_groups)
+                groups = [group_id for group_id in all_groups if group_id not in done_groups]
+                chunk_size = self.config.weekly_reset.chunk_size
+                
+                run_count = 0
+                for i in range(0, len(groups), chunk_size):
+                    chunk = groups[i:i + chunk_size]
+                    counts = await asyncio.gather(*(
+                        self.reset_group_async(group_id, job_id)
+                        for group_id in chunk
+                    ))
+                    run_count += sum(counts)
+                    progress["doneGroups"].extend(chunk)
+                    progress["resetCount"] += sum(counts)
+                    await self.plugin.run_io(self.save_progress, progress)
+                
+                # 保存重置时间
+                await self.plugin.run_io(self.finish_job)
+                
+                elapsed = time.perf_counter() - start
+                rate = run_count / elapsed if elapsed > 0 else 0.0
+                reset_count = progress["resetCount"]
+                message = (
+                    f"每周重置完成，共重置 {reset_count} 个玩家数据，"
+                    f"耗时 {elapsed:.1f} 秒（{rate:.0f} 个/秒）"
+                )
+                logger.info(message)
+                
+                return {
+                    "success": True,
+                    "resetCount": reset_count,
+                    "elapsed": elapsed,
+                    "playersPerSecond": rate,
+                    "message": message
+                }
+                
+            except Exception as e:
+                logger.error(f"每周重置失败，下次执行时将从中断处继续: {e}")
+                return {
+                    "success": False,
+                    "error": str(e)
+                }
+    
+    def load_rankings(self, group_id: str, weeks_ago: int = 1) -> Optional[Dict[str, Any]]:
+        """读取群组第weeks_ago次重置前的排行数据
+        
+        只读取该群组的历史分片；群组还没有分片历史时，最近一周回退到旧版本的全量备份文件
+        
+        Args:
+            group_id: 群组ID
+            weeks_ago: 1为最近一次重置
+        
+        Returns:
+            Optional[Dict[str, Any]]: 排行数据，不存在时返回None
+        """
+        if self.history.weeks(group_id):
+            return self.history.read(group_id, weeks_ago)
+        if weeks_ago != 1:
+            return None
+        backup_data = self.load_latest_rankings()
+        if backup_data is None:
+            return None
+        return backup_data.get(group_id)
+    
+    def load_latest_rankings(self) -> Optional[Dict[str, Any]]:
+        """读取旧版本最新一次的全量排行榜备份
+        
+        Returns:
+            Optional[Dict[str, Any]]: 备份数据，没有备份时返回None
+        """
+        backup_files = self.list_ranking_backups()
+        if not backup_files:
+            return None
+        
+        return read_file(os.path.join(self.backup_dir, backup_files[0]))
+    
+    def list_ranking_backups(self) -> List[str]:
+        """列出排行榜备份文件（兼容旧的未压缩备份），按时间从新到旧排序"""
+        if not os.path.exists(self.backup_dir):
+            return []
+        
+        backup_files = [
+            f for f in os.listdir(self.backup_dir)
+            if f.startswith("rankings_") and (f.endswith(".json") or f.endswith(".json.gz"))
+        ]
+        backup_files.sort(key=lambda f: f.split(".", 1)[0], reverse=True)
+        return backup_files
+    
+    def prune_backups(self) -> int:
+        """按保留策略删除过期的归档与备份
+        
+        每个群组的归档与排行榜历史都只保留最新的keepWeeks份；
+        旧版本遗留的逐玩家备份文件（player/<群组>/backup）超过保留期限后删除
+        
+        Returns:
+            int: 删除的文件数量
+        """
+        keep = self.config.archive.keep_weeks
+        if keep <= 0:
+            return 0
+        
+        removed = self.archive.prune(keep)
+        removed += self.history.prune(keep)
+        
+        for filename in self.list_ranking_backups()[keep:]:
+            os.remove(os.path.join(self.backup_dir, filename))
+            removed += 1
+        
+        expire_before = time.time() - keep * 7 * 86400
+        player_dir = os.path.join(self.plugin.data_path, "player")
+        if os.path.isdir(player_dir):
+            for group_id in os.listdir(player_dir):
+                legacy_dir = os.path.join(player_dir, group_id, "backup")
+                if not os.path.isdir(legacy_dir):
+                    continue
+                for filename in os.listdir(legacy_dir):
+                    path = os.path.join(legacy_dir, filename)
+                    if os.path.getmtime(path) < expire_before:
+                        os.remove(path)
+                        removed += 1
+                if not os.listdir(legacy_dir):
+                    os.rmdir(legacy_dir)
+        return removed
+    
+    async def run_prune(self) -> int:
+        """在IO线程池中清理过期备份，与重置任务互斥"""
+        async with self._reset_lock:
+            return await self.plugin.run_io(self.prune_backups)
     
     @filter.command("奴隶重置状态")
+    @admission_control("奴隶重置状态")
     async def reset_status(self, event: AstrMessageEvent):
         """查看重置状态"""
-        last_reset_time = self.get_last_reset_time()
+        last_reset_time = await self.plugin.run_io(self.get_last_reset_time)
         
+        reply = "📊 每周重置状态\n\n"
         if last_reset_time == 0:
-            reply = "📊 每周重置状态\n\n"
             reply += "🔄 状态: 从未执行过重置\n"
-            reply += "⏰ 下次重置: 每周一 00:00"
         else:
             last_reset = datetime.fromtimestamp(last_reset_time)
-            now = datetime.now()
-            
-            # 计算下次重置时间
-            days_until_monday = (7 - now.weekday()) % 7
-            if days_until_monday == 0 and now.hour >= 0:
-                days_until_monday = 7
-            
-            next_reset = now + timedelta(days=days_until_monday)
-            next_reset = next_reset.replace(hour=0, minute=0, second=0, microsecond=0)
-            
-            reply = "📊 每周重置状态\n\n"
             reply += f"🕐 上次重置: {last_reset.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            reply += f"⏰ 下次重置: {next_reset.strftime('%Y-%m-%d %H:%M:%S')}\n"
-            reply += f"📅 剩余时间: {days_until_monday} 天"
+        
+        if not self.config.weekly_reset.enabled:
+            reply += "⏸️ 自动重置: 已关闭"
+        else:
+            # 与定时任务使用同一套计算
+            now = datetime.now()
+            next_reset = self.next_reset_time(now)
+            remaining = next_reset - now
+            hours, seconds = divmod(remaining.seconds, 3600)
+            reply += f"⏰ 下次重置: {next_reset.strftime('%Y-%m-%d %H:%M')}（{WEEKDAY_NAMES[next_reset.weekday()]}）\n"
+            reply += f"📅 剩余时间: {remaining.days} 天 {hours} 小时 {seconds // 60} 分钟"
         
         yield event.plain_result(reply)
     
     @filter.command("手动奴隶重置")
+    @admission_control("手动奴隶重置")
     async def manual_reset(self, event: AstrMessageEvent):
         """手动执行重置（管理员功能）"""
         # 这里应该添加管理员权限检查
@@ -232,50 +447,96 @@ class WeeklyResetModule:
         #     yield event.plain_result("你没有权限执行此操作")
         #     return
         
-        result = self.perform_weekly_reset()
+        result = await self.run_weekly_reset()
         
         if result["success"]:
             yield event.plain_result(f"✅ 手动重置完成！\n{result['message']}")
         else:
             yield event.plain_result(f"❌ 手动重置失败！\n错误: {result.get('error', '未知错误')}")
     
-    @filter.command("上周排行榜")
-    async def last_week_rankings(self, event: AstrMessageEvent):
-        """查看上周排行榜"""
+    @filter.permission_type(filter.PermissionType.ADMIN)
+    @filter.command("恢复玩家数据")
+    @admission_control("恢复玩家数据")
+    async def restore_player(self, event: AstrMessageEvent, target_user: str, weeks_ago: int = 1):
+        """从重置归档中恢复单个玩家的数据（管理员功能）
+        
+        Args:
+            target_user: 目标用户（@群友或QQ号）
+            weeks_ago: 恢复第几次重置前的数据，1为最近一次
+        """
         if not event.get_group_id():
             yield event.plain_result("该游戏只能在群内使用")
             return
         
         group_id = str(event.get_group_id())
+        target_id = target_user[1:] if target_user.startswith("@") else target_user
+        if not target_id:
+            yield event.plain_result("请指定要恢复的用户")
+            return
         
-        # 查找最新的备份文件
-        backup_dir = os.path.join(self.plugin.data_path, "backups")
-        if not os.path.exists(backup_dir):
-            yield event.plain_result("暂无历史排行榜数据")
+        jobs = await self.plugin.run_io(self.archive.list_jobs, group_id)
+        if weeks_ago < 1 or weeks_ago > len(jobs):
+            yield event.plain_result(f"没有找到对应的归档，该群组共有 {len(jobs)} 份归档")
             return
         
-        backup_files = [f for f in os.listdir(backup_dir) if f.startswith("rankings_") and f.endswith(".json")]
-        if not backup_files:
-            yield event.plain_result("暂无历史排行榜数据")
+        job_id = jobs[weeks_ago - 1]
+        data = await self.plugin.run_io(self.archive.read_player, group_id, job_id, target_id)
+        if data is None:
+            yield event.plain_result(f"归档 {job_id} 中没有该用户的数据")
+            return
+        
+        bank_state = data.pop("bank", None)
+        if bank_state:
+            await self.plugin.run_io(self.plugin.bank_ledger.load_group, group_id)
+        async with self.plugin.player_locks.get(group_id, target_id):
+            await self.plugin.save_player_data_async(group_id, target_id, data)
+            if bank_state:
+                self.plugin.bank_ledger.restore(group_id, target_id, bank_state)
+        self.plugin.roster.add(group_id, target_id)
+        
+        yield event.plain_result(
+            f"✅ 已恢复 {data.get('nickname', target_id)} 在 {job_id} 重置前的数据\n"
+            f"⚠️ 主人、奴隶关系按归档原样恢复，请确认与其他玩家的数据一致"
+        )
+    
+    @filter.command("上周排行榜")
+    @admission_control("上周排行榜")
+    async def last_week_rankings(self, event: AstrMessageEvent, weeks_ago: int = 1):
+        """查看上周排行榜
+        
+        Args:
+            weeks_ago: 查看第几次重置前的排行，1为上周
+        """
+        if not event.get_group_id():
+            yield event.plain_result("该游戏只能在群内使用")
             return
         
-        # 获取最新的备份文件
-        backup_files.sort(reverse=True)
-        latest_backup = os.path.join(backup_dir, backup_files[0])
+        group_id = str(event.get_group_id())
+        
+        # 历史只在重置时写入，而重置会使群组版本号递增，缓存的回复随之失效
+        cache_key = self.plugin.reply_cache.key(group_id, "上周排行榜", weeks_ago)
+        reply = self.plugin.reply_cache.get(cache_key)
+        if reply is not None:
+            yield event.plain_result(reply)
+            return
         
         try:
-            with open(latest_backup, 'r', encoding='utf-8') as f:
-                backup_data = json.load(f)
-            
-            if group_id not in backup_data:
-                yield event.plain_result("该群组暂无历史排行榜数据")
+            group_data = await self.plugin.run_io(self.load_rankings, group_id, weeks_ago)
+            if group_data is None:
+                if weeks_ago == 1:
+                    yield event.plain_result("该群组暂无历史排行榜数据")
+                else:
+                    weeks = await self.plugin.run_io(self.history.weeks, group_id)
+                    yield event.plain_result(f"没有 {weeks_ago} 周前的排行榜数据，该群组共有 {len(weeks)} 周历史")
                 return
             
-            group_data = backup_data[group_id]
             players = group_data["players"]
             
             # 构建历史排行榜回复
-            reply = "📜 上周排行榜回顾\n\n"
+            if weeks_ago == 1:
+                reply = "📜 上周排行榜回顾\n\n"
+            else:
+                reply = f"📜 {weeks_ago}周前排行榜回顾\n\n"
             reply += f"📅 统计时间: {group_data['date']}\n\n"
             
             # 金币排行榜
@@ -297,6 +558,7 @@ class WeeklyResetModule:
                 emoji = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
                 reply += f"{emoji} {player['nickname']} - {player['slaves_count']} 个奴隶\n"
             
+            self.plugin.reply_cache.put(cache_key, reply)
             yield event.plain_result(reply)
             
         except Exception as e: